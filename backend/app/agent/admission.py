@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from collections import deque
+from agent.metrics import counter, histogram
+
+# Agent turns running at once, in the whole process
+CHAT_MAX_ACTIVE = int(os.getenv("CHAT_MAX_ACTIVE", "32"))
+# Turns running at once for one conversation. One keeps its checkpoints consistent
+CHAT_MAX_PER_SESSION = int(os.getenv("CHAT_MAX_PER_SESSION", "1"))
+# Requests allowed to wait for a slot, and for how long
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
+
+class Busy(Exception):
+    """
+    Raised when a request can't be admitted. reason is "session", "queue_full" or "timeout"
+    """
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+admission_wait = histogram("chat_admission_wait_seconds", "Time requests waited for a free agent slot")
+admission_rejected = counter("chat_admission_rejected_total", "Requests turned away by admission control", ("reason",))
+
+class AdmissionController:
+    """
+    Caps running agent turns globally and per session. Requests over the global cap
+    wait in a bounded FIFO queue; everything else is rejected right away so clients
+    can back off instead of slowing every conversation down
+    """
+
+    def __init__(self, max_active=CHAT_MAX_ACTIVE, max_per_session=CHAT_MAX_PER_SESSION, max_queue=CHAT_MAX_QUEUE, queue_timeout=CHAT_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_per_session = max_per_session
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.sessions = {}
+        # Futures of waiting requests, resolved in arrival order
+        self._waiters = deque()
+        self.admitted = 0
+
+    async def acquire(self, session):
+        """
+        Takes a slot for session or raises Busy. Call release(session) when the turn ends
+        """
+        if self.sessions.get(session, 0) >= self.max_per_session:
+            admission_rejected.inc(1, "session")
+            raise Busy("session")
+
+        start = time.perf_counter()
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+        elif len(self._waiters) >= self.max_queue:
+            admission_rejected.inc(1, "queue_full")
+            raise Busy("queue_full", retry_after=max(int(self.queue_timeout), 1))
+        else:
+            # Count the session while it waits so it can't queue a second request
+            self.sessions[session] = self.sessions.get(session, 0) + 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # release() hands its slot over by resolving the future
+                await asyncio.wait_for(waiter, self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._leave_queue(session, waiter)
+                admission_rejected.inc(1, "timeout")
+                raise Busy("timeout", retry_after=max(int(self.queue_timeout), 1))
+            except asyncio.CancelledError:
+                granted = waiter.done() and not waiter.cancelled()
+                self._leave_queue(session, waiter)
+                if granted:
+                    self._release_slot()
+                raise
+            self.sessions[session] -= 1
+
+        self.sessions[session] = self.sessions.get(session, 0) + 1
+        self.admitted += 1
+        admission_wait.observe(time.perf_counter() - start)
+
+    def _leave_queue(self, session, waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+        self._drop_session(session)
+
+    def _drop_session(self, session):
+        count = self.sessions.get(session, 0) - 1
+        if count > 0:
+            self.sessions[session] = count
+        else:
+            self.sessions.pop(session, None)
+
+    def release(self, session):
+        self._drop_session(session)
+        self._release_slot()
+
+    def _release_slot(self):
+        # Hand the slot straight to the oldest waiter so it can't be taken by a newcomer
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "sessions": len(self.sessions),
+            "admitted": self.admitted,
+        }
+
+admission = AdmissionController()
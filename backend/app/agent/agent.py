@@ -3,45 +3,42 @@ from typing import Literal, Optional
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import ToolMessage, AIMessage, SystemMessage
-from langgraph.prebuilt import ToolNode
+from langchain_core.messages import ToolMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import MessagesState
 import json
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from typing import Annotated, Literal
 from langgraph.graph.message import add_messages
-from datetime import datetime
-from agent.tools import get_tools
+from agent.tools import get_tools, openai_clients
+from agent.checkpoint import get_checkpointer
+from agent.executor import ToolExecutor, run_blocking
+from agent.clients import lazy_client
+from agent.metrics import metrics_callback
+from agent.ratelimit import acquire_upstream
+from agent.context import ContextAssembler, summary_prompt, token_encoding
+from agent.prompt import PromptLayout, compact_tool_schemas
+from agent.flex_dates import describe_matrix
+from agent.flights import FLIGHT_SUMMARY_MODE, FlightRanker, compact_flights, describe_picks, shortlist
 
 load_dotenv()
 
-# Load model and tools
-llm = init_chat_model("gpt-4o-mini", model_provider="openai", tags=["main"])
-structured_llm = ChatOpenAI(model="gpt-4o", tags=["structured"], disable_streaming=True).with_structured_output(method="json_mode")
+# Load tools. Models are built on first use or at warm-up
 tools = get_tools()
-llm_with_tools = llm.bind_tools(tools)
+tool_schemas = compact_tool_schemas(tools)
+llm_with_tools = lazy_client("main_llm", lambda: init_chat_model("gpt-4o-mini", model_provider="openai", tags=["main"], stream_usage=True, **openai_clients()).bind_tools(tool_schemas))
+structured_llm = lazy_client("summary_llm", lambda: ChatOpenAI(model="gpt-4o", tags=["structured"], disable_streaming=True, **openai_clients()).with_structured_output(method="json_mode"))
+# Folds old turns into the rolling conversation memory. Not streamed to the client
+memory_llm = lazy_client("memory_llm", lambda: ChatOpenAI(model="gpt-4o-mini", tags=["structured", "memory"], disable_streaming=True, **openai_clients()))
 
-current_date = datetime.now().strftime("%B %d, %Y")
-# system_message = f"""You are a friendly and intelligent travel planning assistant. Your role is to help users plan their trips — from choosing destinations to finding activities — and to build clear, community-informed itineraries that can be added directly to their Google Calendar. Make sure to use the itinerary tool if the user asks for an itinerary.
-
-# Tailor your responses to the stage of the conversation:
-
-# - At the start, offer to help find a travel destination. If the user is unsure where to go, ask engaging questions about their interests, preferred travel style, and desired experiences. Suggest potential destinations based on their answers.
-# - After a destination is chosen, offer to help find flights or accommodations. Ask only for the necessary details (like travel dates, departure location, or budget) to use the tools provided.
-# - Once travel logistics are handled, offer suggestions for things to do — especially special events, must-see attractions, and highly recommended local food spots. Use Reddit and other community sources to enrich these suggestions.
-# - After finding things to do, suggest creating a detailed itinerary. When making an itinerary, always use the reddit tool to search reddit for personal recommendations. Then call the itinerary tool. Do not list out a full itinerary as a message. tell the user a couple things you plan on adding. the itinerary tool will handle the full display of events.
-# - Once the itinerary is ready, offer to add it to their Google Calendar. Do not add to the calendar without explicit permission. Do **not** create one event per day. Instead, copy the itinerary schedule exactly — including time blocks and descriptions — and insert events that match the activities by day and hour.
-# Always maintain a helpful, conversational tone. Let the user guide the process, but gently lead them toward the next step when appropriate.
-
-# Today's date is {current_date}. Use this to understand and resolve any relative time references (e.g., "next Friday", "two weeks from now")."""
-
-system_message = f"""You are a friendly and intelligent travel planning assistant. Your role is to help users plan their trips — from choosing destinations to finding activities — and to build clear, community-informed itineraries that can be added directly to their Google Calendar. Only respond to travel-related prompts. Make sure to use the itinerary tool if the user asks for an itinerary.
+# Static, so the prompt prefix stays byte-identical across calls. The date goes at the end (see agent.prompt)
+system_message = """You are a friendly and intelligent travel planning assistant. Your role is to help users plan their trips — from choosing destinations to finding activities — and to build clear, community-informed itineraries that can be added directly to their Google Calendar. Only respond to travel-related prompts. Make sure to use the itinerary tool if the user asks for an itinerary.
 
 You have the following tools:
 Online-Search: search the internet for suggestions and recommendations. should be used to find reddit urls and passed to the reddit_comments tool to find personal recommendations
-get_reddit_comments: As mentioned before this is used with online-search to get personalized suggestions
-search_flights: search Google Flights to find flights that match the users desires. Make sure to get the neccessary paramaters before calling
+get_reddit_comments: As mentioned before this is used with online-search to get personalized suggestions. Pass all relevant thread urls in one call
+search_flights: search Google Flights to find flights that match the users desires. Make sure to get the neccessary paramaters before calling. City and airport names work as departure_id/arrival_id, don't search for airport codes
+search_flexible_flights: compare prices over a range of outbound and return dates in one call when the user's dates are flexible. Don't call search_flights once per date
 generate_itinerary: this tool is used to create a full structured itinerary in JSON format. Make sure to tell the user that you are generating the itineray before calling since this tool takes some time
 add_google_calendar_event: used to add events from the itinerary to google calendar. suggest this after making an itinerary. Generate the parameters yourself as much as posssible by using context. Do not call the tool until you have explicit permission
 
@@ -52,21 +49,39 @@ Tailor your responses to the stage of the conversation:
 - Once travel logistics are handled, offer suggestions for things to do — especially special events, must-see attractions, and highly recommended local food spots. Use Reddit and other community sources to enrich these suggestions.
 - After finding things to do, suggest creating a detailed itinerary. When making an itinerary, always use the reddit tool to search reddit for personal recommendations. Then call the itinerary tool. Do not list out a full itinerary as a message. tell the user a couple things you plan on adding. the itinerary tool will handle the full display of events.
 - Once the itinerary is ready, offer to add it to their Google Calendar. Do not add to the calendar without explicit permission. Do **not** create one event per day. Instead, copy the itinerary schedule exactly — including time blocks and descriptions — and insert events that match the activities by day and hour.
-Always maintain a helpful, conversational tone. Let the user guide the process, but gently lead them toward the next step when appropriate.
-
-Today's date is {current_date}. Use this to understand and resolve any relative time references (e.g., "next Friday", "two weeks from now")."""
+Always maintain a helpful, conversational tone. Let the user guide the process, but gently lead them toward the next step when appropriate."""
 
 # Custom state to keep track of last tool call
 class CustomState(MessagesState):
     messages: Annotated[list, add_messages] = [],
     last_tool_used: Optional[str] = None
+    # Rolling summary of the turns up to and including message memory_until
+    memory: Optional[str] = None
+    memory_until: Optional[str] = None
+
+# Runs independent tool calls from one LLM turn concurrently
+tool_executor = ToolExecutor(
+    tools,
+    concurrency={
+        "online_search": 4,
+        "get_reddit_comments": 8,
+        "search_flights": 2,
+        "search_flexible_flights": 2,
+        "generate_itinerary": 8,
+        "add_google_calendar_event": 4,
+    },
+    timeouts={
+        "search_flexible_flights": 120,
+        "generate_itinerary": 180,
+        "add_google_calendar_event": 120,
+    },
+)
 
 # Node that tracks tool calls
-def tool_node_with_tracking(state: CustomState) -> dict:
-    tool_node = ToolNode(tools)
-    new_state = tool_node.invoke(state)
+async def tool_node_with_tracking(state: CustomState, config: RunnableConfig) -> dict:
+    messages = await tool_executor.ainvoke(state["messages"], config)
+    new_state = {"messages": messages}
 
-    messages = new_state["messages"]
     last_tool_call = next(
         (m for m in messages[::-1] if isinstance(m, ToolMessage)), None
     )
@@ -76,18 +91,39 @@ def tool_node_with_tracking(state: CustomState) -> dict:
 
     return new_state
 
+def structured_message(payload: dict) -> AIMessage:
+    """
+    JSON message for the frontend (flight cards, itinerary, errors). The event tag lets
+    the /chat stream forward it without inspecting the content
+    """
+    return AIMessage(content=json.dumps(payload), additional_kwargs={"event": payload["type"]})
+
+# Keeps the prompt within the token budget as the conversation grows
+context_assembler = ContextAssembler()
+prompt_layout = PromptLayout(system_message, tool_schemas)
+
+async def summarize_turns(memory, transcript):
+    await acquire_upstream("openai")
+    response = await memory_llm.get().ainvoke(summary_prompt(memory, transcript))
+    return response.content
+
 # Define LLM call node
-def call_model(state: CustomState): 
-    messages = state["messages"]
-    system_prompt = SystemMessage(content=system_message)
-    messages_with_system = [system_prompt] + messages
+async def call_model(state: CustomState): 
     try:
-        response = llm_with_tools.invoke(messages_with_system)
-        return {"messages": [response]}
-    except:
-        return {"messages": [AIMessage(
-                    content=f"{json.dumps({'type': 'error', 'tool_name': "LLM"})}"
-        )]}
+        if not token_encoding.is_ready():
+            # Loading the encoding can download it. Keep that off the event loop
+            await run_blocking(token_encoding.get)
+        messages, memory_update = await context_assembler.assemble(
+            state["messages"],
+            memory=state.get("memory"),
+            memory_until=state.get("memory_until"),
+            summarize=summarize_turns,
+        )
+        await acquire_upstream("openai")
+        response = await llm_with_tools.get().ainvoke(prompt_layout.messages(messages))
+        return {"messages": [response], **memory_update}
+    except Exception:
+        return {"messages": [structured_message({'type': 'error', 'tool_name': 'LLM'})]}
 
 # Determine where to go after LLM
 def route_after_llm(state: CustomState) -> Literal["tools", END]:
@@ -96,17 +132,22 @@ def route_after_llm(state: CustomState) -> Literal["tools", END]:
     return END
 
 # Route after tools based on last_tool_used
-def route_after_tools(state: CustomState) -> Literal["summarize", "itinerary", "LLM"]:
-    if state.get("last_tool_used") == "search_flights":
-        return "summarize"
+def route_after_tools(state: CustomState) -> Literal["summarize", "price_matrix", "itinerary", "LLM"]:
+    if state.get("last_tool_used") in ("search_flights", "search_flexible_flights"):
+        # A rejected search (an unknown airport, too many dates...) goes back to the LLM to fix
+        if getattr(state["messages"][-1], "status", None) == "error":
+            return "LLM"
+        return "summarize" if state["last_tool_used"] == "search_flights" else "price_matrix"
     if state.get("last_tool_used") == "generate_itinerary":
         
         print("going to itinerary node")
         return "itinerary"
     return "LLM"
 
+flight_ranker = FlightRanker()
+
 # Flight summarizer node
-def summarize_flights(state: CustomState):
+async def summarize_flights(state: CustomState):
     print("summarizing...")
 
     # Get tool output
@@ -117,35 +158,69 @@ def summarize_flights(state: CustomState):
 
         
         flight_list = json.loads(message.content)
-        prompt = f"""
-            You are an expert travel agent. The user just searched for flights and got the following options:
-
-            {message.content}
+        if FLIGHT_SUMMARY_MODE == "llm":
+            flights_array, summary = await llm_pick_flights(flight_list)
+        else:
+            # Rank deterministically and skip the LLM round trip
+            picks = flight_ranker.rank(compact_flights(flight_list), 3)
+            flights_array = [option.index for option in picks]
+            summary = describe_picks(picks, search_currency(state["messages"], message.tool_call_id))
+
+        flights_data = [flight_list[index] for index in flights_array]
+        return {"messages": [structured_message({'type': 'flight_response', 'message': summary, 'flights_data': flights_data})]}
+    except Exception:
+        # Convert to message
+        return {"messages": [structured_message({'type': 'error', 'tool_name': message.name})]}
+
+def search_currency(messages, tool_call_id):
+    """
+    Currency requested by the search_flights call that produced a tool result
+    """
+    for m in messages[::-1]:
+        for call in getattr(m, "tool_calls", None) or []:
+            if call.get("id") == tool_call_id:
+                return call["args"].get("currency", "USD")
+    return "USD"
+
+async def llm_pick_flights(flight_list):
+    """
+    Asks gpt-4o to pick the top 3 flights and summarize them. Returns (indexes, message)
+    """
+    # Only send a compact, pre-ranked shortlist to the LLM instead of the raw SerpAPI JSON
+    candidates = shortlist(compact_flights(flight_list))
+    options = json.dumps([c.to_prompt() for c in candidates], separators=(",", ":"))
+    prompt = f"""
+            You are an expert travel agent. The user just searched for flights and got the following options (prices in the search currency, durations in minutes):
+
+            {options}
 
             Pick the top 3 flights that balance good price, reasonable departure/arrival times, and total travel time. 
 
             Return a JSON object with:
-            - "flights_array": an array of the indexes of the top 3 flights,
+            - "flights_array": an array of the "index" values of the top 3 flights,
             - "message": a short paragraph summarizing your picks to the user in a friendly tone. Do not mention the option numbers or indices
             """
 
-        response = structured_llm.invoke(prompt)
-        flights_data = []
+    await acquire_upstream("openai")
+    response = await structured_llm.get().ainvoke(prompt)
 
-        # Get indexes of best flights and add them to the message to reduce token usage and ensure correct output
-        for index in response['flights_array']:
-            flights_data.append(flight_list[index])
-        return {"messages": [AIMessage(
-                    content=f"{json.dumps({'type': "flight_response", "message": response["message"], "flights_data": flights_data})}"
-        )]}
-    except:
-        # Convert to message
-        return {"messages": [AIMessage(
-                    content=f"{json.dumps({'type': 'error', 'tool_name': message.name})}"
-        )]}
+    # Only keep indexes of shortlisted flights; the full entries are added to the message to reduce token usage and ensure correct output
+    allowed = {c.index for c in candidates}
+    return [index for index in response['flights_array'] if index in allowed], response['message']
+
+# Flexible-date search node, sends the price matrix and the cheapest flights as one event
+async def send_price_matrix(state: CustomState):
+    message = state["messages"][-1]
+    try:
+        result = json.loads(message.content)
+        matrix = {key: result[key] for key in ("currency", "outbound_dates", "return_dates", "prices")}
+        flights_data = [option["flight"] for option in result["cheapest"]]
+        return {"messages": [structured_message({'type': 'price_matrix', 'message': describe_matrix(result), 'matrix': matrix, 'flights_data': flights_data})]}
+    except Exception:
+        return {"messages": [structured_message({'type': 'error', 'tool_name': message.name})]}
 
 # Node to send itinerary JSON data
-def itinerary(state: CustomState):
+async def itinerary(state: CustomState):
     
     message = state["messages"][-1]
     try:
@@ -154,15 +229,11 @@ def itinerary(state: CustomState):
 
         itinerary = message.content
         print("itinerary", itinerary)
-        return {"messages": [AIMessage(
-                    content=f"{json.dumps({'type': "itinerary_response", "itinerary_data": itinerary})}"
-        )]}
+        return {"messages": [structured_message({'type': 'itinerary_response', 'itinerary_data': itinerary})]}
 
-    except:
+    except Exception:
         # Convert to message
-        return {"messages": [AIMessage(
-                    content=f"{json.dumps({'type': 'error', 'tool_name': message.name})}"
-        )]}
+        return {"messages": [structured_message({'type': 'error', 'tool_name': message.name})]}
 
 # Build the graph
 workflow = StateGraph(CustomState)
@@ -170,6 +241,7 @@ workflow = StateGraph(CustomState)
 workflow.add_node("LLM", call_model)
 workflow.add_node("tools", tool_node_with_tracking)
 workflow.add_node("summarize", summarize_flights)
+workflow.add_node("price_matrix", send_price_matrix)
 workflow.add_node("itinerary", itinerary)
 workflow.set_entry_point("LLM")
 
@@ -180,14 +252,44 @@ workflow.add_conditional_edges("LLM", route_after_llm, {
 
 workflow.add_conditional_edges("tools", route_after_tools, {
     "summarize": "summarize",
+    "price_matrix": "price_matrix",
     "itinerary": "itinerary",
     "LLM": "LLM",
 })
 
 workflow.add_edge("summarize", END)
+workflow.add_edge("price_matrix", END)
 workflow.add_edge("itinerary", END)
-agent = workflow.compile(checkpointer=MemorySaver())
-config = {"configurable": {"thread_id": "1"}}
-
-def get_agent():
-    return (agent, config)
\ No newline at end of file
+checkpointer = lazy_client("checkpointer", get_checkpointer)
+compiled_agent = lazy_client("agent", lambda: workflow.compile(checkpointer=checkpointer.get()))
+
+def get_agent(thread_id: str):
+    """
+    Returns the compiled agent and the config for a conversation thread
+    """
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [metrics_callback]}
+    return (compiled_agent.get(), config)
+
+async def close_interrupted_turn(agent, config):
+    """
+    Answers the tool calls a cancelled run left open and ends the turn there. Without
+    this the saved thread ends in an AI message whose tool calls have no results, which
+    the LLM rejects on the next turn. Returns the node that was running when the run stopped
+    """
+    state = await agent.aget_state(config)
+    node = state.next[0] if state.next else "LLM"
+    messages = state.values.get("messages", [])
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+        closed = [
+            ToolMessage(content="Cancelled: the user left before this finished.", name=call["name"], tool_call_id=call["id"], status="error")
+            for call in messages[-1].tool_calls
+        ]
+        # Recorded as the tools step, without the stale last_tool_used that would route
+        # to itinerary/summarize. Then the step is ended so nothing is left pending
+        config = await agent.aupdate_state(config, {"messages": closed, "last_tool_used": None}, as_node="tools")
+        await agent.aupdate_state(config, None, as_node=END)
+        print(f"Closed {len(closed)} interrupted tool calls")
+    return node
+
+def get_checkpointer_stats():
+    return checkpointer.get().stats()
@@ -0,0 +1,303 @@
+import bisect
+import csv
+import mmap
+import os
+import re
+import struct
+import tempfile
+from dataclasses import dataclass
+from agent.text import normalize_text
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# Airports with their city and metro area code (e.g. PAR for CDG and ORY)
+AIRPORTS_CSV = os.getenv("AIRPORTS_CSV", os.path.join(DATA_DIR, "airports.csv"))
+# Built from AIRPORTS_CSV on first use, and again whenever the CSV changes
+AIRPORT_INDEX = os.getenv("AIRPORT_INDEX", os.path.join(DATA_DIR, "airports.idx"))
+
+# Index file: header, fixed width records, then entries sorted by key for bisecting
+MAGIC = b"ARPT"
+VERSION = 1
+HEADER = struct.Struct("<4sHII")
+# code, metro code, country, name, city
+RECORD = struct.Struct("<3s3s2s64s40s")
+KEY_WIDTH = 48
+# normalized key, record number, kind of key
+ENTRY = struct.Struct(f"<{KEY_WIDTH}sHB")
+CODE, METRO, CITY, NAME = range(4)
+# Words name suffixes don't start with, so "gaulle airport" is a key but "airport" isn't
+NAME_STOPWORDS = {"international", "airport", "intl"}
+# Google Flights location ids, passed through as is
+KGMID = re.compile(r"^/[mg]/\w+$")
+
+@dataclass(frozen=True, slots=True)
+class Airport:
+    code: str
+    name: str
+    city: str
+    country: str
+    metro: str = ""
+
+    def describe(self):
+        return f"{self.name}, {self.city}, {self.country} ({self.code})"
+
+def build_index(csv_path=AIRPORTS_CSV, index_path=AIRPORT_INDEX):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    records = bytearray()
+    entries = []
+    for i, row in enumerate(rows):
+        records += RECORD.pack(*(row[field].strip().encode() for field in ("code", "metro", "country", "name", "city")))
+        keys = {(row["code"].lower(), CODE), (normalize_text(row["city"]), CITY)}
+        if row["metro"]:
+            keys.add((row["metro"].lower(), METRO))
+        words = normalize_text(row["name"]).split()
+        for start in range(len(words)):
+            if words[start] not in NAME_STOPWORDS:
+                keys.add((" ".join(words[start:]), NAME))
+        entries += [(key.encode()[:KEY_WIDTH], i, kind) for key, kind in keys]
+    entries.sort()
+
+    # Write then rename, so a running process never maps a half written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(index_path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(rows), len(entries)))
+            f.write(records)
+            for entry in entries:
+                f.write(ENTRY.pack(*entry))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, index_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return index_path
+
+def load_index(csv_path=AIRPORTS_CSV, index_path=AIRPORT_INDEX):
+    """
+    Maps the index, building it from the CSV first if it's missing or out of date
+    """
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(csv_path):
+        try:
+            build_index(csv_path, index_path)
+        except OSError:
+            # Read-only install
+            index_path = build_index(csv_path, os.path.join(tempfile.gettempdir(), "airports.idx"))
+    return AirportIndex(index_path)
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance, or limit + 1 once it's known to be over the limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def typo_limit(query):
+    """
+    Edits allowed for a misspelling: 1 for short names, up to 3 for long ones
+    """
+    return min(3, max(1, len(query) // 4))
+
+class _Keys:
+    """
+    Sequence view of the sorted entry keys, for bisect
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.entries
+
+    def __getitem__(self, i):
+        offset = self.index._entries_at + i * ENTRY.size
+        return self.index._map[offset:offset + KEY_WIDTH].rstrip(b"\0")
+
+class AirportIndex:
+    """
+    Read-only airport index over a memory-mapped file: lookups bisect the sorted keys
+    in place, so opening it costs nothing and every worker shares the same pages.
+    Keys are airport codes, metro area codes, city names and airport names (and the
+    tails of names, so "de gaulle" finds CDG)
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.records, self.entries = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an airport index")
+        self._entries_at = HEADER.size + self.records * RECORD.size
+        self._keys = _Keys(self)
+
+    def __len__(self):
+        return self.records
+
+    def airport(self, record):
+        code, metro, country, name, city = (field.rstrip(b"\0").decode(errors="ignore") for field in RECORD.unpack_from(self._map, HEADER.size + record * RECORD.size))
+        return Airport(code, name, city, country, metro)
+
+    def _entry(self, i):
+        key, record, kind = ENTRY.unpack_from(self._map, self._entries_at + i * ENTRY.size)
+        return key.rstrip(b"\0"), record, kind
+
+    def _scan(self, key, exact=True, kinds=(CODE, METRO, CITY, NAME), limit=256):
+        """
+        (key, record, kind) for entries equal to key, or starting with it
+        """
+        key = key.encode()[:KEY_WIDTH]
+        i = bisect.bisect_left(self._keys, key)
+        found = []
+        while i < self.entries and len(found) < limit:
+            entry = self._entry(i)
+            if entry[0] != key and (exact or not entry[0].startswith(key)):
+                break
+            if entry[2] in kinds:
+                found.append(entry)
+            i += 1
+        return found
+
+    def get(self, code):
+        """
+        Airport with this IATA code, or None
+        """
+        found = self._scan(code.strip().lower(), kinds=(CODE,))
+        return self.airport(found[0][1]) if found else None
+
+    def metro(self, code):
+        """
+        Airports of a metro area code, e.g. CDG and ORY for PAR
+        """
+        return [self.airport(record) for _, record, _ in self._scan(code.strip().lower(), kinds=(METRO,))]
+
+    def search(self, query, limit=5):
+        """
+        Airports whose code, city or name equals or starts with the query, exact
+        matches and codes first
+        """
+        query = normalize_text(query)
+        if not query:
+            return []
+        entries = sorted(self._scan(query, exact=False), key=lambda entry: (entry[0] != query.encode(), entry[2], entry[0]))
+        return self._airports(entries, limit)
+
+    def _closest(self, query, max_distance):
+        """
+        City and airport name entries within max_distance edits of the query, closest
+        first. Only names starting with the same letter are compared
+        """
+        target = query.encode()[:KEY_WIDTH]
+        scored = []
+        for key, record, kind in self._scan(query[0], exact=False, kinds=(CITY, NAME), limit=self.entries):
+            distance = edit_distance(target, key, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, kind, key, record))
+        scored.sort()
+        return [(distance, (key, record, kind)) for distance, kind, key, record in scored]
+
+    def fuzzy(self, query, limit=5, max_distance=None):
+        """
+        Closest airports to a misspelled city or airport name
+        """
+        query = normalize_text(query)
+        if not query:
+            return []
+        return self._airports([entry for _, entry in self._closest(query, max_distance or typo_limit(query))], limit)
+
+    def _airports(self, entries, limit):
+        records = []
+        for _, record, _ in entries:
+            if record not in records:
+                records.append(record)
+        return [self.airport(record) for record in records[:limit]]
+
+    def _places(self, entries):
+        """
+        (label, codes) per place the entries point at. A city means all of its airports,
+        and the whole metro area when it has several there. An airport name means just
+        that airport
+        """
+        places = {}
+        # Cities first, so a city and its only airport's name read as the city
+        for _, record, kind in sorted(entries, key=lambda entry: entry[2]):
+            airport = self.airport(record)
+            label = f"{airport.city}, {airport.country}"
+            if kind == NAME:
+                places.setdefault(airport.code, (airport.describe(), [airport]))
+            else:
+                airports = places.setdefault((airport.city, airport.country), (label, []))[1]
+                if airport not in airports:
+                    airports.append(airport)
+        unique = {}
+        for label, airports in places.values():
+            codes = [airport.code for airport in airports]
+            metros = {airport.metro for airport in airports}
+            if len(airports) > 1 and len(metros) == 1 and "" not in metros:
+                # "New York" takes in Newark too, but "Newark" is just EWR
+                codes = [member.code for member in self.metro(metros.pop())]
+            unique.setdefault(frozenset(codes), (label, codes))
+        # An airport name matching alongside its own city adds nothing
+        return [place for airports, place in unique.items() if not any(airports < others for others in unique)]
+
+    def _resolve_part(self, text):
+        if KGMID.match(text):
+            return [text]
+        query = normalize_text(text)
+        if not query:
+            raise ValueError(f"'{text}' is not an airport or city")
+        if len(query) == 3 and query.isalpha():
+            airport = self.get(query)
+            if airport:
+                return [airport.code]
+            members = self.metro(query)
+            if members:
+                return [member.code for member in members]
+
+        entries = self._scan(query, kinds=(CITY, NAME)) or self._scan(query, exact=False, kinds=(CITY, NAME))
+        if not entries:
+            if len(query) == 3 and query.isalpha():
+                # Smaller airports aren't bundled. Let Google Flights judge the code
+                return [query.upper()]
+            # Typos: take the closest names if they're close enough
+            closest = self._closest(query, typo_limit(query))
+            entries = [entry for distance, entry in closest if distance == closest[0][0]]
+        if not entries:
+            suggestions = self.fuzzy(query, limit=3, max_distance=3)
+            hint = f" Did you mean {'; '.join(airport.describe() for airport in suggestions)}?" if suggestions else ""
+            raise ValueError(f"Unknown airport or city '{text}'.{hint} Use 3 letter IATA airport codes.")
+
+        places = self._places(entries)
+        if len(places) > 1:
+            options = "; ".join(f"{label} ({','.join(codes)})" for label, codes in places[:5])
+            raise ValueError(f"'{text}' is ambiguous, it could be {options}. Use the IATA code of the one the user means.")
+        return places[0][1]
+
+    def resolve(self, value):
+        """
+        Comma separated IATA codes for a departure_id/arrival_id: codes are kept, metro
+        codes and city names become their airports ("Paris" is "CDG,ORY"), airport
+        names become their code. Raises ValueError for unknown or ambiguous places
+        """
+        codes = []
+        for part in str(value).split(","):
+            if part.strip():
+                for code in self._resolve_part(part.strip()):
+                    if code not in codes:
+                        codes.append(code)
+        if not codes:
+            raise ValueError("No airport given")
+        return ",".join(codes)
+
+    def close(self):
+        self._map.close()
+
+if __name__ == "__main__":
+    print(f"Built {build_index()}")
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from agent.executor import run_blocking
+from agent.metrics import counter
+from agent.ratelimit import UpstreamBusy, background_calls
+
+prefetch_results = counter("agent_prefetch_total", "Cache entries filled by background prefetching, and how many of them a request used", ("cache", "outcome"))
+
+def make_key(params: dict) -> str:
+    """
+    Stable hash of a JSON-serializable dict, independent of key order
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class DiskTier:
+    """
+    Optional SQLite tier shared by every worker process on the machine
+    """
+
+    def __init__(self, path: str, namespace: str):
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace=? AND key=?", (self.namespace, key)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, expires_at, json.dumps(value)),
+            )
+            # Opportunistically drop expired rows of this namespace
+            conn.execute("DELETE FROM cache WHERE namespace=? AND expires_at<?", (self.namespace, time.time()))
+
+class AsyncTTLCache:
+    """
+    In-process LRU cache with per-entry TTL, an optional disk tier, and single-flight
+    coalescing so concurrent misses for the same key share one upstream call.
+    Values must be JSON-serializable when the disk tier is enabled.
+    """
+
+    def __init__(self, name: str, max_size: int = 256, ttl: float = 900, disk_path: str = ""):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk = DiskTier(disk_path, name) if disk_path else None
+
+        # key -> (value, expires_at) using wall-clock time so it matches the disk tier
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # Keys filled by background prefetching that no request has read yet
+        self._prefetched = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.prefetched = 0
+        self.prefetch_used = 0
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set_local(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _avg_upstream(self):
+        return self.upstream_seconds / self.misses if self.misses else 0.0
+
+    def _served(self, key):
+        """
+        Counts a request served from the cache, and whether prefetching put the value there
+        """
+        if background_calls.get():
+            return
+        if self._prefetched.pop(key, None) is not None:
+            self.prefetch_used += 1
+            prefetch_results.inc(1, self.name, "used")
+
+    def _filled(self, key):
+        if not background_calls.get():
+            return
+        self.prefetched += 1
+        prefetch_results.inc(1, self.name, "fetched")
+        self._prefetched[key] = True
+        while len(self._prefetched) > self.max_size:
+            self._prefetched.popitem(last=False)
+
+    async def get(self, key):
+        """
+        Returns a cached value or None without calling upstream
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry[0]
+        if self.disk:
+            entry = await run_blocking(self.disk.get, key)
+            if entry is not None:
+                self._set_local(key, *entry)
+                return entry[0]
+        return None
+
+    async def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._set_local(key, value, expires_at)
+        if self.disk:
+            await run_blocking(self.disk.set, key, value, expires_at)
+
+    async def get_or_fetch(self, key, fetch, should_cache=bool):
+        """
+        Returns the cached value for key, otherwise awaits fetch() once for all
+        concurrent callers and caches the result if should_cache(result) is true
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            self.hits += 1
+            self.saved_seconds += self._avg_upstream()
+            self._served(key)
+            return entry[0]
+
+        # Join a request that is already in flight
+        if key in self._inflight:
+            leader = self._inflight[key]
+            try:
+                value = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                # The leading request was cancelled, so fetch on our own
+                return await self.get_or_fetch(key, fetch, should_cache)
+            except UpstreamBusy:
+                # A prefetch gave up for lack of budget. Requests wait for theirs
+                if background_calls.get():
+                    raise
+                return await self.get_or_fetch(key, fetch, should_cache)
+            self.coalesced += 1
+            self.saved_seconds += self._avg_upstream()
+            self._served(key)
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if self.disk:
+                entry = await run_blocking(self.disk.get, key)
+                if entry is not None:
+                    self.disk_hits += 1
+                    self.saved_seconds += self._avg_upstream()
+                    self._served(key)
+                    self._set_local(key, *entry)
+                    future.set_result(entry[0])
+                    return entry[0]
+
+            self.misses += 1
+            start = time.perf_counter()
+            value = await fetch()
+            self.upstream_seconds += time.perf_counter() - start
+
+            if should_cache(value):
+                await self.set(key, value)
+                self._filled(key)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody joined this request
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def clear(self):
+        """
+        Drops the in-process entries. The disk tier is left alone
+        """
+        self._entries.clear()
+        self._prefetched.clear()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "upstream_seconds": self.upstream_seconds,
+            "avg_upstream_seconds": self._avg_upstream(),
+            "saved_seconds": self.saved_seconds,
+            "prefetched": self.prefetched,
+            "prefetch_used": self.prefetch_used,
+            "prefetch_use_rate": self.prefetch_used / self.prefetched if self.prefetched else 0.0,
+        }
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+from googleapiclient.errors import HttpError
+from agent.executor import run_blocking
+from agent.metrics import counter
+from agent.ratelimit import acquire_upstream
+
+# Calendar accepts up to 1000 calls per batch but recommends staying at or below 50
+CALENDAR_BATCH_SIZE = int(os.getenv("CALENDAR_BATCH_SIZE", "50"))
+# Batches sent at once for one write
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", "4"))
+# Tries per event before giving up, with exponential backoff between them
+CALENDAR_MAX_ATTEMPTS = int(os.getenv("CALENDAR_MAX_ATTEMPTS", "5"))
+CALENDAR_BACKOFF_SECONDS = float(os.getenv("CALENDAR_BACKOFF_SECONDS", "0.5"))
+CALENDAR_BACKOFF_MAX_SECONDS = float(os.getenv("CALENDAR_BACKOFF_MAX_SECONDS", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Calendar answers rate limiting with 403 and one of these reasons. Other 403s are permanent
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+calendar_events = counter("agent_calendar_events_total", "Events written by the calendar batch writer, by outcome", ("status",))
+calendar_retries = counter("agent_calendar_retries_total", "Calendar calls retried, by HTTP status", ("status",))
+
+def event_id(event_data: dict) -> str:
+    """
+    Deterministic event id from the summary and start time, so writing the same event
+    twice hits a 409 instead of creating a duplicate. Hex digits are valid base32hex
+    """
+    start = event_data.get("start", {})
+    key = json.dumps([event_data.get("summary"), start.get("dateTime"), start.get("timeZone")])
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def error_reason(error: HttpError) -> str:
+    try:
+        details = json.loads(error.content).get("error", {})
+        return (details.get("errors") or [{}])[0].get("reason") or details.get("status") or ""
+    except (ValueError, AttributeError):
+        return ""
+
+def is_retryable(error: Exception) -> bool:
+    if not isinstance(error, HttpError):
+        # Transport errors (resets, timeouts) are worth another try
+        return True
+    status = error.resp.status
+    return status in RETRY_STATUSES or (status == 403 and error_reason(error) in RATE_LIMIT_REASONS)
+
+class PendingEvent:
+    """
+    One event moving through insert -> (get -> update) until it has a final result
+    """
+
+    def __init__(self, index, body):
+        self.index = index
+        self.body = body
+        self.id = event_id(body)
+        # insert, then get when the id already exists, then update to restore a deleted event
+        self.operation = "insert"
+        self.attempts = 0
+        self.retries = 0
+        self.error = None
+        # Event loop time at which the event can be sent again
+        self.due = 0.0
+
+    def result(self, status, event=None):
+        return {
+            "index": self.index,
+            "id": self.id,
+            "summary": self.body.get("summary"),
+            "status": status,
+            "link": (event or {}).get("htmlLink"),
+            "attempts": self.attempts,
+            "error": None if status != "failed" else str(self.error),
+        }
+
+class CalendarBatchWriter:
+    """
+    Inserts events through Calendar batch requests. Events are split into batches of
+    batch_size that run concurrently, and each event is retried on its own with
+    backoff when it hits rate limits or server errors. Event ids are deterministic,
+    so re-running a write reports existing events instead of duplicating them.
+
+    httplib2 connections can't be shared between threads, so concurrent batches need
+    http_factory to give each worker thread its own. Without it batches run one at a time
+    """
+
+    def __init__(self, service, calendar_id="primary", http_factory=None, batch_size=CALENDAR_BATCH_SIZE, concurrency=CALENDAR_CONCURRENCY, max_attempts=CALENDAR_MAX_ATTEMPTS, backoff=CALENDAR_BACKOFF_SECONDS, max_backoff=CALENDAR_BACKOFF_MAX_SECONDS):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.http_factory = http_factory
+        self.batch_size = batch_size
+        self.concurrency = concurrency if http_factory else 1
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._local = threading.local()
+
+    def _http(self):
+        if self.http_factory is None:
+            return None
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = self.http_factory()
+        return http
+
+    def _request(self, item):
+        events = self.service.events()
+        if item.operation == "get":
+            return events.get(calendarId=self.calendar_id, eventId=item.id)
+        if item.operation == "update":
+            return events.update(calendarId=self.calendar_id, eventId=item.id, body={**item.body, "id": item.id, "status": "confirmed"})
+        return events.insert(calendarId=self.calendar_id, body={**item.body, "id": item.id})
+
+    def _execute(self, items):
+        """
+        Sends one batch and returns {index: (response, exception)}. Runs on a worker thread
+        """
+        responses = {}
+
+        def on_response(request_id, response, exception):
+            responses[int(request_id)] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=on_response)
+        for item in items:
+            batch.add(self._request(item), request_id=str(item.index))
+        batch.execute(http=self._http())
+        return responses
+
+    async def _send(self, items, semaphore):
+        async with semaphore:
+            await acquire_upstream("calendar")
+            try:
+                return await run_blocking(self._execute, items)
+            except Exception as e:
+                # The whole batch failed, e.g. a dropped connection
+                return {item.index: (None, e) for item in items}
+
+    def _advance(self, item, response, error):
+        """
+        Moves an event to its next step. Returns its final result, "retry", or None
+        to send it again with the next operation
+        """
+        if error is None:
+            if item.operation == "get" and response.get("status") == "cancelled":
+                # The event was deleted, which keeps its id reserved. Bring it back
+                item.operation = "update"
+                return None
+            return item.result("exists" if item.operation == "get" else "created", response)
+
+        status = error.resp.status if isinstance(error, HttpError) else None
+        if item.operation == "insert" and status == 409:
+            item.operation = "get"
+            return None
+        item.error = error
+        if is_retryable(error) and item.retries + 1 < self.max_attempts:
+            calendar_retries.inc(1, str(status or "transport"))
+            return "retry"
+        return item.result("failed")
+
+    def _delay(self, retries):
+        delay = min(self.backoff * 2 ** (retries - 1), self.max_backoff)
+        return delay * random.uniform(0.5, 1)
+
+    async def write(self, events, on_result=None):
+        """
+        Writes the event bodies and returns one result dict per event, in input order.
+        on_result(result) is called as soon as each event is settled
+        """
+        loop = asyncio.get_running_loop()
+        waiting = [PendingEvent(i, body) for i, body in enumerate(events)]
+        results = [None] * len(waiting)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while waiting:
+            # Every event backs off on its own schedule. Whatever is due goes out together
+            now = loop.time()
+            due = [item for item in waiting if item.due <= now]
+            if not due:
+                await asyncio.sleep(min(item.due for item in waiting) - now)
+                continue
+            waiting = [item for item in waiting if item.due > now]
+
+            for item in due:
+                item.attempts += 1
+            chunks = [due[i:i + self.batch_size] for i in range(0, len(due), self.batch_size)]
+            responses = {}
+            for chunk_responses in await asyncio.gather(*(self._send(chunk, semaphore) for chunk in chunks)):
+                responses.update(chunk_responses)
+
+            for item in due:
+                response, error = responses.get(item.index, (None, RuntimeError("No response for event")))
+                outcome = self._advance(item, response, error)
+                if outcome is None:
+                    # Follow-up call (get after a 409) goes out right away
+                    waiting.append(item)
+                    continue
+                if outcome == "retry":
+                    item.retries += 1
+                    item.due = loop.time() + self._delay(item.retries)
+                    waiting.append(item)
+                    continue
+                results[item.index] = outcome
+                calendar_events.inc(1, outcome["status"])
+                if on_result:
+                    on_result(outcome)
+        return results
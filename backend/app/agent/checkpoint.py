@@ -0,0 +1,583 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple, WRITES_IDX_MAP, get_checkpoint_id, get_checkpoint_metadata
+from langgraph.checkpoint.memory import InMemorySaver
+from agent.executor import run_blocking
+
+# "memory" keeps threads in this process, "sqlite" shares them across workers and restarts
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+
+# Capacity limits for conversation threads kept in memory
+MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+IDLE_TTL_SECONDS = float(os.getenv("CHECKPOINT_IDLE_TTL", "3600"))
+MAX_CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "20"))
+
+# How often a SQLite worker looks for idle threads to delete
+IDLE_SWEEP_SECONDS = float(os.getenv("CHECKPOINT_IDLE_SWEEP", "60"))
+
+# Blob type for a message list stored as keys into the messages table
+MESSAGE_REFS_TYPE = "msgrefs"
+MESSAGE_KEY_CACHE_SIZE = 4096
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, key)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+"""
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    In-memory checkpointer that evicts idle threads (LRU + TTL) and only keeps
+    the newest checkpoints of each thread so memory stays flat on long-running workers
+    """
+
+    def __init__(self, max_threads=MAX_THREADS, idle_ttl=IDLE_TTL_SECONDS, max_checkpoints=MAX_CHECKPOINTS_PER_THREAD, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.max_checkpoints = max_checkpoints
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+        # thread ID -> last access time, oldest first
+        self._last_access = OrderedDict()
+        # (thread ID, checkpoint NS, checkpoint ID) -> channel versions of that checkpoint
+        self._versions = {}
+        # thread ID -> checkpoint NS -> keys of its blobs, so pruning and eviction
+        # never scan the blobs of other threads
+        self._blob_keys = {}
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id):
+        """
+        Marks a thread as recently used and evicts threads that are idle or over capacity
+        """
+        now = time.monotonic()
+        self._last_access[thread_id] = now
+        self._last_access.move_to_end(thread_id)
+
+        while self._last_access:
+            oldest, last_used = next(iter(self._last_access.items()))
+            if oldest == thread_id:
+                break
+            if len(self._last_access) <= self.max_threads and now - last_used <= self.idle_ttl:
+                break
+            self.delete_thread(oldest)
+            self.evicted_threads += 1
+
+    def _prune(self, thread_id, checkpoint_ns):
+        """
+        Drops the oldest checkpoints of a thread beyond the per-thread cap along with
+        their pending writes and any channel blobs no remaining checkpoint references
+        """
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+
+        # Checkpoint IDs sort by creation time
+        stale = sorted(checkpoints.keys())[:-self.max_checkpoints]
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        self.pruned_checkpoints += len(stale)
+
+        live = set()
+        for checkpoint_id in checkpoints:
+            versions = self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            live.update(versions.items())
+        blob_keys = self._blob_keys[thread_id][checkpoint_ns]
+        for key in [k for k in blob_keys if (k[2], k[3]) not in live]:
+            self.blobs.pop(key, None)
+            blob_keys.discard(key)
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._touch(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._blob_keys.setdefault(thread_id, {}).setdefault(checkpoint_ns, set()).update(
+                (thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()
+            )
+            self._prune(thread_id, checkpoint_ns)
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        # Goes through the thread's own checkpoints and blob keys instead of
+        # InMemorySaver.delete_thread, which scans every thread's writes and blobs
+        with self._lock:
+            for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+                for checkpoint_id in checkpoints:
+                    self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                    self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for blob_keys in self._blob_keys.pop(thread_id, {}).values():
+                for key in blob_keys:
+                    self.blobs.pop(key, None)
+            self._last_access.pop(thread_id, None)
+
+    def stats(self):
+        """
+        Returns thread/checkpoint counts and the approximate bytes held by serialized state
+        """
+        with self._lock:
+            checkpoint_bytes = sum(
+                len(saved[0][1]) + len(saved[1][1])
+                for namespaces in self.storage.values()
+                for checkpoints in namespaces.values()
+                for saved in checkpoints.values()
+            )
+            write_bytes = sum(
+                len(write[2][1]) for writes in self.writes.values() for write in writes.values()
+            )
+            blob_bytes = sum(len(blob[1]) for blob in self.blobs.values())
+            return {
+                "threads": len(self._last_access),
+                "checkpoints": len(self._versions),
+                "memory_bytes": checkpoint_bytes + write_bytes + blob_bytes,
+                "evicted_threads": self.evicted_threads,
+                "pruned_checkpoints": self.pruned_checkpoints,
+            }
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """
+    Durable checkpointer on a local SQLite database in WAL mode. Several worker
+    processes can share the same file so a follow-up message can land on any of them.
+
+    Message lists are stored as deltas: every message is written once to a
+    content-addressed table and each checkpoint only records the list of message keys.
+    Messages and blobs of a graph step go in one transaction with its checkpoint.
+    Pending writes are committed as soon as a task reports them, so finished tasks
+    survive a restart mid-step and are visible to the other workers.
+
+    Like BoundedMemorySaver, only the newest checkpoints of each thread are kept, along
+    with the blobs and messages they reference, and threads nobody wrote to for
+    idle_ttl seconds are deleted.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB_PATH, max_checkpoints=MAX_CHECKPOINTS_PER_THREAD, idle_ttl=IDLE_TTL_SECONDS, sweep_interval=IDLE_SWEEP_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_checkpoints = max_checkpoints
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+        # (thread ID, message id, object id) -> (message, key) for messages already stored by this process.
+        # Holding the message keeps its object id from being reused while cached
+        self._message_keys = OrderedDict()
+
+        with self._conn() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            # Threads saved before access times were tracked start their idle clock now
+            conn.execute("INSERT OR IGNORE INTO threads (thread_id, last_access) SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),))
+
+    def _conn(self):
+        """
+        Returns this thread's connection, opening it on first use
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get_next_version(self, current, channel):
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Serialization
+    def _dump_messages(self, thread_id, messages, rows, stored):
+        """
+        Returns the keys of a message list, queueing rows for messages this process hasn't stored yet
+        """
+        keys = []
+        for message in messages:
+            cache_key = (thread_id, message.id, id(message))
+            cached = self._message_keys.get(cache_key)
+            if cached is not None and cached[0] is message:
+                self._message_keys.move_to_end(cache_key)
+                keys.append(cached[1])
+                continue
+
+            type_, data = self.serde.dumps_typed(message)
+            key = hashlib.blake2b(type_.encode() + data, digest_size=16).hexdigest()
+            rows.append((thread_id, key, type_, data))
+            stored[cache_key] = (message, key)
+            keys.append(key)
+        return keys
+
+    def _dump_value(self, thread_id, value, message_rows, stored):
+        if isinstance(value, list) and value and all(isinstance(m, BaseMessage) and m.id for m in value):
+            keys = self._dump_messages(thread_id, value, message_rows, stored)
+            return (MESSAGE_REFS_TYPE, json.dumps(keys).encode())
+        return self.serde.dumps_typed(value)
+
+    def _load_blobs(self, conn, thread_id, checkpoint_ns, versions):
+        channel_values = {}
+        refs = {}
+        for channel, version in versions.items():
+            row = conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id=? AND checkpoint_ns=? AND channel=? AND version=?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == MESSAGE_REFS_TYPE:
+                refs[channel] = json.loads(row[1])
+            else:
+                channel_values[channel] = self.serde.loads_typed((row[0], row[1]))
+
+        if refs:
+            keys = sorted({key for channel_keys in refs.values() for key in channel_keys})
+            messages = {}
+            # Stay under SQLite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, type_, data in conn.execute(
+                    f"SELECT key, type, blob FROM messages WHERE thread_id=? AND key IN ({placeholders})", [thread_id, *chunk]
+                ):
+                    messages[key] = self.serde.loads_typed((type_, data))
+            for channel, channel_keys in refs.items():
+                channel_values[channel] = [messages[key] for key in channel_keys]
+        return channel_values
+
+    # Retention
+    def _prune(self, conn, thread_id, checkpoint_ns):
+        """
+        Drops the oldest checkpoints of a thread beyond the per-thread cap along with their
+        pending writes, then the blobs and messages no remaining checkpoint references.
+        Runs inside put's transaction. Returns the number of checkpoints dropped
+        """
+        stale = conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_checkpoints),
+        ).fetchall()
+        if not stale:
+            return 0
+        rows = [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id, in stale]
+        conn.executemany("DELETE FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?", rows)
+        conn.executemany("DELETE FROM writes WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?", rows)
+
+        live = set()
+        for type_, data in conn.execute("SELECT type, checkpoint FROM checkpoints WHERE thread_id=? AND checkpoint_ns=?", (thread_id, checkpoint_ns)):
+            live.update((channel, str(version)) for channel, version in self.serde.loads_typed((type_, data))["channel_versions"].items())
+        dead = [
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in conn.execute("SELECT channel, version FROM blobs WHERE thread_id=? AND checkpoint_ns=?", (thread_id, checkpoint_ns))
+            if (channel, version) not in live
+        ]
+        conn.executemany("DELETE FROM blobs WHERE thread_id=? AND checkpoint_ns=? AND channel=? AND version=?", dead)
+
+        # Messages are shared by every checkpoint of the thread, in any namespace
+        referenced = set()
+        for data, in conn.execute("SELECT blob FROM blobs WHERE thread_id=? AND type=?", (thread_id, MESSAGE_REFS_TYPE)):
+            referenced.update(json.loads(data))
+        unused = {key for key, in conn.execute("SELECT key FROM messages WHERE thread_id=?", (thread_id,))} - referenced
+        if unused:
+            conn.executemany("DELETE FROM messages WHERE thread_id=? AND key=?", [(thread_id, key) for key in unused])
+            # Written again if they ever come back
+            for cache_key in [k for k, (_, key) in self._message_keys.items() if k[0] == thread_id and key in unused]:
+                del self._message_keys[cache_key]
+        return len(stale)
+
+    def _evict_idle(self):
+        """
+        Deletes threads nobody wrote to for idle_ttl seconds. Runs at most once per
+        sweep_interval in each process
+        """
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        cutoff = time.time() - self.idle_ttl
+        conn = self._conn()
+        for thread_id, in conn.execute("SELECT thread_id FROM threads WHERE last_access<? LIMIT 1000", (cutoff,)).fetchall():
+            # Skipped if another worker used the thread since
+            if self._delete_thread(thread_id, idle_before=cutoff):
+                self.evicted_threads += 1
+
+    def _row_to_tuple(self, conn, row):
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, data, metadata_type, metadata_data = row
+        checkpoint = self.serde.loads_typed((type_, data))
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(conn, thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_data)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    # Checkpoint API
+    def get_tuple(self, config):
+        conn = self._conn()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints WHERE thread_id=? AND checkpoint_ns=?"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id=?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        row = conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return self._row_to_tuple(conn, row)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        conn = self._conn()
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses = []
+        params = []
+        if config:
+            clauses.append("thread_id=?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns=?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id=?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id<?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        for row in conn.execute(query, params).fetchall():
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield self._row_to_tuple(conn, row)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        values = c.pop("channel_values")
+
+        with self._lock:
+            message_rows = []
+            stored = {}
+            blob_rows = []
+            for channel, version in new_versions.items():
+                type_, data = self._dump_value(thread_id, values[channel], message_rows, stored) if channel in values else ("empty", b"")
+                blob_rows.append((thread_id, checkpoint_ns, channel, str(version), type_, data))
+
+            type_, data = self.serde.dumps_typed(c)
+            metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+            # One transaction per graph step
+            conn = self._conn()
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO messages (thread_id, key, type, blob) VALUES (?, ?, ?, ?)", message_rows)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, blob) VALUES (?, ?, ?, ?, ?, ?)",
+                    blob_rows,
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"), type_, data, metadata_type, metadata_data),
+                )
+                conn.execute("INSERT OR REPLACE INTO threads (thread_id, last_access) VALUES (?, ?)", (thread_id, time.time()))
+                pruned = self._prune(conn, thread_id, checkpoint_ns)
+            self.pruned_checkpoints += pruned
+
+            # Only remember messages as stored once the transaction committed
+            self._message_keys.update(stored)
+            while len(self._message_keys) > MESSAGE_KEY_CACHE_SIZE:
+                self._message_keys.popitem(last=False)
+
+            self._evict_idle()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path))
+
+        # Committed right away: a task that finished must not run again after a restart
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def _delete_thread(self, thread_id, idle_before=None):
+        """
+        Deletes everything saved for a thread. With idle_before, only if the thread
+        wasn't used since. Returns whether it was deleted
+        """
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                if idle_before is not None:
+                    if not conn.execute("DELETE FROM threads WHERE thread_id=? AND last_access<?", (thread_id, idle_before)).rowcount:
+                        return False
+                else:
+                    conn.execute("DELETE FROM threads WHERE thread_id=?", (thread_id,))
+                for table in ("checkpoints", "blobs", "writes", "messages"):
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id=?", (thread_id,))
+            for cache_key in [k for k in self._message_keys if k[0] == thread_id]:
+                del self._message_keys[cache_key]
+            return True
+
+    def delete_thread(self, thread_id):
+        self._delete_thread(thread_id)
+
+    # SQLite calls block, so the async API runs them on the shared executor
+    async def aget_tuple(self, config):
+        return await run_blocking(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await run_blocking(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await run_blocking(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await run_blocking(self.delete_thread, thread_id)
+
+    def stats(self):
+        conn = self._conn()
+        threads, checkpoints = conn.execute("SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints").fetchone()
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "messages": conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+            "blobs": conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0],
+            "writes": conn.execute("SELECT COUNT(*) FROM writes").fetchone()[0],
+            "disk_bytes": sum(os.path.getsize(f) for f in (self.path, self.path + "-wal") if os.path.exists(f)),
+            "evicted_threads": self.evicted_threads,
+            "pruned_checkpoints": self.pruned_checkpoints,
+        }
+
+def get_checkpointer():
+    """
+    Builds the checkpointer selected by CHECKPOINT_BACKEND ("memory" or "sqlite")
+    """
+    if CHECKPOINT_BACKEND == "sqlite":
+        return SqliteSaver()
+    return BoundedMemorySaver()
@@ -0,0 +1,73 @@
+import threading
+import time
+
+class LazyClient:
+    """
+    Thread-safe lazily built client. The factory runs once, on first use or during
+    warm-up, so importing a module never authenticates or opens connections
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.init_seconds = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self.factory()
+                    self.init_seconds = time.perf_counter() - start
+                instance = self._instance
+        return instance
+
+    def is_ready(self):
+        return self._instance is not None
+
+    def override(self, instance):
+        """
+        Replaces the client, e.g. with a stub in benchmarks
+        """
+        with self._lock:
+            self._instance = instance
+
+    def reset(self):
+        with self._lock:
+            self._instance = None
+            self.init_seconds = None
+
+# name -> LazyClient for every client declared through lazy_client()
+registry = {}
+
+def lazy_client(name, factory):
+    """
+    Declares a client that is only built when first used
+    """
+    client = LazyClient(name, factory)
+    registry[name] = client
+    return client
+
+def override(name, instance):
+    registry[name].override(instance)
+
+def warm_up(names):
+    """
+    Builds the named clients ahead of the first request. Failures are reported and
+    left for the first real use to retry. Returns init time per client
+    """
+    timings = {}
+    for name in names:
+        client = registry.get(name)
+        if client is None:
+            print(f"Unknown client {name}, skipping warm-up")
+            continue
+        try:
+            client.get()
+            timings[name] = client.init_seconds
+        except Exception as e:
+            print(f"Failed to warm up {name}: {e}")
+    return timings
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from agent.clients import lazy_client
+
+# Prompt token budget for the messages sent to the main LLM, excluding the system prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# Most recent user turns that are always sent verbatim
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+# Characters of an old tool result kept in its compact form
+CONTEXT_TOOL_CHARS = int(os.getenv("CONTEXT_TOOL_CHARS", "600"))
+
+# Per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+TOKEN_CACHE_SIZE = 20000
+
+# Why token counts are estimates, if the encoding couldn't be loaded
+encoding_error = None
+
+def load_encoding():
+    """
+    Loads the tiktoken encoding, which may download it on first use. Returns False when
+    it can't be loaded (e.g. offline) so counting falls back to a character estimate
+    """
+    global encoding_error
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Falling back to estimated token counts: {e}")
+        encoding_error = repr(e)
+        return False
+
+# Built at warm-up, off the event loop (see WARM_UP_CLIENTS in main.py)
+token_encoding = lazy_client("token_encoding", load_encoding)
+
+def get_encoding():
+    return token_encoding.get()
+
+def token_counting_stats():
+    return {
+        "ready": token_encoding.is_ready(),
+        "estimated": token_encoding.is_ready() and not get_encoding(),
+        "error": encoding_error,
+    }
+
+def count_text_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def message_text(message) -> str:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    if getattr(message, "tool_calls", None):
+        content += json.dumps([{"name": c["name"], "args": c["args"]} for c in message.tool_calls])
+    return content
+
+class TokenCounter:
+    """
+    Token counts cached per message id (and variant), so each message is only encoded once
+    """
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, message, variant="full") -> int:
+        key = (message.id, variant) if message.id else None
+        if key is not None:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+
+        tokens = count_text_tokens(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = tokens
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        return tokens
+
+def compact_message(message, tool_chars=CONTEXT_TOOL_CHARS):
+    """
+    Smaller stand-in for a bulky old message: tool outputs are truncated and structured
+    UI payloads (flight cards, price matrices, itineraries) are replaced by a short reference
+    """
+    if isinstance(message, ToolMessage):
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        if len(content) <= tool_chars:
+            return message
+        note = f"\n[{message.name} output truncated, {len(content)} characters in total]"
+        return message.model_copy(update={"content": content[:tool_chars] + note})
+
+    event = message.additional_kwargs.get("event") if isinstance(message, AIMessage) else None
+    if event:
+        try:
+            payload = json.loads(message.content)
+        except (TypeError, ValueError):
+            return message
+        if event == "flight_response":
+            summary = f"[Showed the user {len(payload.get('flights_data') or [])} flight options] {payload.get('message', '')}"
+        elif event == "price_matrix":
+            matrix = payload.get("matrix") or {}
+            outbound_dates, return_dates = matrix.get("outbound_dates") or [], matrix.get("return_dates") or []
+            priced = sorted(
+                (price, outbound, back)
+                for outbound, row in zip(outbound_dates, matrix.get("prices") or [])
+                for back, price in zip(return_dates or [None], row)
+                if price is not None
+            )
+            cheapest = ", ".join(f"{outbound}{f'/{back}' if back else ''} {price:,.0f}" for price, outbound, back in priced[:3])
+            summary = f"[Showed the user a price matrix for {len(outbound_dates) * max(len(return_dates), 1)} date combinations] Cheapest in {matrix.get('currency', 'USD')}: {cheapest or 'none found'}"
+        elif event == "itinerary_response":
+            summary = "[Showed the user the generated itinerary]"
+        elif event == "error":
+            summary = f"[Error from {payload.get('tool_name')}]"
+        else:
+            return message
+        return message.model_copy(update={"content": summary})
+    return message
+
+def split_turns(messages):
+    """
+    Groups messages into turns that each start with a user message, so tool calls and
+    their results always stay together
+    """
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def render_turns(turns):
+    lines = []
+    for turn in turns:
+        for message in turn:
+            if isinstance(message, ToolMessage):
+                lines.append(f"tool {message.name}: {message_text(message)}")
+            elif message.content or getattr(message, "tool_calls", None):
+                lines.append(f"{message.type}: {message_text(message)}")
+    return "\n".join(lines)
+
+class ContextAssembler:
+    """
+    Builds the message list for the main LLM within a token budget. Recent turns are
+    sent verbatim, older turns are compacted, and when that's not enough the oldest
+    turns are folded into a rolling summary kept in the graph state
+    """
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, keep_turns=CONTEXT_KEEP_TURNS, tool_chars=CONTEXT_TOOL_CHARS, low_water=0.7):
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.tool_chars = tool_chars
+        # Fold down to this fraction of the budget so summaries don't run every turn
+        self.low_water = low_water
+        self.counter = TokenCounter()
+
+    def turn_tokens(self, turn, compact):
+        if not compact:
+            return sum(self.counter.count(m) for m in turn)
+        return sum(self.counter.count(compact_message(m, self.tool_chars), "compact") for m in turn)
+
+    async def assemble(self, messages, memory=None, memory_until=None, summarize=None):
+        """
+        Returns (messages for the LLM, state update). The update holds a new rolling
+        memory when old turns were folded into it, otherwise it is empty
+        """
+        # Skip turns that are already part of the rolling memory
+        if memory_until:
+            ids = [m.id for m in messages]
+            if memory_until in ids:
+                messages = messages[ids.index(memory_until) + 1:]
+
+        turns = split_turns(messages)
+        recent = turns[-self.keep_turns:] if self.keep_turns else []
+        older = turns[:len(turns) - len(recent)]
+
+        memory_tokens = count_text_tokens(memory) if memory else 0
+        older_tokens = sum(self.turn_tokens(t, True) for t in older)
+        recent_compact = False
+        tokens = memory_tokens + older_tokens + sum(self.turn_tokens(t, False) for t in recent)
+
+        # Recent tool outputs were already answered, so compact them before folding anything.
+        # The current turn always stays verbatim
+        if tokens > self.budget and len(recent) > 1:
+            recent_compact = True
+            tokens = memory_tokens + older_tokens + sum(self.turn_tokens(t, True) for t in recent[:-1]) + self.turn_tokens(recent[-1], False)
+
+        update = {}
+        if tokens > self.budget and older and summarize is not None:
+            folded = []
+            while older and tokens > self.budget * self.low_water:
+                turn = older.pop(0)
+                tokens -= self.turn_tokens(turn, True)
+                folded.append(turn)
+            try:
+                memory = await summarize(memory, render_turns([[compact_message(m, self.tool_chars) for m in t] for t in folded]))
+                update = {"memory": memory, "memory_until": folded[-1][-1].id}
+            except Exception as e:
+                # Keep the turns rather than lose them when the summary fails
+                print(f"Failed to summarize old turns: {e}")
+                older = folded + older
+
+        assembled = []
+        if memory:
+            assembled.append(SystemMessage(content=f"Summary of the earlier conversation:\n{memory}"))
+        for turn in older:
+            assembled.extend(compact_message(m, self.tool_chars) for m in turn)
+        for i, turn in enumerate(recent):
+            if recent_compact and i < len(recent) - 1:
+                assembled.extend(compact_message(m, self.tool_chars) for m in turn)
+            else:
+                assembled.extend(turn)
+        return assembled, update
+
+def summary_prompt(memory, transcript):
+    previous = f"Current summary:\n{memory}\n\n" if memory else ""
+    return (
+        "You keep a running memory of a travel planning conversation. "
+        f"{previous}"
+        "Update the summary with the conversation below. Keep destinations, dates, travelers, budget, "
+        "preferences, flights and itinerary choices, and anything the user asked to remember. "
+        "Be concise, at most 200 words.\n\n"
+        f"{transcript}"
+    )
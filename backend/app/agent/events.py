@@ -0,0 +1,12 @@
+from langgraph.config import get_stream_writer
+
+def emit(event: dict):
+    """
+    Pushes a structured event to the /chat stream while a node or tool runs.
+    Does nothing outside of a graph run
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer(event)
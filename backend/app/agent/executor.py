@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt.tool_node import INVALID_TOOL_NAME_ERROR_TEMPLATE, TOOL_CALL_ERROR_TEMPLATE, msg_content_output
+from agent.metrics import blocking_cancelled, blocking_queue_wait, blocking_wasted_seconds, tool_queue_wait
+
+# Bounded pool for SDKs that only have blocking APIs (praw, googleapiclient, serpapi).
+# Keeps their network waits off the event loop without spawning unbounded threads.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+
+# Defaults for tools without their own limits
+DEFAULT_TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="viator-blocking")
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking call on the shared executor and awaits its result. If the caller
+    is cancelled, a call still waiting for a thread is dropped; one already running
+    can't be interrupted, so its remaining time is counted as wasted work
+    """
+    # Carry context vars (callbacks, stream writers) over to the worker thread
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+    started = None
+
+    def call():
+        nonlocal started
+        started = time.perf_counter()
+        blocking_queue_wait.observe(started - submitted)
+        return ctx.run(func, *args, **kwargs)
+
+    future = _executor.submit(call)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        if future.cancel():
+            blocking_cancelled.inc(1, "queued")
+        else:
+            blocking_cancelled.inc(1, "running")
+            future.add_done_callback(lambda _: blocking_wasted_seconds.inc(time.perf_counter() - started))
+        raise
+
+def shutdown_executor():
+    """
+    Stops the shared executor. Used when the app shuts down
+    """
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one AI message concurrently. Each tool gets its own
+    concurrency limit and per-call timeout, and results keep the order of the calls.
+    Built once per graph instead of once per tools step.
+    """
+
+    def __init__(self, tools, concurrency=None, timeouts=None, default_concurrency=DEFAULT_TOOL_CONCURRENCY, default_timeout=DEFAULT_TOOL_TIMEOUT):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.concurrency = concurrency or {}
+        self.timeouts = timeouts or {}
+        self.default_concurrency = default_concurrency
+        self.default_timeout = default_timeout
+
+        # Semaphores belong to an event loop, so keep one set per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, name):
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        if name not in semaphores:
+            semaphores[name] = asyncio.Semaphore(self.concurrency.get(name, self.default_concurrency))
+        return semaphores[name]
+
+    async def _run_one(self, call, config):
+        name = call["name"]
+        tool = self.tools_by_name.get(name)
+        if tool is None:
+            return ToolMessage(
+                content=INVALID_TOOL_NAME_ERROR_TEMPLATE.format(requested_tool=name, available_tools=", ".join(self.tools_by_name)),
+                name=name,
+                tool_call_id=call["id"],
+                status="error",
+            )
+
+        timeout = self.timeouts.get(name, self.default_timeout)
+        try:
+            queued = time.perf_counter()
+            async with self._semaphore(name):
+                tool_queue_wait.observe(time.perf_counter() - queued, name)
+                response = await asyncio.wait_for(tool.ainvoke({**call, "type": "tool_call"}, config), timeout)
+            response.content = msg_content_output(response.content)
+            return response
+        except asyncio.TimeoutError:
+            print(f"Tool {name} timed out after {timeout}s")
+            content = f"Error: {name} timed out after {timeout} seconds. Try again or continue without it."
+        except Exception as e:
+            print(f"Tool {name} failed: {e}")
+            content = TOOL_CALL_ERROR_TEMPLATE.format(error=repr(e))
+        return ToolMessage(content=content, name=name, tool_call_id=call["id"], status="error")
+
+    async def ainvoke(self, messages, config=None):
+        """
+        Executes the tool calls in the last message and returns their ToolMessages in call order
+        """
+        tool_calls = messages[-1].tool_calls
+        return await asyncio.gather(*(self._run_one(call, config) for call in tool_calls))
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from datetime import date, timedelta
+from agent.metrics import counter
+
+# Most per-date searches one flexible-date search may fan out to, e.g. 7 outbound x 5 return days
+FLEX_MAX_SEARCHES = int(os.getenv("FLEX_MAX_SEARCHES", "35"))
+# Per-date searches in flight at once for one flexible-date search. The serpapi budget still applies
+FLEX_CONCURRENCY = int(os.getenv("FLEX_CONCURRENCY", "6"))
+# Cheapest date combinations returned with their full flight
+FLEX_CHEAPEST = int(os.getenv("FLEX_CHEAPEST", "3"))
+
+flex_searches = counter("agent_flex_flight_searches_total", "Per-date searches behind flexible-date flight searches, by where the result came from", ("source",))
+
+def date_range(start: str, end: str = "") -> list:
+    """
+    Every date from start to end inclusive, as YYYY-MM-DD strings
+    """
+    first, last = date.fromisoformat(start), date.fromisoformat(end or start)
+    if last < first:
+        first, last = last, first
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+def date_pairs(outbound_dates: list, return_dates: list) -> list:
+    """
+    (outbound, return) combinations worth searching. One-way trips have no return dates
+    """
+    if not return_dates:
+        return [(outbound, None) for outbound in outbound_dates]
+    return [(outbound, back) for outbound in outbound_dates for back in return_dates if back >= outbound]
+
+def cheapest(flights) -> dict:
+    priced = [flight for flight in flights or [] if isinstance(flight.get("price"), (int, float))]
+    return min(priced, key=lambda flight: flight["price"], default=None)
+
+async def fan_out(pairs: list, search, concurrency: int = FLEX_CONCURRENCY) -> dict:
+    """
+    Awaits search(outbound, return) -> (flights, fetched) for every pair, at most
+    concurrency at a time. Returns {pair: flights}, None for searches that failed so
+    one bad date doesn't sink the whole matrix
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(pair):
+        async with semaphore:
+            try:
+                flights, fetched = await search(*pair)
+            except Exception as e:
+                print(f"Flexible search failed for {pair}: {e!r}")
+                flex_searches.inc(1, "error")
+                return pair, None
+        flex_searches.inc(1, "upstream" if fetched else "cache")
+        return pair, flights
+
+    return dict(await asyncio.gather(*(one(pair) for pair in pairs)))
+
+def price_matrix(outbound_dates: list, return_dates: list, results: dict, currency: str = "USD", k: int = FLEX_CHEAPEST) -> dict:
+    """
+    Cheapest price per outbound (rows) x return (columns) date, None where there was
+    nothing to search or no priced flight, plus the k cheapest combinations
+    """
+    prices = []
+    options = []
+    for outbound in outbound_dates:
+        row = []
+        for back in return_dates or [None]:
+            best = cheapest(results.get((outbound, back)))
+            row.append(best["price"] if best else None)
+            if best:
+                options.append({"outbound_date": outbound, "return_date": back, "price": best["price"], "flight": best})
+        prices.append(row)
+    options.sort(key=lambda option: (option["price"], option["outbound_date"], option["return_date"] or ""))
+    return {
+        "currency": currency,
+        "outbound_dates": outbound_dates,
+        "return_dates": return_dates,
+        "prices": prices,
+        "cheapest": options[:k],
+        "searches": len(results),
+        "failed": sum(1 for flights in results.values() if flights is None),
+    }
+
+def short_date(day: str) -> str:
+    return date.fromisoformat(day).strftime("%a %b %d")
+
+def describe_matrix(matrix: dict) -> str:
+    """
+    Markdown price table and a line per cheapest option, for the chat message
+    """
+    currency = matrix["currency"]
+    if not matrix["cheapest"]:
+        return "I couldn't find any priced flights in those date windows. Want to try other dates or airports?"
+
+    def cell(price):
+        return "–" if price is None else f"{price:,.0f}"
+
+    lines = [f"Cheapest round trip per date in {currency}, departing (rows) and returning (columns):" if matrix["return_dates"] else f"Cheapest one-way price per departure date in {currency}:", ""]
+    if matrix["return_dates"]:
+        lines.append("| Depart \\ Return | " + " | ".join(short_date(day) for day in matrix["return_dates"]) + " |")
+        lines.append("|---" * (len(matrix["return_dates"]) + 1) + "|")
+    else:
+        lines.append("| Depart | Price |")
+        lines.append("|---|---|")
+    for outbound, row in zip(matrix["outbound_dates"], matrix["prices"]):
+        lines.append(f"| {short_date(outbound)} | " + " | ".join(cell(price) for price in row) + " |")
+
+    lines.append("")
+    lines.append("The cheapest options:")
+    for option in matrix["cheapest"]:
+        dates = short_date(option["outbound_date"]) + (f" – {short_date(option['return_date'])}" if option["return_date"] else "")
+        lines.append(f"- {dates}: {option['price']:,.0f} {currency}")
+    if matrix["failed"]:
+        lines.append(f"{matrix['failed']} of the {matrix['searches']} date searches failed and are left blank.")
+    lines.append("Want me to look closer at one of these dates?")
+    return "\n".join(lines)
@@ -0,0 +1,214 @@
+import os
+from dataclasses import dataclass
+import numpy as np
+
+# "fast" ranks flights in Python and templates the message, "llm" asks gpt-4o to pick and summarize
+FLIGHT_SUMMARY_MODE = os.getenv("FLIGHT_SUMMARY_MODE", "fast")
+
+# Number of pre-ranked flights the summarizer LLM gets to choose from
+FLIGHT_SHORTLIST_SIZE = int(os.getenv("FLIGHT_SHORTLIST_SIZE", "8"))
+
+@dataclass(slots=True, frozen=True)
+class FlightOption:
+    """
+    Compact view of one SerpAPI flight result. index points back at the full entry
+    """
+    index: int
+    price: float
+    total_duration: int
+    stops: int
+    airlines: tuple
+    departure_time: str
+    arrival_time: str
+
+    def to_prompt(self) -> dict:
+        """
+        Minimal dict sent to the LLM instead of the raw SerpAPI entry
+        """
+        return {
+            "index": self.index,
+            "price": None if self.price == float("inf") else self.price,
+            "duration_min": self.total_duration,
+            "stops": self.stops,
+            "airlines": list(self.airlines),
+            "depart": self.departure_time,
+            "arrive": self.arrival_time,
+        }
+
+def compact_flight(index: int, flight: dict) -> FlightOption:
+    """
+    Extracts the fields used for ranking from a SerpAPI best_flights/other_flights entry
+    """
+    legs = flight.get("flights") or [{}]
+    airlines = tuple(dict.fromkeys(leg.get("airline") for leg in legs if leg.get("airline")))
+    total_duration = flight.get("total_duration") or sum(leg.get("duration", 0) for leg in legs)
+    price = flight.get("price")
+
+    return FlightOption(
+        index=index,
+        price=float(price) if isinstance(price, (int, float)) else float("inf"),
+        total_duration=int(total_duration),
+        stops=len(flight.get("layovers") or []) if "layovers" in flight else max(len(legs) - 1, 0),
+        airlines=airlines,
+        departure_time=legs[0].get("departure_airport", {}).get("time", ""),
+        arrival_time=legs[-1].get("arrival_airport", {}).get("time", ""),
+    )
+
+def compact_flights(flights: list) -> list:
+    return [compact_flight(i, flight) for i, flight in enumerate(flights)]
+
+def dominates(a: FlightOption, b: FlightOption) -> bool:
+    """
+    True when a is at least as good as b on price, duration and stops, and better on one
+    """
+    return (
+        a.price <= b.price and a.total_duration <= b.total_duration and a.stops <= b.stops
+        and (a.price < b.price or a.total_duration < b.total_duration or a.stops < b.stops)
+    )
+
+def pareto_front(options: list) -> list:
+    """
+    Flights not dominated by any other flight on price, duration and stops
+    """
+    return [a for a in options if not any(dominates(b, a) for b in options if b is not a)]
+
+def normalizer(values):
+    """
+    Returns a function scaling values to 0..1 over the given range. Missing prices (inf) map to 1
+    """
+    finite = [v for v in values if v != float("inf")] or [0.0]
+    low, high = min(finite), max(finite)
+
+    def norm(value):
+        if value == float("inf"):
+            return 1.0
+        return 0.0 if high == low else (value - low) / (high - low)
+    return norm
+
+def shortlist(options: list, k: int = FLIGHT_SHORTLIST_SIZE) -> list:
+    """
+    Top k flights taken front by front from the Pareto layers, best balanced first
+    """
+    norm_price = normalizer([o.price for o in options])
+    norm_duration = normalizer([o.total_duration for o in options])
+    norm_stops = normalizer([o.stops for o in options])
+
+    # Sum of price, duration and stops normalized over the result set. Lower is better
+    def balance_score(o):
+        return norm_price(o.price) + norm_duration(o.total_duration) + norm_stops(o.stops)
+
+    remaining = list(options)
+    picked = []
+    while remaining and len(picked) < k:
+        front = pareto_front(remaining)
+        front.sort(key=lambda o: (balance_score(o), o.index))
+        picked.extend(front[:k - len(picked)])
+        front_ids = {id(o) for o in front}
+        remaining = [o for o in remaining if id(o) not in front_ids]
+    return picked
+
+@dataclass(slots=True)
+class RankingWeights:
+    """
+    Relative weight of each criterion in FlightRanker scores, plus the preferred departure hours
+    """
+    price: float = 0.45
+    duration: float = 0.3
+    stops: float = 0.2
+    departure: float = 0.05
+    earliest_departure: int = 7
+    latest_departure: int = 21
+
+def departure_hour(option: FlightOption) -> float:
+    """
+    Departure time as fractional hours, or noon when SerpAPI didn't give one
+    """
+    try:
+        hours, minutes = option.departure_time.split(" ")[-1].split(":")
+        return int(hours) + int(minutes) / 60
+    except ValueError:
+        return 12.0
+
+class FlightRanker:
+    """
+    Deterministic weighted scoring of flights on price, duration, stops and how far the
+    departure falls outside the preferred window. Large result sets are scored with numpy
+    """
+
+    def __init__(self, weights: RankingWeights = None, vectorize_threshold: int = 64):
+        self.weights = weights or RankingWeights()
+        self.vectorize_threshold = vectorize_threshold
+
+    def _window_penalty(self, hour):
+        w = self.weights
+        return max(w.earliest_departure - hour, hour - w.latest_departure, 0) / 12
+
+    def _scores_python(self, options):
+        w = self.weights
+        norm_price = normalizer([o.price for o in options])
+        norm_duration = normalizer([o.total_duration for o in options])
+        norm_stops = normalizer([o.stops for o in options])
+
+        return [
+            w.price * norm_price(o.price)
+            + w.duration * norm_duration(o.total_duration)
+            + w.stops * norm_stops(o.stops)
+            + w.departure * self._window_penalty(departure_hour(o))
+            for o in options
+        ]
+
+    def _scores_numpy(self, options):
+        w = self.weights
+        values = np.array([(o.price, o.total_duration, o.stops, departure_hour(o)) for o in options], dtype=float)
+        missing_price = np.isinf(values[:, 0])
+        if missing_price.all():
+            values[:, 0] = 0
+        else:
+            values[missing_price, 0] = values[~missing_price, 0].max()
+
+        criteria = values[:, :3]
+        low = criteria.min(axis=0)
+        spread = criteria.max(axis=0) - low
+        normalized = np.divide(criteria - low, spread, out=np.zeros_like(criteria), where=spread > 0)
+        normalized[missing_price, 0] = 1.0
+
+        hours = values[:, 3]
+        penalty = np.maximum.reduce([w.earliest_departure - hours, hours - w.latest_departure, np.zeros_like(hours)]) / 12
+        return (normalized @ np.array([w.price, w.duration, w.stops]) + w.departure * penalty).tolist()
+
+    def scores(self, options: list) -> list:
+        """
+        Score per option, lower is better
+        """
+        if not options:
+            return []
+        if len(options) >= self.vectorize_threshold:
+            return self._scores_numpy(options)
+        return self._scores_python(options)
+
+    def rank(self, options: list, k: int = 3) -> list:
+        """
+        Best k options, ties broken by original order
+        """
+        scored = sorted(zip(self.scores(options), options), key=lambda pair: (pair[0], pair[1].index))
+        return [option for _, option in scored[:k]]
+
+def format_duration(minutes: int) -> str:
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m" if minutes else f"{hours}h"
+
+def describe_picks(picks: list, currency: str = "USD") -> str:
+    """
+    Templated summary of the ranked flights, used instead of an LLM-written message
+    """
+    if not picks:
+        return "I couldn't find any flights for that search. Want to try different dates or airports?"
+
+    lines = [f"Here are the {len(picks)} flights that balance price, travel time and stops best:"]
+    for option in picks:
+        stops = "nonstop" if option.stops == 0 else f"{option.stops} stop" + ("s" if option.stops > 1 else "")
+        price = "price unavailable" if option.price == float("inf") else f"{option.price:,.0f} {currency}"
+        airlines = ", ".join(option.airlines) or "Unknown airline"
+        lines.append(f"- {airlines}: {price}, {format_duration(option.total_duration)}, {stops}, departing {option.departure_time}")
+    lines.append("Let me know if you'd like to book one of these or search again with different options.")
+    return "\n".join(lines)
@@ -0,0 +1,166 @@
+import importlib.util
+import os
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept per upstream. Keep-alive saves a TCP + TLS handshake per call
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# HTTP/2 multiplexes concurrent calls over one connection. Needs the optional h2 package
+HTTP2 = os.getenv("HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+class PoolStats:
+    """
+    Request counters of one pool, shared by every thread and event loop using it
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def end(self, started, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += failed
+            self.seconds += time.perf_counter() - started
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_seconds": self.seconds / self.requests if self.requests else 0.0,
+        }
+
+# pool name -> function returning its stats
+pools = {}
+
+def pool_stats():
+    """
+    Request and connection counts of every pool, for /stats and /metrics
+    """
+    return {name: stats() for name, stats in pools.items()}
+
+def httpx_connections(transport):
+    # httpcore keeps its pool on the transport; there is no public accessor
+    pool = getattr(transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"connections": len(connections), "idle_connections": idle, "max_connections": getattr(pool, "_max_connections", None) or 0}
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, stats):
+        self.transport = transport
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        started = self.stats.start()
+        failed = True
+        try:
+            response = await self.transport.handle_async_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.end(started, failed)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class CountingSyncTransport(httpx.BaseTransport):
+    def __init__(self, transport, stats):
+        self.transport = transport
+        self.stats = stats
+
+    def handle_request(self, request):
+        started = self.stats.start()
+        failed = True
+        try:
+            response = self.transport.handle_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.end(started, failed)
+
+    def close(self):
+        self.transport.close()
+
+def httpx_settings(max_connections, timeout):
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=min(HTTP_MAX_KEEPALIVE, max_connections), keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    return limits, httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT)
+
+def async_client(name, max_connections=HTTP_MAX_CONNECTIONS, timeout=60.0, **kwargs):
+    """
+    Pooled httpx.AsyncClient for one upstream. Build it once (e.g. in a lazy client)
+    and share it; connections are bound to the event loop that first uses them
+    """
+    stats = PoolStats(name)
+    limits, timeout = httpx_settings(max_connections, timeout)
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=HTTP2)
+    pools[f"{name}_async"] = lambda: {**stats.as_dict(), **httpx_connections(transport)}
+    return httpx.AsyncClient(transport=CountingTransport(transport, stats), timeout=timeout, **kwargs)
+
+def sync_client(name, max_connections=HTTP_MAX_CONNECTIONS, timeout=60.0, **kwargs):
+    """
+    Pooled httpx.Client for one upstream, safe to share between worker threads
+    """
+    stats = PoolStats(name)
+    limits, timeout = httpx_settings(max_connections, timeout)
+    transport = httpx.HTTPTransport(limits=limits, http2=HTTP2)
+    pools[f"{name}_sync"] = lambda: {**stats.as_dict(), **httpx_connections(transport)}
+    return httpx.Client(transport=CountingSyncTransport(transport, stats), timeout=timeout, **kwargs)
+
+class PooledSession(requests.Session):
+    """
+    requests.Session with a connection pool sized for the worker threads using it,
+    for SDKs built on requests (praw, serpapi)
+    """
+
+    def __init__(self, name, max_connections=HTTP_MAX_CONNECTIONS, timeout=60.0):
+        super().__init__()
+        self.stats = PoolStats(name)
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+        pools[name] = lambda: {**self.stats.as_dict(), **self.connections()}
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (HTTP_CONNECT_TIMEOUT, self.timeout)
+        started = self.stats.start()
+        failed = True
+        try:
+            response = super().send(request, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.end(started, failed)
+
+    def connections(self):
+        manager = self.adapter.poolmanager
+        opened = idle = 0
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                # The queue holds None placeholders for connections not opened yet
+                idle += sum(1 for connection in list(pool.pool.queue) if connection is not None) if pool.pool else 0
+        return {"connections_opened": opened, "idle_connections": idle}
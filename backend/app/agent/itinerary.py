@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import os
+import re
+import time
+from datetime import date, timedelta
+from pydantic import ValidationError
+from agent.events import emit
+from agent.schemas import Activity, DayPlan
+
+# "stream" parses days out of one streamed generation, "parallel" plans every day
+# concurrently from a shared outline, "single" waits for the whole JSON
+ITINERARY_MODE = os.getenv("ITINERARY_MODE", "stream")
+
+ITINERARY_FORMAT = """Return only structured JSON in this format:
+        class Activity(BaseModel):
+            time: str
+            title: str
+            description: str
+
+        class DayPlan(BaseModel):
+            date: str
+            activities: List[Activity]
+
+        class Itinerary(BaseModel):
+            location: str
+            days: List[DayPlan]"""
+
+# Time to first day and total time of recent generations, in seconds
+timings = {"first_day": [], "total": []}
+MAX_TIMINGS = 100
+
+def record_timing(name, seconds):
+    samples = timings[name]
+    samples.append(seconds)
+    del samples[:-MAX_TIMINGS]
+
+def itinerary_prompt(location, start_date, end_date, interest_text):
+    return (
+        f"Plan a multi-day trip to {location} from {start_date} to {end_date}. "
+        f"Tailor it to the following interests: {interest_text}. "
+        f"{ITINERARY_FORMAT}"
+    )
+
+WEEKDAYS = re.compile(r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|weekend)s?\b", re.IGNORECASE)
+
+def trip_dates(start_date, end_date):
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+class DayEmitter:
+    """
+    Validates finished days and pushes each one to the client as an itinerary_day event
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self.start = time.perf_counter()
+        self.first_day = None
+
+    def __call__(self, index, day):
+        try:
+            day = DayPlan.model_validate(day).model_dump()
+        except ValidationError:
+            return
+        elapsed = time.perf_counter() - self.start
+        if self.first_day is None:
+            self.first_day = elapsed
+            record_timing("first_day", elapsed)
+            print(f"first itinerary day after {elapsed:.2f}s")
+        emit({"type": "itinerary_day", "index": index, "location": self.location, "day": day, "elapsed": elapsed})
+
+    def done(self):
+        elapsed = time.perf_counter() - self.start
+        record_timing("total", elapsed)
+        print(f"itinerary finished after {elapsed:.2f}s")
+
+async def stream_itinerary(llm, location, start_date, end_date, interest_text):
+    """
+    Streams one JSON generation and emits each day as soon as the next one starts
+    """
+    emitter = DayEmitter(location)
+    result = {}
+    emitted = 0
+    async for partial in llm.astream(itinerary_prompt(location, start_date, end_date, interest_text)):
+        if not isinstance(partial, dict):
+            continue
+        result = partial
+        days = partial.get("days") or []
+        # Every day but the last one in a partial result is complete
+        while emitted < len(days) - 1:
+            emitter(emitted, days[emitted])
+            emitted += 1
+
+    days = result.get("days") or []
+    while emitted < len(days):
+        emitter(emitted, days[emitted])
+        emitted += 1
+    emitter.done()
+    return result
+
+async def parallel_itinerary(llm, location, start_date, end_date, interest_text):
+    """
+    Plans a short outline first, then generates every day concurrently with the
+    outline as shared context so days don't repeat each other
+    """
+    emitter = DayEmitter(location)
+    dates = trip_dates(start_date, end_date)
+
+    outline = await llm.ainvoke(
+        f"Outline a trip to {location} from {start_date} to {end_date} tailored to: {interest_text}. "
+        f"Give each day a distinct focus (area, theme, main highlights) without repeating highlights across days. "
+        'Return only JSON like {"days": [{"date": "YYYY-MM-DD", "focus": "..."}]} with one entry for each of these dates: '
+        f"{', '.join(dates)}"
+    )
+    focus = {d.get("date"): d.get("focus", "") for d in outline.get("days", []) if isinstance(d, dict)}
+    outline_text = "\n".join(f"{d}: {focus.get(d, '')}" for d in dates)
+
+    async def plan_day(index, day):
+        result = await llm.ainvoke(
+            f"You are planning day {index + 1} of {len(dates)} of a trip to {location}, tailored to: {interest_text}. "
+            f"This is the plan for the whole trip:\n{outline_text}\n"
+            f"Plan only {day}, following its focus and not repeating other days. "
+            'Return only JSON like {"date": "YYYY-MM-DD", "activities": [{"time": "...", "title": "...", "description": "..."}]}'
+        )
+        result["date"] = day
+        emitter(index, result)
+        return result
+
+    days = await asyncio.gather(*(plan_day(i, d) for i, d in enumerate(dates)))
+    emitter.done()
+    return {"location": location, "days": list(days)}
+
+async def build_itinerary(llm, location, start_date, end_date, interest_text, mode=None):
+    """
+    Generates an itinerary with the configured mode, streaming days to the client when possible
+    """
+    mode = mode or ITINERARY_MODE
+    if mode == "parallel":
+        try:
+            trip_dates(start_date, end_date)
+        except ValueError:
+            mode = "stream"
+        else:
+            return await parallel_itinerary(llm, location, start_date, end_date, interest_text)
+    if mode == "stream":
+        return await stream_itinerary(llm, location, start_date, end_date, interest_text)
+
+    emitter = DayEmitter(location)
+    result = await llm.ainvoke(itinerary_prompt(location, start_date, end_date, interest_text))
+    for index, day in enumerate(result.get("days") or []):
+        emitter(index, day)
+    emitter.done()
+    return result
+
+def emit_itinerary(itinerary):
+    """
+    Pushes a ready itinerary (e.g. from the cache) to the client day by day
+    """
+    emitter = DayEmitter(itinerary.get("location"))
+    for index, day in enumerate(itinerary.get("days") or []):
+        emitter(index, day)
+    emitter.done()
+
+def redate_itinerary(itinerary, location, dates):
+    """
+    Copy of a stored itinerary moved to new dates, day i of the trip on dates[i]
+    """
+    return {
+        "location": location,
+        "days": [{"date": day_date, "activities": [dict(activity) for activity in day["activities"]]} for day, day_date in zip(itinerary["days"], dates)],
+    }
+
+def weekday_sensitive(itinerary, old_dates):
+    """
+    Indexes of days with activities that name a weekday ("Sunday market") and now
+    fall on a different weekday than they were planned for
+    """
+    moved = []
+    for index, (day, old_date) in enumerate(zip(itinerary["days"], old_dates)):
+        if date.fromisoformat(day["date"]).weekday() == date.fromisoformat(old_date).weekday():
+            continue
+        if any(WEEKDAYS.search(f"{activity['title']} {activity['description']}") for activity in day["activities"]):
+            moved.append(index)
+    return moved
+
+async def personalize_itinerary(llm, itinerary, old_interests, interests, redated_days=()):
+    """
+    Adapts a cached itinerary to different interests and/or new weekdays. The LLM only
+    returns the activities to replace, so it writes a handful of activities instead of
+    the whole trip. Returns the itinerary with the replacements applied
+    """
+    added = [interest for interest in interests if interest not in old_interests]
+    removed = [interest for interest in old_interests if interest not in interests]
+    outline = "\n".join(
+        f"Day {i} ({date.fromisoformat(day['date']).strftime('%A %Y-%m-%d')}): " + "; ".join(f"[{j}] {a['time']} {a['title']}" for j, a in enumerate(day["activities"]))
+        for i, day in enumerate(itinerary["days"])
+    )
+    asks = []
+    if added or removed:
+        asks.append(f"It was planned for these interests: {', '.join(old_interests) or 'none given'}. The traveler's interests are: {', '.join(interests) or 'none given'}. Swap activities so the new interests ({', '.join(added) or 'none'}) are covered and the dropped ones ({', '.join(removed) or 'none'}) are not the focus.")
+    if redated_days:
+        asks.append(f"Days {', '.join(str(i) for i in redated_days)} moved to another weekday. Replace activities that only happen on specific weekdays if they no longer fit.")
+    result = await llm.ainvoke(
+        f"This is an itinerary for {itinerary['location']}:\n{outline}\n"
+        + " ".join(asks)
+        + " Keep everything else as it is. "
+        'Return only JSON like {"changes": [{"day": 0, "activity": 1, "time": "...", "title": "...", "description": "..."}]} '
+        "where day and activity are the numbers of the activity to replace."
+    )
+
+    personalized = copy.deepcopy(itinerary)
+    days = personalized["days"]
+    for change in (result or {}).get("changes") or []:
+        try:
+            day, index = int(change["day"]), int(change["activity"])
+            activity = Activity.model_validate(change).model_dump()
+        except (KeyError, TypeError, ValueError, ValidationError):
+            continue
+        if not 0 <= day < len(days):
+            continue
+        activities = days[day]["activities"]
+        if 0 <= index < len(activities):
+            activities[index] = activity
+        elif index == len(activities):
+            activities.append(activity)
+    return personalized
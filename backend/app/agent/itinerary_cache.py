@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from agent.itinerary import emit_itinerary, redate_itinerary, trip_dates, weekday_sensitive
+from agent.metrics import counter
+from agent.text import normalize_text
+
+ITINERARY_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "256"))
+# Itineraries don't go stale like prices, but venues close and seasons change
+ITINERARY_CACHE_TTL = float(os.getenv("ITINERARY_CACHE_TTL", str(7 * 24 * 3600)))
+# Cosine similarity of the interest vectors needed to adapt an itinerary planned for
+# other interests instead of generating a new one. 0 turns similarity lookups off
+ITINERARY_CACHE_SIMILARITY = float(os.getenv("ITINERARY_CACHE_SIMILARITY", "0.6"))
+VECTOR_SIZE = 512
+
+itinerary_lookups = counter("agent_itinerary_cache_total", "generate_itinerary cache lookups, by result", ("result",))
+
+def normalize_interests(interests) -> tuple:
+    return tuple(sorted({normalize_text(interest) for interest in interests or []} - {""}))
+
+def embed(words) -> np.ndarray:
+    """
+    Hashed character trigram vector, L2 normalized. Computed locally, and close for
+    variants like "museum"/"museums" or "food"/"street food"
+    """
+    vector = np.zeros(VECTOR_SIZE)
+    for word in " ".join(words).split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % VECTOR_SIZE] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+@dataclass(slots=True)
+class CachedItinerary:
+    location: str
+    interests: tuple
+    vector: np.ndarray
+    dates: list
+    itinerary: dict
+    expires_at: float
+
+class ItineraryCache:
+    """
+    Generated itineraries keyed on normalized location, trip length and sorted interests.
+    An exact match is re-dated to the requested start date without calling the LLM.
+    With no exact match, an itinerary for the same place and length whose interests are
+    similar enough is re-dated and the LLM only rewrites the activities that differ.
+    Concurrent identical requests share one generation
+    """
+
+    def __init__(self, name="generate_itinerary", max_size=ITINERARY_CACHE_SIZE, ttl=ITINERARY_CACHE_TTL, similarity=ITINERARY_CACHE_SIMILARITY):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def _avg_upstream(self):
+        return self.upstream_seconds / self.misses if self.misses else 0.0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _similar(self, location, days, vector):
+        """
+        Closest cached itinerary for the same place and trip length, if similar enough
+        """
+        if self.similarity <= 0:
+            return None
+        now = time.time()
+        candidates = [entry for (loc, length, _), entry in self._entries.items() if loc == location and length == days and entry.expires_at > now]
+        if not candidates:
+            return None
+        scores = np.stack([entry.vector for entry in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity else None
+
+    def _store(self, key, interests, vector, dates, itinerary):
+        days = itinerary.get("days") if isinstance(itinerary, dict) else None
+        # Only complete itineraries can be re-dated later
+        if not days or len(days) != len(dates) or not all(isinstance(day, dict) and day.get("activities") for day in days):
+            return
+        self._entries[key] = CachedItinerary(key[0], interests, vector, dates, itinerary, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _reuse(self, entry, location, dates, interests, personalize):
+        itinerary = redate_itinerary(entry.itinerary, location, dates)
+        moved = weekday_sensitive(itinerary, entry.dates)
+        if interests != entry.interests or moved:
+            try:
+                itinerary = await personalize(itinerary, entry.interests, interests, moved)
+            except Exception as e:
+                # Weekday fixes are nice to have, other interests are not
+                if interests != entry.interests:
+                    raise
+                print(f"Personalizing a cached itinerary failed: {e!r}")
+        emit_itinerary(itinerary)
+        return itinerary
+
+    async def get_or_build(self, location, start_date, end_date, interests, build, personalize):
+        """
+        Returns an itinerary for the trip. build() generates one from scratch and
+        personalize(itinerary, old_interests, interests, moved_days) adapts a cached one
+        """
+        try:
+            dates = trip_dates(start_date, end_date)
+        except ValueError:
+            # Can't re-date without real dates
+            return await build()
+        interests = normalize_interests(interests)
+        key = (normalize_text(location), len(dates), interests)
+        vector = embed(interests)
+
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            self.saved_seconds += self._avg_upstream()
+            itinerary_lookups.inc(1, "hit")
+            return await self._reuse(entry, location, dates, interests, personalize)
+
+        if key in self._inflight:
+            # Join a generation of the same trip that is already running
+            leader = self._inflight[key]
+            try:
+                await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+            entry = self._get(key)
+            if entry is None:
+                # Cancelled, or a result that can't be re-dated. Generate our own
+                return await self.get_or_build(location, start_date, end_date, interests, build, personalize)
+            self.coalesced += 1
+            self.saved_seconds += self._avg_upstream()
+            itinerary_lookups.inc(1, "coalesced")
+            return await self._reuse(entry, location, dates, interests, personalize)
+
+        entry = self._similar(key[0], len(dates), vector)
+        if entry is not None:
+            self.similar_hits += 1
+            itinerary_lookups.inc(1, "similar")
+            try:
+                itinerary = await self._reuse(entry, location, dates, interests, personalize)
+                # The adapted itinerary is an exact match for the next request like this one
+                self._store(key, interests, vector, dates, itinerary)
+                return itinerary
+            except Exception as e:
+                self.errors += 1
+                print(f"Adapting a cached itinerary failed, generating a new one: {e!r}")
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        itinerary_lookups.inc(1, "miss")
+        try:
+            start = time.perf_counter()
+            itinerary = await build()
+            self.upstream_seconds += time.perf_counter() - start
+            self._store(key, interests, vector, dates, itinerary)
+            future.set_result(itinerary)
+            return itinerary
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody joined this generation
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.similar_hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "upstream_seconds": self.upstream_seconds,
+            "avg_upstream_seconds": self._avg_upstream(),
+            "saved_seconds": self.saved_seconds,
+        }
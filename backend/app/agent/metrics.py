@@ -0,0 +1,285 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Recent spans kept in memory for GET /traces, 0 disables span recording
+TRACE_SPANS = int(os.getenv("TRACE_SPANS", "0"))
+# File the recorded spans are written to as JSON lines at shutdown
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH", "")
+
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {total}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {count}")
+        return lines
+
+# Every metric rendered by /metrics
+metrics = []
+# Functions returning [(name, type, help, [(labels dict, value)])] from component stats() at scrape time
+collectors = []
+
+def counter(name, help, labels=()):
+    metric = Counter(name, help, labels)
+    metrics.append(metric)
+    return metric
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    metric = Histogram(name, help, labels, buckets)
+    metrics.append(metric)
+    return metric
+
+def register_collector(collect):
+    collectors.append(collect)
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{format_labels(tuple(labels), tuple(labels.values()))} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+span_seconds = histogram("agent_span_seconds", "Duration of graph nodes, tool calls and LLM calls", ("kind", "name"))
+span_errors = counter("agent_span_errors_total", "Graph nodes, tool calls and LLM calls that raised", ("kind", "name"))
+llm_first_token = histogram("agent_llm_time_to_first_token_seconds", "Time from LLM call start to its first streamed token", ("model",))
+llm_tokens = counter("agent_llm_tokens_total", "Tokens sent to and received from LLMs", ("model", "direction"))
+llm_prompt_tokens = histogram("agent_llm_prompt_tokens", "Prompt tokens per LLM call, by graph node", ("model", "name"), buckets=TOKEN_BUCKETS)
+
+# model -> [calls, prompt tokens, prompt tokens served from the provider's prompt cache, calls with a cache hit]
+prompt_cache = {}
+prompt_cache_lock = threading.Lock()
+
+def record_prompt(model, name, usage):
+    prompt_tokens = usage.get("input_tokens", 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    llm_prompt_tokens.observe(prompt_tokens, model, name)
+    llm_tokens.inc(cached, model, "cached_input")
+    with prompt_cache_lock:
+        entry = prompt_cache.setdefault(model, [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += prompt_tokens
+        entry[2] += cached
+        entry[3] += cached > 0
+
+def prompt_cache_stats():
+    """
+    Cached-prefix hit rates per model: share of calls with a cache hit and share of prompt tokens served from cache
+    """
+    with prompt_cache_lock:
+        return {
+            model: {
+                "calls": calls,
+                "prompt_tokens": tokens,
+                "cached_tokens": cached,
+                "avg_prompt_tokens": tokens / calls if calls else 0.0,
+                "hit_rate": hits / calls if calls else 0.0,
+                "cached_token_rate": cached / tokens if tokens else 0.0,
+            }
+            for model, (calls, tokens, cached, hits) in prompt_cache.items()
+        }
+
+tool_queue_wait = histogram("agent_tool_queue_wait_seconds", "Time a tool call waited for its concurrency slot", ("tool",))
+blocking_queue_wait = histogram("agent_blocking_queue_wait_seconds", "Time a blocking call waited for a worker thread", ())
+blocking_cancelled = counter("agent_blocking_cancelled_total", "Blocking calls whose caller was cancelled, by whether they had started", ("state",))
+blocking_wasted_seconds = counter("agent_blocking_wasted_seconds_total", "Worker thread time spent on calls nobody was waiting for any more")
+
+# Span tracing
+current_span = contextvars.ContextVar("current_span", default=None)
+recent_spans = deque(maxlen=TRACE_SPANS or 1)
+
+def record_span(kind, name, start, end, error=None, trace_id=None, parent_id=None, span_id=None, attributes=None):
+    span_seconds.observe(end - start, kind, name)
+    if error is not None:
+        span_errors.inc(1, kind, name)
+    if TRACE_SPANS:
+        recent_spans.append({
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "kind": kind,
+            "name": name,
+            "start": start,
+            "duration": end - start,
+            "error": error,
+            **(attributes or {}),
+        })
+
+@contextmanager
+def span(kind, name, trace_id=None, **attributes):
+    """
+    Times a block as a span. Nested spans share the trace id of the outermost one
+    """
+    parent = current_span.get()
+    span_id = uuid.uuid4().hex[:16] if TRACE_SPANS else None
+    trace_id = trace_id or (parent[0] if parent else span_id)
+    token = current_span.set((trace_id, span_id))
+    start = time.time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        record_span(kind, name, start, time.time(), error, trace_id, parent[1] if parent else None, span_id, attributes)
+
+def dump_spans(path=TRACE_DUMP_PATH):
+    """
+    Appends the recorded spans to a JSON lines file
+    """
+    if not (path and TRACE_SPANS):
+        return
+    with open(path, "a") as f:
+        for recorded in list(recent_spans):
+            f.write(json.dumps(recorded, default=str) + "\n")
+
+class MetricsCallback(BaseCallbackHandler):
+    """
+    Records spans for graph nodes, tools and LLM calls, LLM time to first token and
+    token usage from LangChain callbacks. Runs inline, so it only does a few dict
+    operations per event
+    """
+    run_inline = True
+
+    def __init__(self):
+        # run id -> (kind, name, start, model)
+        self._runs = {}
+
+    def _start(self, run_id, kind, name, model=None):
+        self._runs[run_id] = [kind, name, time.time(), model, None]
+
+    def _end(self, run_id, error=None):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        kind, name, start, model, _ = run
+        parent = current_span.get()
+        record_span(kind, name, start, time.time(), error, parent[0] if parent else None, parent[1] if parent else None, run_id.hex[:16] if TRACE_SPANS else None, {"model": model} if model else None)
+        return run
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node runnables themselves, not everything running inside them
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        self._start(run_id, "llm", (metadata or {}).get("langgraph_node") or model, model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        self._start(run_id, "llm", (metadata or {}).get("langgraph_node") or model, model)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run[4] is None:
+            run[4] = time.time()
+            llm_first_token.observe(run[4] - run[2], run[3])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._end(run_id)
+        if run is None:
+            return
+        model = run[3]
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    llm_tokens.inc(usage.get("input_tokens", 0), model, "input")
+                    llm_tokens.inc(usage.get("output_tokens", 0), model, "output")
+                    record_prompt(model, run[1], usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, type(error).__name__)
+
+metrics_callback = MetricsCallback()
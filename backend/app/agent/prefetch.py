@@ -0,0 +1,227 @@
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+from langchain_core.messages import AIMessage, HumanMessage
+from agent.metrics import counter
+from agent.ratelimit import UpstreamBusy, background_calls
+from agent.reddit import fetch_comments, submission_id
+from agent.tools import aonline_search, reddit_client
+
+# Off by default: prefetching spends upstream budget on results that may never be used
+PREFETCH = os.getenv("PREFETCH", "0") == "1"
+# Upstream calls (searches + reddit threads) prefetching may make for one conversation
+PREFETCH_SESSION_BUDGET = int(os.getenv("PREFETCH_SESSION_BUDGET", "8"))
+# Reddit threads fetched per prefetched search
+PREFETCH_THREADS = int(os.getenv("PREFETCH_THREADS", "3"))
+# Prefetch calls in flight across all conversations
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+# Searches the model tends to make once a destination is known. The first one is the
+# example in the online_search tool description, so the model's query usually matches it
+PREFETCH_QUERIES = ["things to do in {destination} reddit", "best food in {destination} reddit"]
+EVENTS_QUERY = "events in {destination} {when}"
+
+prefetch_runs = counter("agent_prefetch_runs_total", "Background prefetch runs, by how they ended", ("outcome",))
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Capitalized words after "to", "in", "visit"... e.g. "a trip to Mexico City in March"
+PLACE = re.compile(r"\b(?:to|in|visit|visiting|around|at)\s+([A-Z][\w'’.-]*(?:[ -](?:[A-Z][\w'’.-]*|de|del|la|da|do)){0,3})")
+NOT_PLACES = set(MONTHS) | set(WEEKDAYS) | {"I", "The", "A", "My", "Google", "Reddit"}
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+MONTH = re.compile(r"\b(" + "|".join(MONTHS) + r")\b")
+CAPITALIZED = re.compile(r"\b[A-Z][a-z][\w'’.-]*(?: [A-Z][a-z][\w'’.-]*){0,2}")
+REDDIT_URL = re.compile(r"https?://(?:www\.|old\.)?reddit\.com/r/\w+/comments/[^\s\"'<>)\]]+")
+
+@dataclass(frozen=True, slots=True)
+class Trip:
+    destination: str
+    when: str = ""
+
+def trip_date(text: str) -> str:
+    """
+    "March 2026" from an ISO date, or a month name mentioned in the text
+    """
+    match = ISO_DATE.search(text or "")
+    if match:
+        try:
+            return date(*map(int, match.groups())).strftime("%B %Y")
+        except ValueError:
+            pass
+    match = MONTH.search(text or "")
+    return match.group(1) if match else ""
+
+def place_in(text: str) -> str:
+    places = [place for place in PLACE.findall(text or "") if place.split()[0] not in NOT_PLACES]
+    return places[-1].rstrip(".") if places else ""
+
+def confirmed_place(text: str, suggestion: str) -> str:
+    """
+    A capitalized name the user repeats from the assistant's last message, e.g.
+    "Cancun sounds great" after "Cancun is a great pick for March"
+    """
+    for name in CAPITALIZED.findall(text or ""):
+        if name.split()[0] not in NOT_PLACES and re.search(rf"\b{re.escape(name)}\b", suggestion or ""):
+            return name
+    return ""
+
+def detect_trip(messages: list, memory: str = None) -> Optional[Trip]:
+    """
+    Most recent destination (and travel month) in the conversation: from itinerary
+    tool calls, else the user's messages, else the conversation memory
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls or []:
+                args = call.get("args") or {}
+                if args.get("location"):
+                    return Trip(args["location"], trip_date(str(args.get("start_date", ""))))
+        elif isinstance(message, HumanMessage) and isinstance(message.content, str):
+            suggestion = next((m.content for m in reversed(messages[:i]) if isinstance(m, AIMessage) and isinstance(m.content, str) and m.content), "")
+            place = place_in(message.content) or confirmed_place(message.content, suggestion)
+            if place:
+                return Trip(place, trip_date(message.content))
+    place = place_in(memory)
+    return Trip(place, trip_date(memory)) if place else None
+
+class SessionPrefetch:
+    def __init__(self):
+        self.trip = None
+        self.task = None
+        self.spent = 0
+
+class Prefetcher:
+    """
+    Looks for a destination after each turn and warms the search and reddit caches with
+    the research the model is likely to ask for next, so the user doesn't wait for it.
+    Runs as background work: calls only go out when the upstream budget has room to
+    spare, each conversation gets a fixed budget of calls, and a run is cancelled when
+    the conversation moves to another destination. Use shows up in the caches'
+    prefetch_used counters
+    """
+
+    def __init__(self, search=aonline_search, fetch_threads=None, enabled=PREFETCH, budget=PREFETCH_SESSION_BUDGET, threads=PREFETCH_THREADS, concurrency=PREFETCH_CONCURRENCY, max_sessions=1024):
+        self.search = search
+        self.fetch_threads = fetch_threads or (lambda urls: fetch_comments(reddit_client.get(), urls))
+        self.enabled = enabled
+        self.budget = budget
+        self.threads = threads
+        self.max_sessions = max_sessions
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._sessions = OrderedDict()
+        self._tasks = set()
+        self.runs = {"started": 0, "completed": 0, "cancelled": 0, "busy": 0, "failed": 0}
+
+    def _session(self, thread_id):
+        session = self._sessions.get(thread_id)
+        if session is None:
+            session = self._sessions[thread_id] = SessionPrefetch()
+            while len(self._sessions) > self.max_sessions:
+                _, old = self._sessions.popitem(last=False)
+                if old.task:
+                    old.task.cancel()
+        self._sessions.move_to_end(thread_id)
+        return session
+
+    def schedule(self, thread_id, agent, config):
+        """
+        Called after a turn finished. Reads the saved state in the background
+        """
+        if not self.enabled:
+            return None
+        task = asyncio.create_task(self._after_turn(thread_id, agent, config))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _after_turn(self, thread_id, agent, config):
+        try:
+            state = await agent.aget_state(config)
+        except Exception as e:
+            print(f"Prefetch could not read state: {e!r}")
+            return
+        self.observe(thread_id, state.values.get("messages", []), state.values.get("memory"))
+
+    def observe(self, thread_id, messages, memory=None):
+        """
+        Starts prefetching for the conversation's current destination, cancelling
+        work for the previous one. Returns the task, or None when there's nothing to do
+        """
+        trip = detect_trip(messages, memory)
+        if trip is None:
+            return None
+        session = self._session(thread_id)
+        if session.trip and session.trip.destination.lower() == trip.destination.lower() and (session.trip.when or not trip.when):
+            return None
+        if session.task and not session.task.done():
+            # The conversation moved on
+            session.task.cancel()
+        session.trip = trip
+        if session.spent >= self.budget:
+            prefetch_runs.inc(1, "over_budget")
+            return None
+        session.task = asyncio.create_task(self._run(session, trip))
+        self._tasks.add(session.task)
+        session.task.add_done_callback(self._tasks.discard)
+        return session.task
+
+    def queries(self, trip):
+        queries = [query.format(destination=trip.destination) for query in PREFETCH_QUERIES]
+        if trip.when:
+            queries.append(EVENTS_QUERY.format(destination=trip.destination, when=trip.when))
+        return queries
+
+    async def _run(self, session, trip):
+        # Marks the upstream calls below as background work (see acquire_upstream)
+        background_calls.set(True)
+        self.runs["started"] += 1
+        outcome = "completed"
+        try:
+            for query in self.queries(trip):
+                if session.spent >= self.budget:
+                    break
+                session.spent += 1
+                async with self._semaphore:
+                    results = await self.search(query)
+
+                ids = set()
+                urls = []
+                for url in REDDIT_URL.findall(str(results)):
+                    sid = submission_id(url)
+                    if sid and sid not in ids:
+                        ids.add(sid)
+                        urls.append(url)
+                urls = urls[:min(self.threads, self.budget - session.spent)]
+                if urls:
+                    session.spent += len(urls)
+                    async with self._semaphore:
+                        await self.fetch_threads(urls)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except UpstreamBusy:
+            outcome = "busy"
+        except Exception as e:
+            outcome = "failed"
+            print(f"Prefetch for {trip.destination} failed: {e!r}")
+        finally:
+            self.runs[outcome] += 1
+            prefetch_runs.inc(1, outcome)
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sessions": len(self._sessions),
+            "running": sum(1 for session in self._sessions.values() if session.task and not session.task.done()),
+            **self.runs,
+        }
+
+prefetcher = Prefetcher()
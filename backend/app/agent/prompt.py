@@ -0,0 +1,78 @@
+import json
+import re
+from datetime import datetime
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from agent.context import count_text_tokens
+
+# "REQUIRED:" / "OPTIONAL" markers repeat what the schema's required list already says
+REQUIRED_MARKER = re.compile(r"^\s*(?:REQUIRED|OPTIONAL)\b:?\s*", re.IGNORECASE)
+# "Default is 0." repeats the schema default
+DEFAULT_SENTENCE = re.compile(r"\s*Default is [^.]*\.")
+BOILERPLATE = re.compile(r"\bParameter defines the ")
+WHITESPACE = re.compile(r"\s+")
+
+def minify_description(text, has_default=False):
+    text = BOILERPLATE.sub("", REQUIRED_MARKER.sub("", text or ""))
+    if has_default:
+        text = DEFAULT_SENTENCE.sub("", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+def minify_schema(schema):
+    """
+    Drops what the model doesn't need from a JSON schema: titles, empty defaults and
+    the parts of descriptions the schema already states
+    """
+    if isinstance(schema, list):
+        return [minify_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    minified = {}
+    for key, value in schema.items():
+        if key == "title" and isinstance(value, str):
+            continue
+        if key == "default" and value in ("", None, []):
+            continue
+        if key == "description" and isinstance(value, str):
+            value = minify_description(value, "default" in schema)
+            if not value:
+                continue
+        elif key == "properties":
+            value = {name: minify_schema(prop) for name, prop in value.items()}
+        else:
+            value = minify_schema(value)
+        minified[key] = value
+    return minified
+
+def compact_tool_schemas(tools):
+    """
+    OpenAI tool definitions built from the tools' pydantic models, minified. Built once,
+    so every request sends the same bytes and the cached prompt prefix keeps matching
+    """
+    return [minify_schema(convert_to_openai_tool(tool)) for tool in tools]
+
+def date_note(now=None):
+    """
+    Volatile context for the end of the prompt, after the cacheable prefix
+    """
+    today = (now or datetime.now()).strftime("%A, %B %d, %Y")
+    return SystemMessage(content=f"Today's date is {today}. Use this to understand and resolve any relative time references (e.g., \"next Friday\", \"two weeks from now\").")
+
+class PromptLayout:
+    """
+    Lays a main LLM call out as [static system prompt] + conversation + [date note].
+    Tools and the system prompt never change between calls, so together with the
+    earlier turns they form a prefix the provider can serve from its prompt cache
+    """
+
+    def __init__(self, system_prompt, tool_schemas):
+        self.system = SystemMessage(content=system_prompt)
+        self.tool_schemas = tool_schemas
+
+    def messages(self, conversation, now=None):
+        return [self.system, *conversation, date_note(now)]
+
+    def stats(self):
+        system_tokens = count_text_tokens(self.system.content)
+        tool_tokens = count_text_tokens(json.dumps(self.tool_schemas, separators=(",", ":")))
+        return {"system_tokens": system_tokens, "tool_schema_tokens": tool_tokens, "static_prefix_tokens": system_tokens + tool_tokens}
@@ -0,0 +1,99 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from agent.metrics import counter, histogram
+
+class RateLimiter:
+    """
+    Token bucket allowing bursts of `burst` calls and `rate` calls per minute on average,
+    shared across threads and event loops. Implemented as GCRA, so each caller gets a
+    reserved start time instead of polling
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 60 / rate if rate > 0 else 0
+        self.tolerance = self.interval * (max(burst, 1) - 1)
+        self._tat = 0.0
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def reserve(self) -> float:
+        """
+        Reserves the next slot and returns how long to wait for it
+        """
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            wait = max(tat - self.tolerance - now, 0.0)
+            self._tat = tat + self.interval
+            self.waited_seconds += wait
+            return wait
+
+    def try_reserve(self, headroom: int = 0) -> bool:
+        """
+        Reserves a slot only if it is free right now and at least `headroom` more
+        would still be free after it. Never waits
+        """
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            if tat + headroom * self.interval - self.tolerance > now:
+                return False
+            self._tat = tat + self.interval
+            return True
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+def limit_from_env(name, rate, burst):
+    """
+    Reads "<requests per minute>:<burst>" from RATE_LIMIT_<NAME>, e.g. RATE_LIMIT_SERPAPI=60:5
+    """
+    value = os.getenv(f"RATE_LIMIT_{name.upper()}", f"{rate}:{burst}")
+    rate, _, burst = value.partition(":")
+    return RateLimiter(float(rate), int(burst or 1))
+
+# Request budgets per upstream service. Every call out to one of them acquires a slot first
+upstream_limits = {
+    "openai": limit_from_env("openai", 500, 50),
+    "serpapi": limit_from_env("serpapi", 60, 5),
+    "serper": limit_from_env("serper", 300, 20),
+    # Reddit allows 100 OAuth requests per minute per client. Stay a bit below it
+    "reddit": limit_from_env("reddit", 90, 10),
+    "calendar": limit_from_env("calendar", 300, 10),
+}
+
+# Burst slots background work (prefetching) leaves free for user requests
+BACKGROUND_HEADROOM = int(os.getenv("BACKGROUND_HEADROOM", "2"))
+
+# Set in background tasks. Their upstream calls never queue: they run when the budget
+# has room to spare and raise UpstreamBusy otherwise
+background_calls = contextvars.ContextVar("background_calls", default=False)
+
+class UpstreamBusy(Exception):
+    """
+    A background call found no spare budget for its upstream
+    """
+
+upstream_wait = histogram("agent_upstream_wait_seconds", "Time calls waited for their upstream rate budget", ("upstream",))
+upstream_calls = counter("agent_upstream_calls_total", "Calls made to each upstream service", ("upstream",))
+upstream_skipped = counter("agent_upstream_background_skipped_total", "Background calls dropped because the upstream budget had no room to spare", ("upstream",))
+
+async def acquire_upstream(name):
+    """
+    Waits for a request slot of the named upstream service
+    """
+    if background_calls.get():
+        if not upstream_limits[name].try_reserve(BACKGROUND_HEADROOM):
+            upstream_skipped.inc(1, name)
+            raise UpstreamBusy(name)
+        upstream_calls.inc(1, name)
+        return
+    wait = await upstream_limits[name].acquire()
+    upstream_wait.observe(wait, name)
+    upstream_calls.inc(1, name)
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import re
+from agent.cache import AsyncTTLCache
+from agent.executor import run_blocking
+from agent.ratelimit import acquire_upstream
+
+REDDIT_CONCURRENCY = int(os.getenv("REDDIT_CONCURRENCY", "4"))
+# Top-level comments kept per submission. "load more" stubs are never expanded
+REDDIT_MAX_COMMENTS = int(os.getenv("REDDIT_MAX_COMMENTS", "50"))
+# Characters returned per tool call and per comment
+REDDIT_CHAR_BUDGET = int(os.getenv("REDDIT_CHAR_BUDGET", "6000"))
+REDDIT_COMMENT_CHARS = int(os.getenv("REDDIT_COMMENT_CHARS", "600"))
+
+# Popular threads ("must dos in Cancun") are shared by many users and change slowly
+reddit_cache = AsyncTTLCache(
+    "reddit_comments",
+    max_size=int(os.getenv("REDDIT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("REDDIT_CACHE_TTL", "21600")),
+    disk_path=os.getenv("REDDIT_CACHE_DB", ""),
+)
+
+SUBMISSION_ID_PATTERNS = [
+    re.compile(r"/comments/([a-z0-9]+)", re.IGNORECASE),
+    re.compile(r"redd\.it/([a-z0-9]+)", re.IGNORECASE),
+]
+
+def submission_id(url: str):
+    """
+    Reddit submission id from a thread URL, or None when the URL isn't a thread
+    """
+    for pattern in SUBMISSION_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1).lower()
+    return None
+
+def normalize_submission(submission, max_comments=REDDIT_MAX_COMMENTS) -> dict:
+    """
+    Blocking fetch of a praw submission's top-level comments as plain dicts. Only the
+    first page of the tree is loaded, so the work per thread is bounded
+    """
+    submission.comment_sort = "top"
+    submission.comments.replace_more(limit=0)
+
+    comments = []
+    for comment in submission.comments[:max_comments]:
+        body = getattr(comment, "body", "")
+        if not body or body in ("[deleted]", "[removed]"):
+            continue
+        comments.append({"id": comment.id, "score": comment.score or 0, "body": body})
+
+    return {
+        "id": submission.id,
+        "title": submission.title,
+        "subreddit": str(submission.subreddit),
+        "comments": comments,
+    }
+
+async def fetch_submission(client, sid: str, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Cached, rate-limited fetch of one submission by id
+    """
+    async def fetch():
+        async with semaphore:
+            await acquire_upstream("reddit")
+            return await run_blocking(normalize_submission, client.submission(id=sid))
+
+    return await reddit_cache.get_or_fetch(sid, fetch)
+
+def dedupe_key(body: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", "", body.lower()).split())
+
+def select_comments(submissions: list, budget=REDDIT_CHAR_BUDGET, comment_chars=REDDIT_COMMENT_CHARS) -> list:
+    """
+    Highest scored comments across all submissions, without duplicates, each cut to
+    comment_chars and all together within budget characters
+    """
+    ranked = sorted(
+        (comment for submission in submissions for comment in submission["comments"]),
+        key=lambda c: c["score"],
+        reverse=True,
+    )
+
+    selected = []
+    seen = set()
+    used = 0
+    for comment in ranked:
+        key = dedupe_key(comment["body"])
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        body = " ".join(comment["body"].split())
+        if len(body) > comment_chars:
+            body = body[:comment_chars].rsplit(" ", 1)[0] + "..."
+        if used + len(body) > budget:
+            break
+        used += len(body)
+        selected.append(f"(+{comment['score']}) {body}")
+    return selected
+
+async def fetch_comments(client, urls: list, budget=REDDIT_CHAR_BUDGET) -> list:
+    """
+    Fetches every thread concurrently and returns their best comments. Threads that
+    fail to load are skipped so one bad URL doesn't lose the rest
+    """
+    ids = list(dict.fromkeys(sid for sid in map(submission_id, urls) if sid))
+    if not ids:
+        return []
+
+    semaphore = asyncio.Semaphore(REDDIT_CONCURRENCY)
+    results = await asyncio.gather(*(fetch_submission(client, sid, semaphore) for sid in ids), return_exceptions=True)
+
+    submissions = []
+    for sid, result in zip(ids, results):
+        if isinstance(result, Exception):
+            print(f"Failed to fetch reddit thread {sid}: {result}")
+            continue
+        submissions.append(result)
+    return select_comments(submissions, budget)
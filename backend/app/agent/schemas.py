@@ -3,8 +3,8 @@ from pydantic import BaseModel, Field
 
 
 class EventTime(BaseModel):
-    dateTime: str = Field(..., description="time of event in FRC3339 format. Here is an example of Internet date/time format(1985-04-12T23:20:50.52Z)This represents 20 minutes and 50.52 seconds after the 23rd hour of April 12th, 1985 in UTC.")
-    timeZone: str = Field(..., description="time zone of event in Formatted as an IANA Time Zone Database name, e.g. 'Europe/Zurich'")
+    dateTime: str = Field(..., description="local time in RFC 3339 format, e.g. 2026-03-01T13:00:00")
+    timeZone: str = Field(..., description="IANA time zone name, e.g. 'Europe/Zurich'")
     
 class Event(BaseModel):
     summary: str = Field(..., description="name of the event")
@@ -15,11 +15,7 @@ class Event(BaseModel):
 class Events(BaseModel):
     events: list[Event] = Field(..., description="A list of events")
 
-class FlightSearchParams(BaseModel):
-    departure_id: str = Field(..., description="REQUIRED: The 3 letter ID of the departure airport. For example, 'JFK' for John F. Kennedy International Airport. You can specify multiple departure airports by separating them with a comma. For example, CDG,ORY for both Charles de Gaulle and Orly airports in Paris.")
-    arrival_id: str = Field(..., description="REQUIRED: The 3 letter ID of the arrival airport. For example, 'JFK' for John F. Kennedy International Airport. You can specify multiple arrvial airports by separating them with a comma. For example, CDG,ORY for both Charles de Gaulle and Orly airports in Paris.")
-    outbound_date: str = Field(..., description="REQUIRED: The date of the outbound flight in YYYY-MM-DD format.")
-    return_date: str = Field(..., description="REQUIRED: The date of the return flight in YYYY-MM-DD format.")
+class FlightOptions(BaseModel):
     type: int = Field(1, description="OPTIONAL Parameter defines the type of flight. Available options: 1 - Round-trip (default), 2 - One-way")
     travel_class: int = Field(1, description="OPTIONAL Parameter defines the travel class. Available options: 1 - Economy (default), 2 - Premium economy, 3 - Business, 4 - First")
     adults: int = Field(1, description="OPTIONAL Number of adults traveling. Default is 1.")
@@ -35,11 +31,38 @@ class FlightSearchParams(BaseModel):
     currency: str = Field("USD", description="OPTIONAL Currency code (e.g., USD). Default is USD.")
     hl: str = Field("en", description="OPTIONAL Language code (e.g., en for English). Default is en.")
 
+class FlightSearchParams(FlightOptions):
+    departure_id: str = Field(..., description="REQUIRED: 3 letter IATA code of the departure airport, e.g. 'JFK', or a city or airport name, e.g. 'Paris' for all Paris airports. Separate several with commas, e.g. 'CDG,ORY'.")
+    arrival_id: str = Field(..., description="REQUIRED: 3 letter IATA code of the arrival airport, or a city or airport name, same format as departure_id.")
+    outbound_date: str = Field(..., description="REQUIRED: The date of the outbound flight in YYYY-MM-DD format.")
+    return_date: str = Field(..., description="REQUIRED: The date of the return flight in YYYY-MM-DD format.")
+
+class FlexibleFlightSearchParams(FlightOptions):
+    departure_id: str = Field(..., description="REQUIRED: 3 letter IATA code, city or airport name of the departure, same format as in search_flights.")
+    arrival_id: str = Field(..., description="REQUIRED: 3 letter IATA code, city or airport name of the arrival, same format as departure_id.")
+    outbound_date_from: str = Field(..., description="REQUIRED: First possible outbound date in YYYY-MM-DD format.")
+    outbound_date_to: str = Field(..., description="REQUIRED: Last possible outbound date in YYYY-MM-DD format.")
+    return_date_from: str = Field("", description="First possible return date in YYYY-MM-DD format. Leave empty for one-way trips.")
+    return_date_to: str = Field("", description="Last possible return date in YYYY-MM-DD format.")
+
 class RedditCommentsParams(BaseModel):
-    url: str = Field(..., description="URL of the Reddit page to get comments from. For example, https://www.reddit.com/r/TravelHacks/comments/12ppmqx/must_dos_in_cancun/")
+    urls: List[str] = Field(..., description="URLs of the Reddit threads to get comments from. Pass every relevant thread in one call. For example, [\"https://www.reddit.com/r/TravelHacks/comments/12ppmqx/must_dos_in_cancun/\"]")
 
 class ItineraryParams(BaseModel):
     location: str = Field(..., description="The destination city or region")
     start_date: str = Field(..., description="Start date of the trip in YYYY-MM-DD format")
     end_date: str = Field(..., description="End date of the trip in YYYY-MM-DD format")
-    interests: Optional[List[str]] = Field(default_factory=list, description="Optional list of travel interests (e.g. food, museums, hiking)")
\ No newline at end of file
+    interests: Optional[List[str]] = Field(default_factory=list, description="Optional list of travel interests (e.g. food, museums, hiking)")
+
+class Activity(BaseModel):
+    time: str
+    title: str
+    description: str
+
+class DayPlan(BaseModel):
+    date: str
+    activities: List[Activity]
+
+class Itinerary(BaseModel):
+    location: str
+    days: List[DayPlan]
@@ -0,0 +1,9 @@
+import re
+import unicodedata
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase ASCII words, so "Cancún" and "cancun " match
+    """
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
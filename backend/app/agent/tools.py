@@ -3,54 +3,302 @@ from langchain_community.utilities import GoogleSerperAPIWrapper
 from langchain_openai import ChatOpenAI
 from serpapi import GoogleSearch
 import os
+import re
+import json
+from datetime import date
 from dotenv import load_dotenv
 import praw
 from typing import List
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
 
-from google_functions import google_authenticate, build_event_data, extract_event_links
+from google_functions import google_authenticate, build_event_data
 from agent.schemas import *
+from agent.executor import run_blocking
+from agent.cache import AsyncTTLCache, make_key
+from agent.clients import lazy_client
+from agent.itinerary import build_itinerary, personalize_itinerary
+from agent.itinerary_cache import ItineraryCache
+from agent.calendar_writer import CalendarBatchWriter
+from agent.airports import load_index
+from agent.flex_dates import FLEX_MAX_SEARCHES, date_pairs, date_range, fan_out, price_matrix
+from agent.reddit import fetch_comments, reddit_cache
+from agent.ratelimit import acquire_upstream
+from agent.http_pool import PooledSession, async_client, sync_client
+from agent.executor import BLOCKING_POOL_SIZE
 
 load_dotenv()
 
-# Initialize LLM and services needed to run tools
-service = build('calendar', 'v3', credentials=google_authenticate())
+# LLM and services needed to run tools. They are built on first use (or at
+# warm-up) so importing this module never runs the Google OAuth flow
+calendar_credentials = lazy_client("calendar_credentials", google_authenticate)
+calendar_service = lazy_client("calendar", lambda: build('calendar', 'v3', credentials=calendar_credentials.get()))
 
-structured_llm = ChatOpenAI(
+def calendar_http():
+    """
+    Authorized connection for one worker thread, since httplib2 isn't thread-safe
+    """
+    return AuthorizedHttp(calendar_credentials.get(), http=build_http())
+
+calendar_writer = lazy_client("calendar_writer", lambda: CalendarBatchWriter(calendar_service.get(), http_factory=calendar_http))
+
+# Pooled keep-alive connections shared by every OpenAI model, request and thread
+openai_http = lazy_client("openai_http", lambda: async_client("openai", timeout=120))
+openai_sync_http = lazy_client("openai_sync_http", lambda: sync_client("openai", timeout=120))
+
+def openai_clients():
+    """
+    HTTP client arguments for ChatOpenAI and init_chat_model
+    """
+    return {"http_async_client": openai_http.get(), "http_client": openai_sync_http.get()}
+
+itinerary_llm = lazy_client("itinerary_llm", lambda: ChatOpenAI(
     model="gpt-4o",
-    tags=["structured"]
-).with_structured_output(method='json_mode')
+    tags=["structured"],
+    stream_usage=True,
+    **openai_clients()
+).with_structured_output(method='json_mode'))
 
-reddit = praw.Reddit(
+# praw and serpapi make blocking calls from the worker threads, so size their pools to match
+reddit_client = lazy_client("reddit", lambda: praw.Reddit(
     client_id=os.getenv("REDDIT_CLIENT_ID"),
     client_secret=os.getenv("REDDIT_SECRET"),
-    user_agent="viator_agent"
+    user_agent="viator_agent",
+    requestor_kwargs={"session": PooledSession("reddit", max_connections=BLOCKING_POOL_SIZE)},
+))
+
+serper_http = lazy_client("serper_http", lambda: async_client("serper", max_connections=32, timeout=15))
+serper_sync_http = lazy_client("serper_sync_http", lambda: sync_client("serper", max_connections=8, timeout=15))
+
+class PooledSerperAPIWrapper(GoogleSerperAPIWrapper):
+    """
+    Serper wrapper sending its requests through the shared pools instead of opening
+    a new connection (and aiohttp session) per search
+    """
+
+    def _google_serper_api_results(self, search_term, search_type="search", **kwargs):
+        return self._send(serper_sync_http.get().post, search_term, search_type, kwargs)
+
+    async def _async_google_serper_search_results(self, search_term, search_type="search", **kwargs):
+        response = await serper_http.get().post(**self._request(search_term, search_type, kwargs))
+        response.raise_for_status()
+        return response.json()
+
+    def _request(self, search_term, search_type, kwargs):
+        return {
+            "url": f"https://google.serper.dev/{search_type}",
+            "headers": {"X-API-KEY": self.serper_api_key or "", "Content-Type": "application/json"},
+            "params": {"q": search_term, **{key: value for key, value in kwargs.items() if value is not None}},
+        }
+
+    def _send(self, post, search_term, search_type, kwargs):
+        response = post(**self._request(search_term, search_type, kwargs))
+        response.raise_for_status()
+        return response.json()
+
+serper_client = lazy_client("serper", PooledSerperAPIWrapper)
+
+serpapi_http = lazy_client("serpapi_http", lambda: PooledSession("serpapi", max_connections=BLOCKING_POOL_SIZE, timeout=30))
+
+class PooledGoogleSearch(GoogleSearch):
+    """
+    SerpAPI search that reuses pooled connections instead of calling requests.get
+    """
+
+    def get_response(self, path="/search"):
+        url, parameter = self.construct_url(path)
+        return serpapi_http.get().get(url, params=parameter, timeout=self.timeout)
+
+# SerpAPI search class, so flight searches can be stubbed like the other clients
+serpapi_search = lazy_client("serpapi", lambda: PooledGoogleSearch)
+
+# Memory-mapped airport/city index used to check flight searches before they go out
+airport_index = lazy_client("airports", load_index)
+
+# Flight results are cached for a while since the model often repeats the same search
+flight_cache = AsyncTTLCache(
+    "search_flights",
+    max_size=int(os.getenv("FLIGHT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("FLIGHT_CACHE_TTL", "900")),
+    disk_path=os.getenv("FLIGHT_CACHE_DB", ""),
+)
+
+# Web search results, shared by near-identical queries within and across sessions
+search_cache = AsyncTTLCache(
+    "online_search",
+    max_size=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+    disk_path=os.getenv("SEARCH_CACHE_DB", ""),
 )
 
+# Words that don't change what a search returns
+QUERY_STOPWORDS = {"a", "an", "the", "in", "at", "on", "of", "for", "and"}
+# Words after which order matters: "paris to london" isn't "london to paris"
+DIRECTION_MARKERS = {"to", "from", "near", "vs", "versus"}
+# "to" before these is "things to do", not a destination
+NOT_DIRECTIONS = {"do", "see", "eat", "visit", "go", "stay", "know", "try", "bring", "pack"}
+
+def normalize_query(query: str) -> str:
+    """
+    Case, whitespace and punctuation insensitive form of a search query, so "things
+    to do in Cancun reddit" and "Cancun things to do reddit" match. Words before the
+    first direction marker can come in any order, the rest keep theirs so opposite
+    routes ("from Paris to London", "from London to Paris") don't share results
+    """
+    tokens = [token.strip(".'") for token in re.findall(r"[\w:.']+", query.lower())]
+    tokens = [token for token in tokens if token and token not in QUERY_STOPWORDS]
+    for i, token in enumerate(tokens):
+        if token in DIRECTION_MARKERS and not (token == "to" and tokens[i + 1:i + 2] and tokens[i + 1] in NOT_DIRECTIONS):
+            return " ".join(sorted(tokens[:i]) + tokens[i:])
+    return " ".join(sorted(tokens))
+
+def search_cache_key(query: str, client) -> str:
+    return make_key({
+        "q": normalize_query(query),
+        "type": getattr(client, "type", None),
+        "k": getattr(client, "k", None),
+        "gl": getattr(client, "gl", None),
+        "hl": getattr(client, "hl", None),
+    })
+
+# Generated itineraries, reused for trips to the same place with the same length
+itinerary_cache = ItineraryCache()
+
+def get_cache_stats():
+    return {cache.name: cache.stats() for cache in (search_cache, flight_cache, reddit_cache, itinerary_cache)}
+
+def flight_params(departure_id, arrival_id, outbound_date, return_date, exclude_airlines="", include_airlines="", **options) -> dict:
+    """
+    SerpAPI Google Flights parameters for one outbound/return date
+    """
+    params = {
+        "engine": "google_flights",
+        "departure_id": departure_id,
+        "outbound_date": outbound_date,
+        **options,
+        "api_key": os.getenv("SERPAPI_API_KEY")
+    }
+
+    # Optional parameters
+    if return_date:
+        params["return_date"] = return_date
+    if arrival_id:
+        params["arrival_id"] = arrival_id
+    if exclude_airlines:
+        params["exclude_airlines"] = exclude_airlines
+    if include_airlines:
+        params["include_airlines"] = include_airlines
+    return params
+
+def check_flight_search(departure_id, arrival_id, outbound_dates, return_dates=(), type=1, adults=1, children=0, infants_in_seat=0, infants_in_lap=0, bags=0) -> dict:
+    """
+    Normalizes the airports of a flight search to IATA codes (city and airport names
+    included) and rejects searches Google Flights would fail, before they use up the
+    serpapi budget. Returns the normalized departure_id, arrival_id and type. The
+    ValueError messages tell the model what to fix
+    """
+    airports = airport_index.get()
+    departure_id = airports.resolve(departure_id)
+    arrival_id = airports.resolve(arrival_id) if arrival_id else ""
+    if arrival_id and set(departure_id.split(",")) & set(arrival_id.split(",")):
+        raise ValueError(f"departure_id {departure_id} and arrival_id {arrival_id} share an airport.")
+
+    for field, dates in (("outbound_date", outbound_dates), ("return_date", return_dates)):
+        for day in dates:
+            try:
+                date.fromisoformat(day)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} '{day}' is not a YYYY-MM-DD date.")
+    if return_dates and type != 2 and max(return_dates) < min(outbound_dates):
+        raise ValueError(f"return_date {max(return_dates)} is before outbound_date {min(outbound_dates)}.")
+    if not return_dates and type == 1:
+        # No return date means one-way
+        type = 2
+
+    counts = {"adults": adults, "children": children, "infants_in_seat": infants_in_seat, "infants_in_lap": infants_in_lap, "bags": bags}
+    negative = [field for field, count in counts.items() if count < 0]
+    if negative:
+        raise ValueError(f"{', '.join(negative)} can't be negative.")
+    if adults < 1:
+        raise ValueError("At least one adult has to travel.")
+    if adults + children + infants_in_seat + infants_in_lap > 9:
+        raise ValueError("Google Flights searches allow at most 9 passengers.")
+    if infants_in_lap > adults:
+        raise ValueError("Each infant in lap needs an adult.")
+    if bags > adults + children + infants_in_seat:
+        raise ValueError("bags can't exceed the passengers with a seat (adults, children and infants_in_seat).")
+    return {"departure_id": departure_id, "arrival_id": arrival_id, "type": type}
+
+async def fetch_flights(params: dict) -> list:
+    """
+    Calls the Google Flights API. Callers go through flight_cache
+    """
+    await acquire_upstream("serpapi")
+    search = serpapi_search.get()(params)
+    results = await run_blocking(search.get_dict)
+
+    # Rejected searches come back as {"error": ...} without any flight lists
+    if results.get("error"):
+        raise ValueError(f"Google Flights: {results['error']}")
+    return results.get("best_flights") or results.get("other_flights") or []
+
+def flight_cache_key(params: dict) -> str:
+    """
+    Canonical cache key for a SerpAPI flight search. The API key is left out and
+    airport/airline lists are normalized so equivalent searches share an entry
+    """
+    canonical = {k: v for k, v in params.items() if k != "api_key"}
+    for field in ("departure_id", "arrival_id", "exclude_airlines", "include_airlines"):
+        if canonical.get(field):
+            codes = [code.strip().upper() for code in str(canonical[field]).split(",") if code.strip()]
+            canonical[field] = ",".join(sorted(set(codes)))
+    return make_key(canonical)
+
 # TOOLS
+def online_search(query: str) -> str:
+    return serper_client.get().run(query)
+
+async def aonline_search(query: str) -> str:
+    client = serper_client.get()
+
+    async def fetch():
+        await acquire_upstream("serper")
+        return await client.arun(query)
+
+    return await search_cache.get_or_fetch(search_cache_key(query, client), fetch)
+
 search_tool = Tool(
     name="online_search",
-    func=GoogleSerperAPIWrapper().run,
-    description="use to get suggestions for the user. Search for special events going on during the stay of the user. Search for reddit threads and pass the url to the get_reddit_comments tool. For example if a user asks for things to do in Cancun, search for 'things to do in Cancun reddit' and pass the url to the get_reddit_comments threads to get suggestions.",
+    func=online_search,
+    coroutine=aonline_search,
+    description="use to get suggestions for the user. Search for special events going on during the stay of the user. Search for reddit threads and pass the url to the get_reddit_comments tool. For example if a user asks for things to do in Cancun, search for 'things to do in Cancun reddit' and pass the urls to the get_reddit_comments tool to get suggestions.",
 )
 
 @tool("add_google_calendar_event", args_schema=Events)
-def add_google_calendar_event(events: Events):
+async def add_google_calendar_event(events: Events):
     """
     Tool for adding events to google calendar. Returns list of the title of event added and the link to open it. Make sure links are opened in a new tab when clicked.
     """
     try:
-        batch = service.new_batch_http_request()
+        writer = await run_blocking(calendar_writer.get)
+        bodies = []
+        links = []
         for event in events:
             event_data = build_event_data(event)
-            print("event", event_data)
-            batch.add(service.events().insert(calendarId="primary", body=event_data))
-        
-        batch.execute()
-        links = extract_event_links(batch._responses)
+            if event_data is None:
+                links.append(f"Could not add {event.summary}: invalid start or end time")
+                continue
+            bodies.append(event_data)
+
+        for result in await writer.write(bodies):
+            if result["status"] == "failed":
+                links.append(f"Could not add {result['summary']}: {result['error']}")
+            else:
+                links.append(f"{result['summary']}: ({result['link']})")
         if links:
             return links
-        
+
         return "Error occured when creating events"
 
     except Exception as e:
@@ -58,7 +306,7 @@ def add_google_calendar_event(events: Events):
         return f"Error occured: {e}"    
  
 @tool("search_flights", args_schema=FlightSearchParams)
-def search_flights(
+async def search_flights(
     departure_id: str,
     arrival_id: str,
     outbound_date: str,
@@ -91,87 +339,97 @@ Returns:
     A JSON object containing available flight options. Use this data to present multiple choices to the user but use conversational language, highlighting relevant factors like price, number of stops, airlines, and duration.
     Do not return the JSON to the user.
 """
-    params = {
-        "engine": "google_flights",
-        "departure_id": departure_id,
-        "outbound_date": outbound_date,
-        "return_date": return_date,
-        "type": type,
-        "travel_class": travel_class,
-        "adults": adults,
-        "children": children,
-        "infants_in_seat": infants_in_seat,
-        "infants_in_lap": infants_in_lap,
-        "bags": bags,
-        "sort_by": sort_by,
-        "stops": stops,
-        "max_price": max_price,
-        "currency": currency,
-        "hl": hl,
-        "api_key": os.getenv("SERPAPI_API_KEY")
-    }
+    checked = check_flight_search(departure_id, arrival_id, [outbound_date], [return_date] if return_date else [], type=type, adults=adults, children=children, infants_in_seat=infants_in_seat, infants_in_lap=infants_in_lap, bags=bags)
+    departure_id, arrival_id, type = checked["departure_id"], checked["arrival_id"], checked["type"]
+    if type == 2:
+        return_date = ""
+    params = flight_params(departure_id, arrival_id, outbound_date, return_date, type=type, travel_class=travel_class, adults=adults, children=children, infants_in_seat=infants_in_seat, infants_in_lap=infants_in_lap, bags=bags, sort_by=sort_by, stops=stops, exclude_airlines=exclude_airlines, include_airlines=include_airlines, max_price=max_price, currency=currency, hl=hl)
 
-    # Optional parameters
-    if arrival_id:
-        params["arrival_id"] = arrival_id
-    if exclude_airlines:
-        params["exclude_airlines"] = exclude_airlines
-    if include_airlines:
-        params["include_airlines"] = include_airlines
+    # Share results between identical searches
+    return await flight_cache.get_or_fetch(flight_cache_key(params), lambda: fetch_flights(params))
 
+@tool("search_flexible_flights", args_schema=FlexibleFlightSearchParams)
+async def search_flexible_flights(
+    departure_id: str,
+    arrival_id: str,
+    outbound_date_from: str,
+    outbound_date_to: str,
+    return_date_from: str = "",
+    return_date_to: str = "",
+    type: int = 1,
+    travel_class: int = 1,
+    adults: int = 1,
+    children: int = 0,
+    infants_in_seat: int = 0,
+    infants_in_lap: int = 0,
+    bags: int = 0,
+    sort_by: int = 1,
+    stops: int = 0,
+    exclude_airlines: str = "",
+    include_airlines: str = "",
+    max_price: int = 10000,
+    currency: str = "USD",
+    hl: str = "en"
+) -> str:
+    """
+Compares flight prices across a window of outbound and return dates in one call.
+
+Use this instead of repeated search_flights calls when the user's dates are flexible (e.g. "some time the first week of March for 4-5 days") or they ask for the cheapest days to fly.
+The result is shown to the user as a price table with the cheapest date combinations; search_flights gives the full options for the dates they pick.
+"""
+    checked = check_flight_search(departure_id, arrival_id, [outbound_date_from, outbound_date_to or outbound_date_from], [day for day in (return_date_from, return_date_to) if day], type=type, adults=adults, children=children, infants_in_seat=infants_in_seat, infants_in_lap=infants_in_lap, bags=bags)
+    departure_id, arrival_id, type = checked["departure_id"], checked["arrival_id"], checked["type"]
+    outbound_dates = date_range(outbound_date_from, outbound_date_to)
+    return_dates = date_range(return_date_from, return_date_to) if return_date_from and type != 2 else []
+    pairs = date_pairs(outbound_dates, return_dates)
+    if len(pairs) > FLEX_MAX_SEARCHES:
+        raise ValueError(f"{len(pairs)} date combinations is too many to compare. Narrow the date windows to at most {FLEX_MAX_SEARCHES} combinations.")
+    options = dict(type=type, travel_class=travel_class, adults=adults, children=children, infants_in_seat=infants_in_seat, infants_in_lap=infants_in_lap, bags=bags, sort_by=sort_by, stops=stops, exclude_airlines=exclude_airlines, include_airlines=include_airlines, max_price=max_price, currency=currency, hl=hl)
 
-    # Call Google Flight API
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    async def search(outbound_date, return_date):
+        params = flight_params(departure_id, arrival_id, outbound_date, return_date, **options)
+        fetched = False
 
-    if results["best_flights"]:
-        return results["best_flights"]
-    return results["other_flights"]
+        # Dates already searched (here or through search_flights) come from the cache
+        async def fetch():
+            nonlocal fetched
+            fetched = True
+            return await fetch_flights(params)
+
+        return await flight_cache.get_or_fetch(flight_cache_key(params), fetch), fetched
+
+    results = await fan_out(pairs, search)
+    return json.dumps(price_matrix(outbound_dates, return_dates, results, currency))
 
 @tool("get_reddit_comments", args_schema=RedditCommentsParams)
-def get_reddit_comments(url):
+async def get_reddit_comments(urls: List[str]):
     """
-    Get top 10 reddit comments from a URL to get personal recommenations and suggestions from the community.
+    Get the top comments from one or more reddit threads to get personal recommenations and suggestions from the community.
     """
-    submission = reddit.submission(url=url)
-    submission.comments.replace_more(limit=0)  # flatten comment tree
-
-    top_comments = []
-    for comment in submission.comments[:10]:
-        top_comments.append(comment.body)
-
-    return top_comments
+    return await fetch_comments(reddit_client.get(), urls)
 
 @tool("generate_itinerary", args_schema=ItineraryParams)
-def generate_itinerary(location: str, start_date: str, end_date: str, interests: List[str] = ["food", "sightseeing", "local experiences"]): 
+async def generate_itinerary(location: str, start_date: str, end_date: str, interests: List[str] = ["food", "sightseeing", "local experiences"]): 
     """
     Creates a structured day-by-day itinerary in JSON format for a given location, date range, and optional interests.
     Suitable for frontend display or exporting to a calendar.
     """
     interest_text = ", ".join(interests)
 
-    prompt = (
-        f"Plan a multi-day trip to {location} from {start_date} to {end_date}. "
-        f"Tailor it to the following interests: {interest_text}. "
-        f"""Return only structured JSON in this format: 
-        class Activity(BaseModel):
-            time: str
-            title: str
-            description: str
-
-        class DayPlan(BaseModel):
-            date: str
-            activities: List[Activity]
-
-        class Itinerary(BaseModel):
-            location: str
-            days: List[DayPlan]"""
-    )
-    result =  structured_llm.invoke(prompt)
-    return result
+    # Days are pushed to the client as they are generated, the full itinerary is returned for the itinerary node
+    async def build():
+        await acquire_upstream("openai")
+        return await build_itinerary(itinerary_llm.get(), location, start_date, end_date, interest_text)
+
+    async def personalize(itinerary, old_interests, new_interests, moved_days):
+        await acquire_upstream("openai")
+        return await personalize_itinerary(itinerary_llm.get(), itinerary, old_interests, new_interests, moved_days)
+
+    # Popular trips are served from earlier generations, re-dated and adapted to the interests
+    return await itinerary_cache.get_or_build(location, start_date, end_date, interests, build, personalize)
 
 # All tools
-tools = [search_tool, search_flights, get_reddit_comments, generate_itinerary, add_google_calendar_event]
+tools = [search_tool, search_flights, search_flexible_flights, get_reddit_comments, generate_itinerary, add_google_calendar_event]
 
 def get_tools():
     """
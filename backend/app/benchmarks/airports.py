@@ -0,0 +1,68 @@
+"""
+Airport index lookup latency, in microseconds per call, for the lookups a flight
+search goes through: codes, metro codes, city names, airport names, prefixes and
+misspellings. Also times opening the index, cold (building it from the CSV) and warm.
+
+Run from backend/app:
+    python -m benchmarks.airports
+    python -m benchmarks.airports --repeat 20000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from agent.airports import AIRPORTS_CSV, load_index
+
+QUERIES = {
+    "code": ["JFK", "cdg", "NRT", "CUN", "LHR"],
+    "metro code": ["PAR", "NYC", "LON", "TYO", "MIL"],
+    "city": ["Paris", "New York", "Cancún", "Tokyo", "Mexico City"],
+    "airport name": ["Heathrow", "de gaulle", "O'Hare", "Schiphol", "London City Airport"],
+    "prefix": ["barc", "amster", "san fr", "lisb", "honol"],
+    "misspelled": ["Barcelna", "Amsterdm", "Lisbn", "Ney York", "Frankfrut"],
+    "comma list": ["JFK,Paris", "Chicago,MKE", "LHR,LGW,STN"],
+}
+
+def per_call(fn, queries, repeat):
+    """
+    Median over the queries of the mean microseconds per call
+    """
+    timings = []
+    for query in queries:
+        fn(query)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(query)
+        timings.append((time.perf_counter() - start) / repeat * 1e6)
+    return statistics.median(timings), max(timings)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "airports.idx")
+        start = time.perf_counter()
+        load_index(AIRPORTS_CSV, path).close()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        index = load_index(AIRPORTS_CSV, path)
+        warm = time.perf_counter() - start
+        print(f"{len(index)} airports, {index.entries} keys, {os.path.getsize(path) // 1024} KB index")
+        print(f"open: build + map {cold * 1e3:.2f} ms, map {warm * 1e3:.3f} ms")
+
+        print(f"{'lookup':<14} {'resolve() µs':>13} {'worst':>7}")
+        for label, queries in QUERIES.items():
+            median, worst = per_call(index.resolve, queries, args.repeat if label != "misspelled" else max(1, args.repeat // 10))
+            print(f"{label:<14} {median:13.1f} {worst:7.1f}")
+        for label, fn, queries in (("get()", index.get, QUERIES["code"]), ("search()", index.search, QUERIES["prefix"]), ("fuzzy()", index.fuzzy, QUERIES["misspelled"])):
+            median, worst = per_call(fn, queries, args.repeat if fn != index.fuzzy else max(1, args.repeat // 10))
+            print(f"{label:<14} {median:13.1f} {worst:7.1f}")
+        for query in ("Paris", "New York", "Heathrow", "Barcelna", "PAR"):
+            print(f"  {query!r} -> {index.resolve(query)}")
+        index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Calendar insertion against a local fake Calendar server: the old single unchecked
+batch vs CalendarBatchWriter (chunked, concurrent, retried, idempotent), then a
+re-run of the same itinerary to show that nothing is duplicated.
+
+Run from backend/app:
+    python -m benchmarks.calendar_batch
+    python -m benchmarks.calendar_batch --events 200 --fail-rate 0.2 --latency 0.3
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+import httplib2
+from googleapiclient.errors import HttpError
+from agent.calendar_writer import CalendarBatchWriter
+from benchmarks.fakes import FakeCalendarServer
+
+def itinerary_events(n):
+    """
+    n events spread over days, three time blocks a day
+    """
+    events = []
+    for i in range(n):
+        day, block = divmod(i, 3)
+        hour = 9 + block * 5
+        start = f"2026-03-{1 + day % 28:02}T{hour:02}:00:00"
+        end = f"2026-03-{1 + day % 28:02}T{hour + 3:02}:00:00"
+        events.append({
+            "summary": f"Day {day + 1} activity {block + 1}",
+            "description": "Generated for the benchmark",
+            "start": {"dateTime": start, "timeZone": "America/Cancun"},
+            "end": {"dateTime": end, "timeZone": "America/Cancun"},
+        })
+    return events
+
+def single_batch(service, events):
+    """
+    What add_google_calendar_event did before: every event in one batch, no retries
+    """
+    created = []
+
+    def on_response(request_id, response, exception):
+        if exception is None:
+            created.append(response)
+
+    batch = service.new_batch_http_request(callback=on_response)
+    for event in events:
+        batch.add(service.events().insert(calendarId="primary", body=event))
+    batch.execute()
+    return len(created)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=120)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    events = itinerary_events(args.events)
+
+    old = FakeCalendarServer(latency=args.latency, fail_rate=args.fail_rate)
+    start = time.perf_counter()
+    try:
+        created = await asyncio.to_thread(single_batch, old.service(), events)
+        print(f"single batch   {time.perf_counter() - start:7.3f} s  {created}/{len(events)} created")
+    except (HttpError, ValueError) as e:
+        print(f"single batch   {time.perf_counter() - start:7.3f} s  failed: {e}")
+    old.close()
+
+    server = FakeCalendarServer(latency=args.latency, fail_rate=args.fail_rate)
+    writer = CalendarBatchWriter(server.service(), http_factory=httplib2.Http)
+    for label in ("writer", "writer re-run"):
+        batches = server.batches
+        start = time.perf_counter()
+        results = await writer.write(events)
+        elapsed = time.perf_counter() - start
+        statuses = Counter(result["status"] for result in results)
+        print(f"{label:<14} {elapsed:7.3f} s  {dict(statuses)}  {server.batches - batches} batches  {len(server.events)} events stored")
+    print(f"rate limit errors injected: {server.failures}")
+    server.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
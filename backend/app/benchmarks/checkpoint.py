@@ -0,0 +1,63 @@
+"""
+Checkpoint write/read latency per turn as a conversation grows.
+
+Run from backend/app:
+    python -m benchmarks.checkpoint --turns 60
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.graph import MessagesState, StateGraph
+from agent.checkpoint import BoundedMemorySaver, SqliteSaver
+
+# Roughly the size of a flight search result and a chatty reply
+TOOL_PAYLOAD = "x" * 6000
+REPLY = "y" * 800
+
+async def turn(state: MessagesState):
+    return {"messages": [
+        AIMessage(content="", tool_calls=[{"name": "search_flights", "args": {}, "id": "call"}]),
+        ToolMessage(content=TOOL_PAYLOAD, tool_call_id="call"),
+        AIMessage(content=REPLY),
+    ]}
+
+def build_graph(checkpointer):
+    workflow = StateGraph(MessagesState)
+    workflow.add_node("turn", turn)
+    workflow.set_entry_point("turn")
+    workflow.set_finish_point("turn")
+    return workflow.compile(checkpointer=checkpointer)
+
+async def run(name, checkpointer, turns, report_every):
+    graph = build_graph(checkpointer)
+    config = {"configurable": {"thread_id": "bench"}}
+    print(f"\n{name}")
+    print(f"{'turn':>6} {'write ms':>10} {'read ms':>10} {'messages':>10}")
+    for i in range(1, turns + 1):
+        start = time.perf_counter()
+        await graph.ainvoke({"messages": [("user", f"message {i}")]}, config)
+        write_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        state = await graph.aget_state(config)
+        read_ms = (time.perf_counter() - start) * 1000
+
+        if i == 1 or i % report_every == 0:
+            print(f"{i:>6} {write_ms:>10.2f} {read_ms:>10.2f} {len(state.values['messages']):>10}")
+    print(checkpointer.stats())
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--report-every", type=int, default=10)
+    args = parser.parse_args()
+
+    await run("memory", BoundedMemorySaver(), args.turns, args.report_every)
+    with tempfile.TemporaryDirectory() as tmp:
+        await run("sqlite", SqliteSaver(os.path.join(tmp, "bench.sqlite")), args.turns, args.report_every)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Concurrent /chat streams: N users send a message at the same time to the real FastAPI
+app and graph, with a fake main LLM that takes --llm-latency to answer. On the async
+path the streams overlap, so the whole batch takes about one reply's time. If anything
+blocked the event loop they would run one after another and take N times as long.
+
+Also probes the event loop every 10 ms during the run and reports the worst delay.
+
+Run from backend/app:
+    python -m benchmarks.concurrent_chat
+    python -m benchmarks.concurrent_chat --users 1,8,32 --llm-latency 0.5
+
+For a full multi-turn conversation with tools, see benchmarks.replay.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Keep the app from building real clients or writing logs during the run
+os.environ.setdefault("WARM_UP_CLIENTS", "checkpointer,agent")
+os.environ.setdefault("METADATA_LOG_PATH", os.devnull)
+
+import httpx
+from agent import clients
+from agent.agent import tool_schemas
+from benchmarks.fakes import ScriptedChatModel
+from benchmarks.replay import serve
+
+async def stream_chat(client, thread_id):
+    """
+    (start, end) of one /chat stream, in perf_counter seconds
+    """
+    start = time.perf_counter()
+    async with client.stream("POST", "/chat", json={"input": "Any ideas for a warm trip in March?", "thread_id": thread_id}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_text():
+            pass
+    return start, time.perf_counter()
+
+def peak_overlap(intervals):
+    """
+    Most streams open at the same moment
+    """
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    open_streams = peak = 0
+    for _, change in events:
+        open_streams += change
+        peak = max(peak, open_streams)
+    return peak
+
+async def loop_lag(stop, interval=0.01):
+    """
+    Worst extra delay of a 10 ms sleep while the streams run
+    """
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def run_level(client, users):
+    stop = asyncio.Event()
+    lag = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    intervals = await asyncio.gather(*(stream_chat(client, f"concurrent-{users}-{i}-{time.monotonic_ns()}") for i in range(users)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    durations = [end - begin for begin, end in intervals]
+    return {
+        "users": users,
+        "seconds": elapsed,
+        "serial_seconds": sum(durations),
+        "mean_stream": sum(durations) / users,
+        "peak_overlap": peak_overlap(intervals),
+        "max_loop_lag": await lag,
+    }
+
+async def main_async(args):
+    llm = ScriptedChatModel(default_reply="Cancun, Tulum and Oaxaca are all warm in March.", first_token_latency=args.llm_latency, token_latency=args.token_latency).bind_tools(tool_schemas)
+    clients.override("main_llm", llm)
+    clients.override("memory_llm", ScriptedChatModel(first_token_latency=args.llm_latency, model_name="scripted-memory"))
+    levels = [int(n) for n in args.users.split(",")]
+    rows = []
+    server, task, url = await serve()
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=httpx.Limits(max_connections=max(levels) * 2)) as client:
+            for users in levels:
+                rows.append(await run_level(client, users))
+    finally:
+        server.should_exit = True
+        await task
+
+    print(f"{'users':>6} {'wall s':>8} {'streams s':>10} {'mean s':>7} {'overlap':>8} {'speedup':>8} {'loop lag ms':>12}")
+    for row in rows:
+        print(
+            f"{row['users']:>6} {row['seconds']:>8.2f} {row['serial_seconds']:>10.2f} {row['mean_stream']:>7.2f} "
+            f"{row['peak_overlap']:>8} {row['serial_seconds'] / row['seconds']:>7.1f}x {row['max_loop_lag'] * 1000:>12.1f}"
+        )
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="1,4,16", help="comma separated concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="main LLM time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
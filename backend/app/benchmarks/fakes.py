@@ -0,0 +1,453 @@
+"""
+Offline stand-ins for the external services, installed with agent.clients.override.
+"""
+import asyncio
+import email.parser
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, timedelta
+from typing import Optional
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class FakeComment:
+    def __init__(self, id, score, body):
+        self.id = id
+        self.score = score
+        self.body = body
+
+class FakeCommentForest(list):
+    def replace_more(self, limit=0):
+        return []
+
+class FakeSubmission:
+    """
+    praw Submission look-alike. Comments are "fetched" with a fixed latency on first access
+    """
+
+    def __init__(self, reddit, id):
+        self.reddit = reddit
+        self.id = id
+        self.title = f"Thread {id}"
+        self.subreddit = "travel"
+        self.comment_sort = "confidence"
+        self._comments = None
+
+    @property
+    def comments(self):
+        if self._comments is None:
+            self._comments = FakeCommentForest(self.reddit.fetch(self.id))
+        return self._comments
+
+class FakeReddit:
+    """
+    praw.Reddit look-alike with generated threads. Counts requests so benchmarks can
+    check caching and rate limiting
+    """
+
+    def __init__(self, latency=0.3, comments=200, duplicate_rate=0.1, seed=0):
+        self.latency = latency
+        self.comments = comments
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def submission(self, id=None, url=None):
+        return FakeSubmission(self, id)
+
+    def fetch(self, id):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        rng = random.Random(f"{self.seed}-{id}")
+        comments = []
+        for i in range(self.comments):
+            if comments and rng.random() < self.duplicate_rate:
+                body = rng.choice(comments).body
+            else:
+                body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 150)))
+            comments.append(FakeComment(f"{id}_{i}", rng.randint(-5, 2000), body))
+        comments.append(FakeComment(f"{id}_deleted", 5000, "[deleted]"))
+        return comments
+
+WORDS = "the beach was great try the tacos at the market near downtown ferry snorkeling cenote tour early morning avoid crowds book ahead".split()
+
+AIRLINES = ["American", "Delta", "United", "JetBlue", "Spirit", "Alaska"]
+
+def fake_flights(n, seed=0):
+    """
+    SerpAPI-shaped flight results with realistic extra fields
+    """
+    rng = random.Random(seed)
+    flights = []
+    for _ in range(n):
+        legs = rng.randint(1, 3)
+        hour = rng.randint(5, 23)
+        flights.append({
+            "flights": [{
+                "departure_airport": {"name": "Airport", "id": "ORD", "time": f"2026-03-01 {hour:02}:{rng.choice(['00', '30'])}"},
+                "arrival_airport": {"name": "Airport", "id": "MIA", "time": f"2026-03-01 {min(hour + 3, 23):02}:15"},
+                "duration": rng.randint(80, 300),
+                "airplane": "Boeing 737",
+                "airline": rng.choice(AIRLINES),
+                "airline_logo": "https://www.gstatic.com/flights/airline_logos/70px/AA.png",
+                "travel_class": "Economy",
+                "flight_number": f"AA {rng.randint(100, 999)}",
+                "extensions": ["Average legroom (30 in)", "Wi-Fi for a fee", "In-seat power & USB outlets"],
+            } for _ in range(legs)],
+            "layovers": [{"duration": rng.randint(40, 200), "name": "Hub", "id": "ATL"} for _ in range(legs - 1)],
+            "total_duration": rng.randint(180, 900),
+            "carbon_emissions": {"this_flight": 180000, "typical_for_this_route": 170000, "difference_percent": 6},
+            "price": rng.randint(120, 1200),
+            "type": "Round trip",
+            "airline_logo": "https://www.gstatic.com/flights/airline_logos/70px/multi.png",
+            "departure_token": "W1siT1JEIiwiMjAyNi0wMy0wMSIsIk1JQSIsbnVsbCwiQUEiLCIxMjMiXV0=" * 3,
+        })
+    return flights
+
+class FakeSerpApi:
+    """
+    Stands in for serpapi.GoogleSearch: FakeSerpApi(latency)(params).get_dict()
+    """
+
+    def __init__(self, latency=1.0, flights=30):
+        self.latency = latency
+        self.flights = flights
+        self.requests = 0
+
+    def __call__(self, params):
+        return FakeSerpApiSearch(self, params)
+
+class FakeSerpApiSearch:
+    def __init__(self, api, params):
+        self.api = api
+        self.params = params
+
+    def get_dict(self):
+        self.api.requests += 1
+        time.sleep(self.api.latency)
+        flights = fake_flights(self.api.flights, seed=zlib.crc32(f"{self.params.get('outbound_date')}:{self.params.get('return_date')}".encode()))
+        return {"best_flights": flights[:3], "other_flights": flights[3:]}
+
+class FakeSerper:
+    """
+    GoogleSerperAPIWrapper look-alike returning canned snippets with reddit links
+    """
+    k = 10
+    gl = "us"
+    hl = "en"
+    type = "search"
+
+    def __init__(self, latency=0.4):
+        self.latency = latency
+        self.requests = 0
+
+    @staticmethod
+    def thread_urls(query):
+        slug = "_".join(query.lower().split()[:4])
+        return [f"https://www.reddit.com/r/travel/comments/{zlib.crc32(slug.encode()) % 10**6:x}{i}/{slug}/" for i in range(3)]
+
+    def _results(self, query):
+        return "\n".join(
+            f"thread {i}: {url} ... locals recommend the market, the cenotes and sunrise at the beach."
+            for i, url in enumerate(self.thread_urls(query))
+        )
+
+    def run(self, query):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def arun(self, query):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    """
+    Serves the Calendar events endpoints used by the app, one at a time or in
+    multipart batches, from the store of the FakeCalendarServer it belongs to
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type="application/json; charset=UTF-8"):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+
+    def do_GET(self):
+        self._reply(*self.server.calendar.handle("GET", self.path, ""))
+
+    def do_PUT(self):
+        self._reply(*self.server.calendar.handle("PUT", self.path, self._body()))
+
+    def do_POST(self):
+        body = self._body()
+        if not self.path.startswith("/batch/"):
+            self._reply(*self.server.calendar.handle("POST", self.path, body))
+            return
+
+        time.sleep(self.server.calendar.latency)
+        self.server.calendar.batches += 1
+        message = email.parser.Parser().parsestr(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n{body}")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split("\n", 1)
+            method, path, _ = request_line.split(" ", 2)
+            inner = email.parser.Parser().parsestr(rest)
+            status, content = self.server.calendar.handle(method, path, inner.get_payload())
+            reason = HTTPStatus(status).phrase
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{content}\r\n"
+            )
+        self._reply(200, "".join(parts) + f"--{boundary}--\r\n", f"multipart/mixed; boundary={boundary}")
+
+EVENT_PATH = re.compile(r"/calendar/v3/calendars/([^/]+)/events(?:/([^/?]+))?")
+
+class FakeCalendarServer:
+    """
+    Local HTTP server speaking enough of the Calendar v3 API (insert, get, update and
+    batches) to run the real googleapiclient against. fail_rate of the calls answer
+    with a rate limit error (429 or 403 rateLimitExceeded) to exercise retries
+    """
+
+    def __init__(self, latency=0.1, fail_rate=0.0, seed=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.events = {}
+        self.inserts = 0
+        self.batches = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeCalendarHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.calendar = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def delete(self, event_id):
+        self.events[event_id]["status"] = "cancelled"
+
+    def service(self):
+        """
+        Real googleapiclient Calendar service pointed at this server
+        """
+        # Batch requests always go to the discovery document's rootUrl, so point that here
+        document = json.loads(get_static_doc("calendar", "v3"))
+        document["rootUrl"] = self.url
+        return build_from_document(document, credentials=AnonymousCredentials())
+
+    def _error(self, status, reason, message):
+        return status, json.dumps({"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}})
+
+    def handle(self, method, path, body):
+        match = EVENT_PATH.match(path)
+        if match is None:
+            return self._error(404, "notFound", "Not Found")
+        event_id = match.group(2)
+
+        with self._lock:
+            if self.fail_rate and self._rng.random() < self.fail_rate:
+                self.failures += 1
+                if self._rng.random() < 0.5:
+                    return self._error(429, "rateLimitExceeded", "Rate Limit Exceeded")
+                return self._error(403, "rateLimitExceeded", "Rate Limit Exceeded")
+
+            if method == "POST":
+                event = json.loads(body)
+                event_id = event.get("id") or uuid.uuid4().hex
+                if event_id in self.events:
+                    return self._error(409, "duplicate", "The requested identifier already exists.")
+                self.inserts += 1
+            elif event_id not in self.events:
+                return self._error(404, "notFound", "Not Found")
+            elif method == "GET":
+                return 200, json.dumps(self.events[event_id])
+            else:
+                event = json.loads(body)
+
+            event = {**event, "id": event_id, "status": event.get("status", "confirmed"), "htmlLink": f"https://calendar.google.com/event?eid={event_id}"}
+            self.events[event_id] = event
+            return 200, json.dumps(event)
+
+DATE_RANGE = re.compile(r"to (.+?) from (\d{4}-\d{2}-\d{2}) to (\d{4}-\d{2}-\d{2})")
+
+class FakeItineraryLLM:
+    """
+    Stands in for the JSON-mode itinerary model. Streams partial dicts one day at a time
+    """
+
+    def __init__(self, day_latency=0.8):
+        self.day_latency = day_latency
+
+    def _plan(self, prompt):
+        match = DATE_RANGE.search(prompt)
+        location, start, end = match.groups() if match else ("Cancun", "2026-03-01", "2026-03-03")
+        start_day = date.fromisoformat(start)
+        days = max((date.fromisoformat(end) - start_day).days + 1, 1)
+        return location, [
+            {"date": (start_day + timedelta(days=i)).isoformat(), "activities": [
+                {"time": "09:00", "title": f"Morning in {location}", "description": "Breakfast and a walk."},
+                {"time": "13:00", "title": "Beach", "description": "Swim and relax."},
+                {"time": "19:00", "title": "Dinner", "description": "Tacos at the market."},
+            ]}
+            for i in range(days)
+        ]
+
+    async def astream(self, prompt):
+        location, days = self._plan(prompt)
+        for i in range(len(days)):
+            await asyncio.sleep(self.day_latency)
+            yield {"location": location, "days": days[:i + 1]}
+
+    async def ainvoke(self, prompt):
+        if '{"changes"' in prompt:
+            # Personalizing a cached itinerary: a couple of replaced activities
+            await asyncio.sleep(self.day_latency)
+            return {"changes": [{"day": 0, "activity": 1, "time": "13:00", "title": "Cooking class", "description": "Learn to make salsa and tortillas."}]}
+        location, days = self._plan(prompt)
+        await asyncio.sleep(self.day_latency * len(days))
+        return {"location": location, "days": days}
+
+class PromptCacheSimulator:
+    """
+    Mimics provider prompt caching: prompts are split into 128 token blocks and a
+    prefix is served from cache when an earlier prompt had the same blocks, once at
+    least 1024 tokens match. Tokens are estimated as 4 characters
+    """
+
+    def __init__(self, block_tokens=128, min_tokens=1024):
+        self.block_chars = block_tokens * 4
+        self.min_chars = min_tokens * 4
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, text):
+        """
+        Returns how many tokens of text were cached, and remembers its prefixes
+        """
+        cached = 0
+        prefix = 0
+        with self._lock:
+            for end in range(self.block_chars, len(text) + 1, self.block_chars):
+                prefix = zlib.crc32(text[end - self.block_chars:end].encode(), prefix)
+                key = (end, prefix)
+                if key in self._seen and cached == end - self.block_chars:
+                    cached = end
+                self._seen.add(key)
+        return cached // 4 if cached >= self.min_chars else 0
+
+def prompt_text(messages, tools=None):
+    """
+    Serializes a prompt the way it is sent: tools first, then the messages in order
+    """
+    parts = [json.dumps(tools, separators=(",", ":"))] if tools else []
+    for message in messages:
+        parts.append(f"<{message.type}>{message.content}{json.dumps(getattr(message, 'tool_calls', None) or [])}")
+    return "".join(parts)
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic chat model for replaying a conversation. The reply is picked from the
+    script by the latest user message, so many sessions can share one instance. A turn
+    with tool calls answers with them first and with its reply once the tools ran
+    """
+    script: dict = {}
+    default_reply: str = "Sounds good!"
+    first_token_latency: float = 0.3
+    token_latency: float = 0.01
+    tools: list = []
+    prompt_cache: Optional[PromptCacheSimulator] = None
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return {"ls_provider": "fake", "ls_model_name": self.model_name, "ls_model_type": "chat"}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools": tools})
+
+    def _turn(self, messages):
+        # System notes (memory, date) don't count as turns
+        messages = [m for m in messages if not isinstance(m, SystemMessage)]
+        last_user = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        turn = self.script.get(last_user.content if last_user else None)
+        if turn is None:
+            return [], self.default_reply
+        if turn.get("tool_calls") and messages and isinstance(messages[-1], HumanMessage):
+            return [{**call, "id": f"call_{uuid.uuid4().hex[:12]}"} for call in turn["tool_calls"]], ""
+        return [], turn["reply"]
+
+    def _usage(self, messages, reply):
+        text = prompt_text(messages, self.tools)
+        input_tokens = len(text) // 4
+        cached = self.prompt_cache.lookup(text) if self.prompt_cache else 0
+        output_tokens = len(reply) // 4 + 1
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens, "input_token_details": {"cache_read": cached}}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, reply = self._turn(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(reply.split()))
+        message = AIMessage(content=reply, tool_calls=tool_calls, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, reply = self._turn(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(reply.split()))
+        message = AIMessage(content=reply, tool_calls=tool_calls, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, reply = self._turn(messages)
+        await asyncio.sleep(self.first_token_latency)
+        if tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(tool_calls)
+            ]))
+        else:
+            for i, word in enumerate(reply.split(" ")):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                token = word if i == 0 else " " + word
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, reply)))
@@ -0,0 +1,74 @@
+"""
+Flexible-date flight search: one search_flexible_flights call vs the model calling
+search_flights once per date combination, a tool turn each (what a "cheapest days in
+the first week of March" question used to take), against FakeSerpApi.
+
+The serpapi rate budget applies to both. It's read at import, so --serpapi-budget
+sets RATE_LIMIT_SERPAPI first (default: the production 60 per minute, burst 5).
+
+Run from backend/app:
+    python -m benchmarks.flex_flights
+    python -m benchmarks.flex_flights --outbound-days 7 --return-days 5 --serpapi-budget 600:20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, timedelta
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outbound-days", type=int, default=5)
+    parser.add_argument("--return-days", type=int, default=4)
+    parser.add_argument("--flight-latency", type=float, default=1.0)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="seconds per LLM turn between sequential searches")
+    parser.add_argument("--serpapi-budget", default="", help="RATE_LIMIT_SERPAPI, <requests per minute>:<burst>")
+    args = parser.parse_args()
+    if args.serpapi_budget:
+        os.environ["RATE_LIMIT_SERPAPI"] = args.serpapi_budget
+
+    from agent import clients
+    from agent.flex_dates import date_pairs, date_range
+    from agent.tools import flight_cache, search_flexible_flights, search_flights
+    from benchmarks.fakes import FakeSerpApi
+
+    serpapi = FakeSerpApi(latency=args.flight_latency)
+    clients.override("serpapi", serpapi)
+    first = date(2026, 3, 1)
+    outbound = (first.isoformat(), (first + timedelta(days=args.outbound_days - 1)).isoformat())
+    back = ((first + timedelta(days=4)).isoformat(), (first + timedelta(days=3 + args.return_days)).isoformat())
+    pairs = date_pairs(date_range(*outbound), date_range(*back))
+    route = {"departure_id": "ORD", "arrival_id": "CUN"}
+
+    # Sequential: one search_flights call per combination, an LLM turn in between
+    start = time.perf_counter()
+    for outbound_date, return_date in pairs:
+        await asyncio.sleep(args.llm_latency)
+        await search_flights.ainvoke({**route, "outbound_date": outbound_date, "return_date": return_date})
+    sequential = time.perf_counter() - start
+    sequential_requests = serpapi.requests
+
+    # Fan-out: one tool call, cold cache
+    flight_cache.clear()
+    flex_args = {**route, "outbound_date_from": outbound[0], "outbound_date_to": outbound[1], "return_date_from": back[0], "return_date_to": back[1]}
+    start = time.perf_counter()
+    result = json.loads(await search_flexible_flights.ainvoke(flex_args))
+    cold = time.perf_counter() - start
+    cold_requests = serpapi.requests - sequential_requests
+
+    # Same window again, e.g. the user asks to compare nonstop-only after all. All cached
+    start = time.perf_counter()
+    await search_flexible_flights.ainvoke(flex_args)
+    warm = time.perf_counter() - start
+    warm_requests = serpapi.requests - sequential_requests - cold_requests
+
+    print(f"{len(pairs)} date combinations, {args.flight_latency:.1f} s per search, budget {os.getenv('RATE_LIMIT_SERPAPI', '60:5')}")
+    print(f"sequential search_flights  {sequential:7.2f} s  {sequential_requests:3} upstream calls  {len(pairs)} tool turns")
+    print(f"search_flexible_flights    {cold:7.2f} s  {cold_requests:3} upstream calls  1 tool turn")
+    print(f"  repeated, cached         {warm:7.2f} s  {warm_requests:3} upstream calls")
+    print(f"matrix {len(result['prices'])}x{len(result['prices'][0])}, {result['failed']} failed, cheapest: " + ", ".join(f"{o['outbound_date']}/{o['return_date']} {o['price']}" for o in result["cheapest"]))
+    print(f"tool result {len(json.dumps(result)) // 4} tokens")
+
+if __name__ == "__main__":
+    asyncio.run(main())
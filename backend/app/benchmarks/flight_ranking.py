@@ -0,0 +1,85 @@
+"""
+Time to flight cards for the fast ranker vs the gpt-4o summarizer, plus raw
+scoring cost of the Python and numpy paths.
+
+Run from backend/app:
+    python -m benchmarks.flight_ranking                  # summarizer replaced by a fake with --llm-latency
+    python -m benchmarks.flight_ranking --live           # real gpt-4o summarizer, needs OPENAI_API_KEY
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from langchain_core.messages import AIMessage, ToolMessage
+import agent.agent as agent_module
+from agent import clients
+from agent.flights import FlightRanker, compact_flights
+from benchmarks.fakes import fake_flights
+
+class FakeSummarizer:
+    """
+    Stands in for the gpt-4o JSON-mode summarizer with a fixed latency
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return {"flights_array": [0, 1, 2], "message": "Here are three good options."}
+
+def flight_state(flights):
+    call_id = "call_bench"
+    return {"messages": [
+        AIMessage(content="", tool_calls=[{"name": "search_flights", "args": {"currency": "USD"}, "id": call_id}]),
+        ToolMessage(content=json.dumps(flights), name="search_flights", tool_call_id=call_id),
+    ]}
+
+async def time_to_cards(mode, flights, runs):
+    agent_module.FLIGHT_SUMMARY_MODE = mode
+    state = flight_state(flights)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await agent_module.summarize_flights(state)
+        times.append(time.perf_counter() - start)
+        assert json.loads(result["messages"][0].content)["type"] == "flight_response"
+    return statistics.median(times)
+
+def time_scoring(size, repeats=50):
+    options = compact_flights(fake_flights(size, seed=size))
+    python = FlightRanker(vectorize_threshold=10**9)
+    vectorized = FlightRanker(vectorize_threshold=0)
+    results = {}
+    for name, ranker in (("python", python), ("numpy", vectorized)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ranker.rank(options, 3)
+        results[name] = (time.perf_counter() - start) / repeats * 1000
+    return results
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    if not args.live:
+        clients.override("summary_llm", FakeSummarizer(args.llm_latency))
+
+    flights = fake_flights(args.flights)
+    print(f"time to flight cards, {args.flights} results (median of {args.runs})")
+    for mode in ("fast", "llm"):
+        print(f"  {mode:<5} {await time_to_cards(mode, flights, args.runs) * 1000:10.2f} ms")
+
+    print("\nranking cost per call")
+    print(f"{'results':>8} {'python ms':>10} {'numpy ms':>10}")
+    for size in (10, 100, 1000, 10000):
+        timing = time_scoring(size, repeats=20 if size >= 1000 else 100)
+        print(f"{size:>8} {timing['python']:>10.3f} {timing['numpy']:>10.3f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Connection reuse for upstream calls against a local HTTP server that charges a
+fixed setup cost per new connection (standing in for the TCP + TLS handshake).
+Compares a fresh connection per call, as serpapi's requests.get and Serper's
+per-call aiohttp session did, with the shared pools from agent.http_pool.
+
+Run from backend/app:
+    python -m benchmarks.http_pool
+    python -m benchmarks.http_pool --calls 100 --concurrency 8 --handshake 0.08
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import aiohttp
+from serpapi import GoogleSearch
+from agent.http_pool import PooledSession, async_client, pool_stats
+from agent import tools
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+        time.sleep(self.server.handshake)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.server.latency)
+        body = json.dumps({"organic": [], "best_flights": [], "other_flights": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+def start_server(handshake, latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.handshake = handshake
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_threads(call, calls, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: call(), range(calls)))
+    return time.perf_counter() - start
+
+async def run_tasks(call, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--handshake", type=float, default=0.05, help="seconds charged per new connection")
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    server, url = start_server(args.handshake, args.latency)
+    params = {"engine": "google_flights", "departure_id": "ORD", "arrival_id": "CUN", "api_key": "x"}
+
+    def report(label, elapsed, before):
+        print(f"{label:<28} {elapsed:7.3f} s  {elapsed / args.calls * 1000:7.1f} ms/call  {server.connections - before:4} connections")
+
+    # SerpAPI (blocking, from worker threads)
+    class FreshSearch(GoogleSearch):
+        BACKEND = url
+
+    class PooledSearch(tools.PooledGoogleSearch):
+        BACKEND = url
+
+    tools.serpapi_http.override(PooledSession("serpapi", max_connections=args.concurrency))
+    before = server.connections
+    report("serpapi requests.get", run_threads(lambda: FreshSearch(params).get_dict(), args.calls, args.concurrency), before)
+    before = server.connections
+    report("serpapi pooled session", run_threads(lambda: PooledSearch(params).get_dict(), args.calls, args.concurrency), before)
+
+    # Serper (async)
+    async def fresh_session():
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{url}/search", params={"q": "cancun"}) as response:
+                await response.json()
+
+    client = async_client("serper", max_connections=args.concurrency)
+
+    async def pooled():
+        response = await client.post(f"{url}/search", params={"q": "cancun"})
+        response.json()
+
+    before = server.connections
+    report("serper aiohttp per call", await run_tasks(fresh_session, args.calls, args.concurrency), before)
+    before = server.connections
+    report("serper pooled httpx", await run_tasks(pooled, args.calls, args.concurrency), before)
+
+    print(json.dumps(pool_stats(), indent=2))
+    await client.aclose()
+    server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+generate_itinerary with and without the itinerary cache, over a request mix that
+looks like production: mostly popular destinations with the default interests,
+asked for different start dates, some with an extra interest, some unrelated.
+
+Run from backend/app:
+    python -m benchmarks.itinerary_cache
+    python -m benchmarks.itinerary_cache --requests 300 --concurrency 16 --day-latency 0.2
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from agent import clients, tools
+from agent.itinerary_cache import ItineraryCache
+from benchmarks.fakes import FakeItineraryLLM
+
+DESTINATIONS = ["Cancun", "Paris", "Tokyo", "Rome", "New York", "Barcelona", "Lisbon", "Bangkok", "cancún", "paris"]
+DEFAULT_INTERESTS = ["food", "sightseeing", "local experiences"]
+EXTRA_INTERESTS = ["beaches", "museums", "nightlife", "street food", "hiking"]
+
+def workload(n, seed=7):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(n):
+        location = rng.choice(DESTINATIONS[:5]) if rng.random() < 0.7 else rng.choice(DESTINATIONS)
+        start = date(2026, 3, 1) + timedelta(days=rng.randint(0, 120))
+        days = rng.choice([3, 3, 4, 5])
+        roll = rng.random()
+        if roll < 0.6:
+            interests = rng.sample(DEFAULT_INTERESTS, 3)
+        elif roll < 0.85:
+            interests = DEFAULT_INTERESTS + [rng.choice(EXTRA_INTERESTS)]
+        else:
+            interests = rng.sample(EXTRA_INTERESTS, 2)
+        requests.append({"location": location, "start_date": start.isoformat(), "end_date": (start + timedelta(days=days - 1)).isoformat(), "interests": interests})
+    return requests
+
+async def run(cache, requests, concurrency):
+    tools.itinerary_cache = cache
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(request):
+        async with semaphore:
+            start = time.perf_counter()
+            await tools.generate_itinerary.ainvoke(request)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(request) for request in requests))
+    return time.perf_counter() - start, latencies
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--day-latency", type=float, default=0.1, help="seconds per generated day")
+    args = parser.parse_args()
+    clients.override("itinerary_llm", FakeItineraryLLM(day_latency=args.day_latency))
+    requests = workload(args.requests)
+
+    for label, cache in (("no cache", ItineraryCache(max_size=0)), ("exact only", ItineraryCache(similarity=0)), ("exact + similar", ItineraryCache())):
+        elapsed, latencies = await run(cache, requests, args.concurrency)
+        stats = cache.stats()
+        latencies.sort()
+        print(f"{label:<16} {elapsed:6.2f} s  mean {statistics.mean(latencies):5.2f} s  p95 {latencies[int(len(latencies) * 0.95)]:5.2f} s  "
+              f"generated {stats['misses']:3}  exact {stats['hits'] + stats['coalesced']:3}  adapted {stats['similar_hits']:3}  hit rate {stats['hit_rate']:5.1%}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Prompt size and cached-prefix rate of main LLM calls, old layout vs PromptLayout.
+
+Both are replayed through PromptCacheSimulator (128 token blocks, 1024 token minimum)
+for sessions load balanced over workers started on different days. The old layout
+put the worker's start date inside the system prompt and sent the full tool schemas;
+the new one keeps system prompt + minified schemas static and puts today's date last.
+
+Run from backend/app:
+    python -m benchmarks.prompt_cache
+    python -m benchmarks.prompt_cache --sessions 50 --workers 4
+"""
+import argparse
+from datetime import datetime, timedelta
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from agent.agent import prompt_layout, system_message, tool_schemas, tools
+from benchmarks.fakes import PromptCacheSimulator, prompt_text
+from benchmarks.replay import CONVERSATION
+
+def old_prompt(conversation, started):
+    date_line = f"\n\nToday's date is {started.strftime('%B %d, %Y')}. Use this to understand and resolve any relative time references (e.g., \"next Friday\", \"two weeks from now\")."
+    return [SystemMessage(content=system_message + date_line), *conversation]
+
+def steps(session):
+    """
+    The message list at every main LLM call of one replayed conversation
+    """
+    conversation = []
+    for turn in CONVERSATION:
+        conversation.append(HumanMessage(content=turn["user"]))
+        if turn.get("tool_calls"):
+            calls = [{**call, "id": f"call_{session}_{len(conversation)}_{i}"} for i, call in enumerate(turn["tool_calls"])]
+            conversation.append(AIMessage(content="", tool_calls=calls))
+            yield list(conversation)
+            conversation.extend(ToolMessage(content=f"{call['name']} result for session {session}", tool_call_id=call["id"]) for call in calls)
+        yield list(conversation)
+        conversation.append(AIMessage(content=turn["reply"] or "Here you go."))
+
+def run(layout, sessions, workers, schemas):
+    cache = PromptCacheSimulator()
+    today = datetime(2026, 3, 1, 12)
+    calls = prompt_tokens = cached_tokens = 0
+    request = 0
+    for session in range(sessions):
+        for conversation in steps(session):
+            # Round-robin load balancing; worker n was started n days ago
+            started = today - timedelta(days=request % workers)
+            request += 1
+            messages = old_prompt(conversation, started) if layout == "old" else prompt_layout.messages(conversation, now=today)
+            text = prompt_text(messages, schemas)
+            calls += 1
+            prompt_tokens += len(text) // 4
+            cached_tokens += cache.lookup(text)
+    return calls, prompt_tokens, cached_tokens
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    full_schemas = [convert_to_openai_tool(tool) for tool in tools]
+    print(f"tool schemas: {len(prompt_text([], full_schemas)) // 4} tokens full, {len(prompt_text([], tool_schemas)) // 4} minified")
+    for layout, schemas in (("old", full_schemas), ("new", tool_schemas)):
+        calls, prompt_tokens, cached = run(layout, args.sessions, args.workers, schemas)
+        print(f"{layout} layout  {prompt_tokens / calls:7.0f} prompt tokens per call  {cached / prompt_tokens:6.1%} cached  {(prompt_tokens - cached) / calls:7.0f} uncached per call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Reddit research latency: the old sequential one-thread-per-call fetch vs the batch
+pipeline, cold and with a warm comment cache. Runs against FakeReddit, so no network.
+
+Run from backend/app:
+    python -m benchmarks.reddit
+    python -m benchmarks.reddit --threads 6 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+from agent import reddit
+from agent.ratelimit import upstream_limits
+from benchmarks.fakes import FakeReddit
+
+def urls(n):
+    return [f"https://www.reddit.com/r/travel/comments/t{i}/must_dos_in_cancun/" for i in range(n)]
+
+def sequential(client, thread_urls):
+    """
+    What get_reddit_comments did before: one blocking fetch per URL, first 10 comments as they come
+    """
+    comments = []
+    for url in thread_urls:
+        submission = client.submission(url=url, id=reddit.submission_id(url))
+        submission.comments.replace_more(limit=0)
+        comments.extend(comment.body for comment in submission.comments[:10])
+    return comments
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    client = FakeReddit(latency=args.latency)
+    thread_urls = urls(args.threads)
+
+    start = time.perf_counter()
+    old = sequential(client, thread_urls)
+    print(f"sequential     {time.perf_counter() - start:7.3f} s  {sum(map(len, old)):6} chars")
+
+    for label in ("batch cold", "batch cached"):
+        requests = client.requests
+        start = time.perf_counter()
+        new = await reddit.fetch_comments(client, thread_urls)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<14} {elapsed:7.3f} s  {sum(map(len, new)):6} chars  {client.requests - requests} upstream requests")
+
+    print(f"rate limiter waited {upstream_limits['reddit'].waited_seconds:.3f} s")
+    print(reddit.reddit_cache.stats())
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,210 @@
+"""
+Offline load test: replays a scripted conversation (destination -> flights -> Reddit ->
+itinerary -> calendar) through the real graph and FastAPI app, with every LLM and
+external service replaced by a deterministic fake with configurable latency.
+
+Run from backend/app:
+    python -m benchmarks.replay                       # 1, 4 and 16 concurrent users
+    python -m benchmarks.replay --users 1,8,32 --llm-latency 0.1 --json
+
+Reports throughput, turn latency percentiles, time to first frame and first token,
+and memory per session for each concurrency level.
+
+    python -m benchmarks.replay --prefetch --think-time 2   # with background prefetching
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+
+# Keep the app from building real clients or writing logs during the run
+os.environ.setdefault("WARM_UP_CLIENTS", "checkpointer,agent")
+os.environ.setdefault("METADATA_LOG_PATH", os.devnull)
+
+import httpx
+import uvicorn
+import main
+from agent import clients, metrics
+from agent.agent import tool_schemas
+from agent.reddit import reddit_cache
+from agent.prefetch import prefetcher
+from agent.tools import flight_cache, search_cache
+from google.auth.credentials import AnonymousCredentials
+from benchmarks.fakes import FakeCalendarServer, FakeItineraryLLM, FakeReddit, FakeSerpApi, FakeSerper, PromptCacheSimulator, ScriptedChatModel
+
+CONVERSATION = [
+    {
+        "user": "I want to go somewhere warm in March, any ideas?",
+        "reply": "Cancun is a great pick for March: warm water, beaches and great food. Want me to look for flights?",
+    },
+    {
+        "user": "Cancun sounds great. Find flights from ORD, March 1 to March 4.",
+        "tool_calls": [{"name": "search_flights", "args": {"departure_id": "ORD", "arrival_id": "CUN", "outbound_date": "2026-03-01", "return_date": "2026-03-04"}}],
+        "reply": "",
+    },
+    {
+        "user": "What should we do there?",
+        "tool_calls": [
+            {"name": "online_search", "args": {"__arg1": "things to do in Cancun reddit"}},
+            # Threads from the search results, as the model would pass them
+            {"name": "get_reddit_comments", "args": {"urls": FakeSerper.thread_urls("things to do in Cancun reddit")[:2]}},
+        ],
+        "reply": "Locals recommend the cenotes, snorkeling at Isla Mujeres and tacos downtown. Should I build an itinerary?",
+    },
+    {
+        "user": "Yes, make me an itinerary.",
+        "tool_calls": [{"name": "generate_itinerary", "args": {"location": "Cancun", "start_date": "2026-03-01", "end_date": "2026-03-04", "interests": ["food", "beaches"]}}],
+        "reply": "",
+    },
+    {
+        "user": "Add it to my calendar please.",
+        "tool_calls": [{"name": "add_google_calendar_event", "args": {"events": [
+            {"summary": "Beach", "description": "Swim", "start": {"dateTime": "2026-03-01T13:00:00", "timeZone": "America/Cancun"}, "end": {"dateTime": "2026-03-01T16:00:00", "timeZone": "America/Cancun"}},
+            {"summary": "Dinner", "description": "Tacos", "start": {"dateTime": "2026-03-01T19:00:00", "timeZone": "America/Cancun"}, "end": {"dateTime": "2026-03-01T21:00:00", "timeZone": "America/Cancun"}},
+        ]}}],
+        "reply": "Done! The events are in your calendar.",
+    },
+]
+
+def install_fakes(args):
+    script = {turn["user"]: turn for turn in CONVERSATION}
+    llm = ScriptedChatModel(script=script, first_token_latency=args.llm_latency, token_latency=args.token_latency, prompt_cache=PromptCacheSimulator()).bind_tools(tool_schemas)
+    clients.override("main_llm", llm)
+    clients.override("memory_llm", ScriptedChatModel(default_reply="Planning a March trip to Cancun from ORD.", first_token_latency=args.llm_latency, model_name="scripted-memory"))
+    clients.override("itinerary_llm", FakeItineraryLLM(day_latency=args.itinerary_day_latency))
+    clients.override("serper", FakeSerper(latency=args.search_latency))
+    clients.override("serpapi", FakeSerpApi(latency=args.flight_latency))
+    clients.override("reddit", FakeReddit(latency=args.reddit_latency))
+    clients.override("calendar_credentials", AnonymousCredentials())
+    clients.override("calendar", FakeCalendarServer(latency=args.calendar_latency).service())
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+async def run_turn(client, thread_id, text):
+    start = time.perf_counter()
+    first_frame = None
+    first_token = None
+    async with client.stream("POST", "/chat", json={"input": text, "thread_id": thread_id}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            now = time.perf_counter() - start
+            if first_frame is None:
+                first_frame = now
+            if first_token is None and "event: token" in chunk:
+                first_token = now
+    return time.perf_counter() - start, first_frame, first_token
+
+async def run_session(client, session, results, think_time=0.0):
+    thread_id = f"replay-{session}-{time.monotonic_ns()}"
+    for i, turn in enumerate(CONVERSATION):
+        if i:
+            # The user reading the answer and typing the next message
+            await asyncio.sleep(think_time)
+        latency, first_frame, first_token = await run_turn(client, thread_id, turn["user"])
+        results["latency"].append(latency)
+        if turn.get("tool_calls") and turn["tool_calls"][0]["name"] == "online_search":
+            results["research"].append(latency)
+        results["first_frame"].append(first_frame)
+        if first_token is not None:
+            results["first_token"].append(first_token)
+
+async def run_level(client, users, fresh_caches, think_time=0.0):
+    if fresh_caches:
+        for cache in (search_cache, flight_cache, reddit_cache):
+            cache.clear()
+
+    results = {"latency": [], "first_frame": [], "first_token": [], "research": []}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(client, i, results, think_time) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    turns = len(results["latency"])
+    return {
+        "users": users,
+        "turns": turns,
+        "seconds": elapsed,
+        "turns_per_second": turns / elapsed,
+        "p50": percentile(results["latency"], 0.5),
+        "p95": percentile(results["latency"], 0.95),
+        "p99": percentile(results["latency"], 0.99),
+        "first_frame_p50": percentile(results["first_frame"], 0.5),
+        "first_token_p50": percentile(results["first_token"], 0.5),
+        "first_token_p95": percentile(results["first_token"], 0.95),
+        "research_p50": percentile(results["research"], 0.5),
+        "kb_per_session": (after - before) / users / 1024,
+    }
+
+async def serve():
+    """
+    Starts the app on a free local port. httpx's ASGI transport buffers whole
+    responses, so a real server is needed to see when frames arrive
+    """
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+async def main_async(args):
+    install_fakes(args)
+    prefetcher.enabled = args.prefetch
+    levels = [int(n) for n in args.users.split(",")]
+    rows = []
+    server, task, url = await serve()
+    try:
+        limits = httpx.Limits(max_connections=max(levels) * 2)
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+            for users in levels:
+                rows.append(await run_level(client, users, not args.warm_caches, args.think_time))
+    finally:
+        server.should_exit = True
+        await task
+
+    if args.json:
+        print(json.dumps(rows))
+        return
+
+    print(f"{'users':>6} {'turns/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'1st frame':>10} {'1st token':>10} {'KB/session':>11}")
+    for row in rows:
+        print(
+            f"{row['users']:>6} {row['turns_per_second']:>8.2f} {row['p50']:>7.2f} {row['p95']:>7.2f} {row['p99']:>7.2f} "
+            f"{row['first_frame_p50']:>10.3f} {row['first_token_p50'] or 0:>10.3f} {row['kb_per_session']:>11.1f}"
+        )
+    print("research turn p50 " + ", ".join(f"{row['research_p50']:.2f} s" for row in rows))
+    if prefetcher.enabled:
+        print(f"prefetch: {prefetcher.stats()}")
+        for cache in (search_cache, reddit_cache):
+            stats = cache.stats()
+            print(f"  {cache.name}: {stats['prefetched']} prefetched, {stats['prefetch_used']} used ({stats['prefetch_use_rate']:.0%})")
+    for model, stats in metrics.prompt_cache_stats().items():
+        print(f"{model}: {stats['avg_prompt_tokens']:.0f} prompt tokens per call, {stats['cached_token_rate']:.0%} served from the prompt cache")
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="1,4,16", help="comma separated concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="main LLM time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--search-latency", type=float, default=0.4)
+    parser.add_argument("--flight-latency", type=float, default=1.0)
+    parser.add_argument("--reddit-latency", type=float, default=0.3)
+    parser.add_argument("--calendar-latency", type=float, default=0.5)
+    parser.add_argument("--itinerary-day-latency", type=float, default=0.5)
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a reply and the next user message")
+    parser.add_argument("--prefetch", action="store_true", help="enable background prefetching")
+    parser.add_argument("--warm-caches", action="store_true", help="keep tool caches between concurrency levels")
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,77 @@
+"""
+Worker cold-start: module import time and time to first streamed token.
+
+Run from backend/app:
+    python -m benchmarks.startup            # offline, main LLM replaced by a fake model
+    python -m benchmarks.startup --live     # real clients, needs the .env keys
+
+Prints one JSON line so CI can track the numbers over time.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+def measure_import(runs):
+    """
+    Imports main in fresh interpreters and returns the median import time
+    """
+    env = dict(os.environ, WARM_UP_CLIENTS="")
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, env=env, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+async def measure_first_token(live):
+    if not live:
+        os.environ["WARM_UP_CLIENTS"] = "checkpointer,agent"
+
+    import httpx
+    import main
+    from agent import clients
+
+    if not live:
+        from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+        clients.override("main_llm", GenericFakeChatModel(messages=itertools.cycle(["Hi! Where would you like to go?"])))
+
+    start = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        lifespan_seconds = time.perf_counter() - start
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            first_token = None
+            async with client.stream("POST", "/chat", json={"input": "Hi! What do you do?", "thread_id": "startup-bench"}) as response:
+                async for _ in response.aiter_bytes():
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+            total = time.perf_counter() - start
+
+    return {
+        "lifespan_seconds": lifespan_seconds,
+        "first_token_seconds": first_token,
+        "first_response_seconds": total,
+        "startup": main.app.state.startup,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    result = {"import_seconds": measure_import(args.runs)}
+    result.update(asyncio.run(measure_first_token(args.live)))
+    print(json.dumps(result, default=str))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Server CPU per streamed token and writes per response for the old /chat encoding
+(json.loads guess + json.dumps + "[END]" + sleep(0) per token) vs coalesced SSE frames.
+
+Run from backend/app:
+    python -m benchmarks.wire
+    python -m benchmarks.wire --tokens 2000 --gap-ms 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from langchain_core.messages import AIMessageChunk
+from streaming import FrameBuffer, GzipStream
+
+async def fake_tokens(n, gap):
+    """
+    LLM-like token stream with a fixed gap between tokens
+    """
+    words = ["Cancun", " has", " great", " beaches", ",", " 4", " day", " trips", " and", "\n", " tacos", "."]
+    for i in range(n):
+        if gap:
+            await asyncio.sleep(gap)
+        yield AIMessageChunk(content=words[i % len(words)]), {"tags": ["main"]}
+
+async def legacy(chunks):
+    """
+    The encoding /chat used before SSE framing
+    """
+    async for chunk, metadata in chunks:
+        if "structured" not in metadata.get("tags", []) and isinstance(chunk, AIMessageChunk):
+            content = chunk.content
+            if content:
+                try:
+                    parsed = json.loads(content)
+                    if isinstance(parsed, dict) and "type" in parsed:
+                        send_data = f"{json.dumps(parsed)}[END]"
+                    else:
+                        send_data = f"{json.dumps({'type': 'stream', 'content': content})}[END]"
+                except (TypeError, ValueError):
+                    send_data = f"{json.dumps({'type': 'stream', 'content': content})}[END]"
+                yield send_data
+                await asyncio.sleep(0)
+
+async def framed(chunks, compress=False):
+    frames = FrameBuffer()
+    gzip = GzipStream() if compress else None
+
+    async def produce():
+        try:
+            async for chunk, metadata in chunks:
+                if "structured" in metadata.get("tags", []) or not isinstance(chunk, AIMessageChunk):
+                    continue
+                event = chunk.additional_kwargs.get("event")
+                if event:
+                    frames.event(event, chunk.content)
+                elif chunk.content:
+                    frames.token(chunk.content)
+        finally:
+            frames.close()
+
+    task = asyncio.create_task(produce())
+    try:
+        async for data in frames:
+            yield gzip(data) if gzip else data
+        if gzip:
+            yield gzip.finish()
+    finally:
+        task.cancel()
+
+async def baseline(chunks):
+    """
+    Just produces the tokens, to subtract the cost of the fake stream itself
+    """
+    async for chunk, _ in chunks:
+        pass
+    yield ""
+
+async def measure(name, stream, tokens):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    writes = 0
+    size = 0
+    async for data in stream:
+        writes += 1
+        size += len(data)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    print(f"{name:<12} {cpu / tokens * 1e6:10.1f} {writes:8} {size:10} {wall:8.2f}")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--gap-ms", type=float, default=0)
+    args = parser.parse_args()
+    gap = args.gap_ms / 1000
+
+    print(f"{args.tokens} tokens, {args.gap_ms} ms apart")
+    print(f"{'encoding':<12} {'cpu us/tok':>10} {'writes':>8} {'bytes':>10} {'wall s':>8}")
+    await measure("baseline", baseline(fake_tokens(args.tokens, gap)), args.tokens)
+    await measure("legacy", legacy(fake_tokens(args.tokens, gap)), args.tokens)
+    await measure("sse", framed(fake_tokens(args.tokens, gap)), args.tokens)
+    await measure("sse+gzip", framed(fake_tokens(args.tokens, gap), compress=True), args.tokens)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,7 +5,6 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from agent.schemas import Event
 from datetime import datetime
 import os
-import json
 
 def google_authenticate():
     """
@@ -57,23 +56,3 @@ def build_event_data(event: Event):
     except Exception as e:
         print("Error parsing event", e)
         return None
-    
-def extract_event_links(batch_responses):
-    """
-    Extracts URL links from Google Batch API response
-    """
-    event_links = []
-    
-    for request_id, (headers, body_bytes) in batch_responses.items():
-        try:
-            # Decode bytes to string, then load as JSON
-            event_json = json.loads(body_bytes.decode("utf-8"))
-            summary = event_json.get("summary")
-            html_link = event_json.get("htmlLink")
-            
-            if summary and html_link:
-                event_links.append(f"{summary}: ({html_link})")
-        except Exception as e:
-            print(f"Failed to parse response for request_id {request_id}: {e}")
-
-    return event_links
\ No newline at end of file
@@ -1,15 +1,53 @@
+import json
+import time
+STARTED_AT = time.perf_counter()
+
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
-from langchain_core.messages import AIMessageChunk, AIMessage
-from agent.agent import get_agent
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from langchain_core.messages import AIMessage
+from agent.agent import close_interrupted_turn, get_agent, get_checkpointer_stats, prompt_layout
+from agent.tools import get_cache_stats
+from agent.context import token_counting_stats
+from agent.executor import shutdown_executor, run_blocking
+from agent.admission import Busy, admission
+from agent.http_pool import pool_stats
+from agent.prefetch import prefetcher
+from agent import clients, metrics
+from agent.itinerary import timings as itinerary_timings
+from streaming import FrameBuffer, GzipStream, accepts_gzip, sse
+from request_log import start_logging, stop_logging, start_request, end_request, request_sampled, log_event, logging_stats
 from fastapi.middleware.cors import CORSMiddleware
-import json
 import asyncio
+from contextlib import asynccontextmanager
 import logging
+import uuid
+import os
 
 load_dotenv()
-app = FastAPI()
+IMPORT_SECONDS = time.perf_counter() - STARTED_AT
+
+# Clients built before the first request. The calendar client is left out by
+# default since it may need an interactive OAuth login
+WARM_UP_CLIENTS = [c for c in os.getenv("WARM_UP_CLIENTS", "main_llm,summary_llm,itinerary_llm,serper,reddit,airports,token_encoding,checkpointer,agent").split(",") if c]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_logging()
+    timings = await run_blocking(clients.warm_up, WARM_UP_CLIENTS)
+    app.state.startup = {
+        "import_seconds": IMPORT_SECONDS,
+        "ready_seconds": time.perf_counter() - STARTED_AT,
+        "warm_up_seconds": timings,
+    }
+    print("startup", app.state.startup)
+    yield
+    prefetcher.close()
+    shutdown_executor()
+    stop_logging()
+    metrics.dump_spans()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,83 +55,202 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Thread-Id", "X-Request-Id"],
 )
 
-# Create a custom logger
-metadata_logger = logging.getLogger("metadata_logger")
-metadata_logger.setLevel(logging.DEBUG)
+# Cache and checkpointer counters (hit rate, saved upstream seconds, memory)
+@app.get("/stats")
+async def stats_endpoint():
+    return {
+        "checkpointer": await run_blocking(get_checkpointer_stats),
+        "caches": get_cache_stats(),
+        "logging": logging_stats(),
+        "admission": admission.stats(),
+        "http": pool_stats(),
+        "prefetch": prefetcher.stats(),
+        "prompt": {"layout": await run_blocking(prompt_layout.stats), "cache": metrics.prompt_cache_stats(), "token_counting": token_counting_stats()},
+    }
 
-# Create file handler for metadata logs
-metadata_handler = logging.FileHandler("metadata.log")
-metadata_handler.setLevel(logging.DEBUG)
+chat_requests = metrics.counter("chat_requests_total", "Chat requests by outcome", ("status",))
+chat_first_token = metrics.histogram("chat_time_to_first_token_seconds", "Time from request to the first streamed token")
+chat_seconds = metrics.histogram("chat_request_seconds", "Time to stream a whole chat response")
+chat_cancelled = metrics.counter("chat_cancelled_total", "Chat requests stopped because the client went away, by the graph node that was running", ("node",))
+chat_cancelled_seconds = metrics.histogram("chat_cancelled_work_seconds", "Agent time spent on requests whose client went away")
 
-# Optional: Formatter for clarity
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-metadata_handler.setFormatter(formatter)
+def gauges(prefix, stats, labels=None):
+    """
+    Turns a component's stats() dict into gauge families
+    """
+    return [
+        (f"{prefix}_{key}", "gauge", f"{prefix} {key}", [(labels or {}, value)])
+        for key, value in stats.items() if isinstance(value, (int, float))
+    ]
 
-# Add handler to logger (only once)
-if not metadata_logger.hasHandlers():
-    metadata_logger.addHandler(metadata_handler)
+def collect_component_stats():
+    families = []
+    for name, stats in get_cache_stats().items():
+        families.extend(gauges("agent_cache", stats, {"cache": name}))
+    if clients.registry["checkpointer"].is_ready():
+        families.extend(gauges("agent_checkpointer", get_checkpointer_stats()))
+    families.extend(gauges("metadata_log", logging_stats()))
+    families.extend(gauges("chat_admission", admission.stats()))
+    families.extend(gauges("agent_prefetch", prefetcher.stats()))
+    families.extend(gauges("agent_token_counting", token_counting_stats()))
+    for name, stats in pool_stats().items():
+        families.extend(gauges("agent_http_pool", stats, {"pool": name}))
+    for model, stats in metrics.prompt_cache_stats().items():
+        families.extend(gauges("agent_prompt_cache", stats, {"model": model}))
+    families.append(("agent_client_init_seconds", "gauge", "Time taken to build each lazy client", [
+        ({"client": name}, client.init_seconds) for name, client in clients.registry.items()
+    ]))
+    families.append(("agent_itinerary_recent_seconds", "gauge", "Median of recent itinerary generations", [
+        ({"phase": name}, sorted(samples)[len(samples) // 2]) for name, samples in itinerary_timings.items() if samples
+    ]))
+
+    # Gauges that share a name have to be rendered as one family
+    merged = {}
+    for name, kind, help, samples in families:
+        if name in merged:
+            merged[name][3].extend(samples)
+        else:
+            merged[name] = (name, kind, help, list(samples))
+    return list(merged.values())
+
+metrics.register_collector(collect_component_stats)
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(await run_blocking(metrics.render), media_type="text/plain; version=0.0.4")
+
+# Recent spans, when TRACE_SPANS is set
+@app.get("/traces")
+async def traces_endpoint():
+    return list(metrics.recent_spans) if metrics.TRACE_SPANS else []
 
 # Endpoint for agent calls
 @app.post("/chat")
 async def chat_endpoint(request: Request):
     body = await request.json()
     user_input = body.get("input")
-    last_tool = ""
-    agent, config = get_agent()
-    
-    # Define an async generator to stream tokens
+
+    # Each browser session gets its own conversation thread
+    thread_id = body.get("thread_id") or body.get("session_id") or uuid.uuid4().hex
+
+    # Wait for a free agent slot, or tell the client to back off right away
+    try:
+        await admission.acquire(str(thread_id))
+    except Busy as e:
+        print(f"Chat request rejected: {e.reason}")
+        chat_requests.inc(1, "busy")
+        return Response(
+            sse("busy", json.dumps({"type": "busy", "reason": e.reason, "retry_after": e.retry_after})),
+            status_code=429,
+            media_type="text/event-stream",
+            headers={"Retry-After": str(e.retry_after), "X-Thread-Id": str(thread_id)},
+        )
+
+    # The client may have given up while it was queued
+    if await request.is_disconnected():
+        admission.release(str(thread_id))
+        chat_cancelled.inc(1, "queued")
+        return Response(status_code=499)
+
+    agent, config = get_agent(str(thread_id))
+    frames = FrameBuffer()
+
+    # The producer task copies this context, so its records carry the request id
+    request_id = uuid.uuid4().hex
+    log_token = start_request(request_id, str(thread_id))
+    log_event("request_start", input_chars=len(user_input or ""))
+
+    # Runs the agent and turns its output into SSE frames. Structured messages are
+    # tagged by the nodes that create them, so content is never parsed here
+    async def produce():
+        last_tool = ""
+        start = time.perf_counter()
+        first_token = False
+        status = "ok"
+        try:
+            # The async path keeps slow LLM and tool calls from blocking other requests on the event loop
+            with metrics.span("request", "chat", trace_id=request_id):
+                async for mode, payload in agent.astream(
+                    {"messages": [("user", user_input)]},
+                    config=config,
+                    stream_mode=["messages", "custom"],
+                ):
+                    # Structured events pushed by nodes and tools while they run (e.g. itinerary days)
+                    if mode == "custom":
+                        frames.event(payload["type"], payload)
+                        continue
+
+                    chunk, metadata = payload
+                    if request_sampled():
+                        log_event("chunk", node=metadata.get("langgraph_node"), step=metadata.get("langgraph_step"), tags=metadata.get("tags"), message_type=chunk.type, content=chunk.content)
+
+                    # Send tool calls to frontend
+                    for tool_call in getattr(chunk, "tool_calls", None) or []:
+                        tool_name = tool_call.get("name")
+                        if tool_name and tool_name != last_tool:
+                            print("new tool", tool_name)
+                            log_event("tool", tool_name=tool_name)
+                            frames.event("tool", {"type": "tool", "tool_name": tool_name})
+                            last_tool = tool_name
+
+                    # Make sure output being streamed is only AI Messages from main LLM
+                    if "structured" in metadata.get("tags", []) or not isinstance(chunk, AIMessage):
+                        continue
+                    event = chunk.additional_kwargs.get("event")
+                    if event:
+                        frames.event(event, chunk.content)
+                    elif chunk.content:
+                        if not first_token:
+                            first_token = True
+                            chat_first_token.observe(time.perf_counter() - start)
+                        frames.token(chunk.content)
+            # Warm the caches with what the next turns will probably need (opt-in)
+            prefetcher.schedule(str(thread_id), agent, config)
+        except asyncio.CancelledError:
+            # Cancelling astream cancels the running node along with its LLM requests and tool calls
+            status = "cancelled"
+            chat_cancelled_seconds.observe(time.perf_counter() - start)
+            try:
+                node = await close_interrupted_turn(agent, config)
+            except Exception as e:
+                node = "unknown"
+                print(f"Could not close interrupted turn: {e}")
+            chat_cancelled.inc(1, node)
+            log_event("cancelled", node=node)
+            raise
+        except Exception as e:
+            status = "error"
+            print(f"Error while streaming: {e}")
+            log_event("error", level=logging.ERROR, error=repr(e))
+            frames.event("error", {"type": "error", "tool_name": "LLM"})
+        finally:
+            frames.close()
+            chat_requests.inc(1, status)
+            chat_seconds.observe(time.perf_counter() - start)
+            log_event("request_end", tokens=frames.tokens, frames=frames.frames)
+
+    task = asyncio.create_task(produce())
+    # A done callback also runs when the task is cancelled before it ever started
+    task.add_done_callback(lambda _: admission.release(str(thread_id)))
+    end_request(log_token)
+    headers = {"X-Thread-Id": str(thread_id), "X-Request-Id": request_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    gzip = GzipStream() if accepts_gzip(request) else None
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
     async def event_stream():
-        nonlocal last_tool
-
-        # Stream agent output by token
-        for chunk, metadata in agent.stream(
-            {"messages": [("user", user_input)]},
-            config=config,
-            stream_mode="messages",
-        ):
-            metadata_logger.debug(f"chunk: {chunk}")
-            metadata_logger.debug(f"Metadata: {metadata}")
-
-            # Send tool calls to frontend
-            if hasattr(chunk, "tool_calls"):
-                for tool_call in chunk.tool_calls:
-                    tool_name = tool_call.get("name")
-                    if tool_name and tool_name != last_tool:
-                        print("new tool", tool_name)
-                        try:
-                            yield f"{json.dumps({'type': 'tool', 'tool_name': tool_name})}[END]"
-                            await asyncio.sleep(0)
-                        except asyncio.CancelledError:
-                            print(f"Client disconnected while yielding")
-                            return 
-                        last_tool = tool_name
-
-            # Make sure output being streamed is only AI Messages from main LLM
-            if ("structured" not in metadata.get("tags", []) and (isinstance(chunk, AIMessageChunk) or isinstance(chunk, AIMessage))):                
-                content = chunk.content
-                send_data = ""
-                if content:
-                    # Check if content is a JSON string
-                    try:
-                        parsed = json.loads(content)
-                        # If it's a dict with a "type" key, treat it as structured JSON
-                        if isinstance(parsed, dict) and "type" in parsed:
-                            send_data = f"{json.dumps(parsed)}[END]"
-                        else:
-                            # Otherwise it's normal streaming data that could technically count as JSON (like the number 4)
-                            send_data = f"{json.dumps({'type': 'stream', 'content': content})}[END]"
-                    except (TypeError, ValueError):
-                        # If it can't be parsed to json than it's normal streaming tokens
-                        send_data = f"{json.dumps({'type': 'stream', 'content': content})}[END]"
-                    
-                    # Avoid socket errors
-                    try:
-                        yield send_data
-                        await asyncio.sleep(0)
-                    except asyncio.CancelledError:
-                        print(f"Client disconnected while yielding")
-                        return 
-                    
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+        try:
+            async for data in frames:
+                yield gzip(data) if gzip else data
+            if gzip:
+                yield gzip.finish()
+        finally:
+            # Stop the agent when the client goes away
+            task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,134 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+METADATA_LOG_PATH = os.getenv("METADATA_LOG_PATH", "metadata.log")
+METADATA_LOG_LEVEL = os.getenv("METADATA_LOG_LEVEL", "INFO")
+METADATA_LOG_MAX_BYTES = int(os.getenv("METADATA_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+METADATA_LOG_BACKUPS = int(os.getenv("METADATA_LOG_BACKUPS", "5"))
+# Share of requests whose every streamed chunk is logged. Other requests only log
+# their start, tool calls and end
+METADATA_LOG_SAMPLE_RATE = float(os.getenv("METADATA_LOG_SAMPLE_RATE", "0.05"))
+# Records waiting for the writer thread. Beyond this new records are dropped
+METADATA_LOG_QUEUE_SIZE = int(os.getenv("METADATA_LOG_QUEUE_SIZE", "10000"))
+
+class RequestContext:
+    """
+    Per-request logging state, carried in a contextvar so tasks spawned for the
+    request see it too
+    """
+    __slots__ = ("request_id", "thread_id", "sampled", "started")
+
+    def __init__(self, request_id, thread_id, sampled):
+        self.request_id = request_id
+        self.thread_id = thread_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Runs on the listener thread, so values are only
+    serialized there
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "event": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread_id": getattr(record, "thread_id", None),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them first, and drops
+    them instead of blocking when the queue is full
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        context = current_request.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.thread_id = context.thread_id
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+metadata_logger = logging.getLogger("metadata_logger")
+metadata_logger.setLevel(METADATA_LOG_LEVEL)
+metadata_logger.propagate = False
+
+log_queue = queue.Queue(METADATA_LOG_QUEUE_SIZE)
+queue_handler = LazyQueueHandler(log_queue)
+metadata_logger.addHandler(queue_handler)
+listener = None
+
+def start_logging():
+    """
+    Starts the thread writing queued records to the rotating log file
+    """
+    global listener
+    if listener is None:
+        file_handler = RotatingFileHandler(METADATA_LOG_PATH, maxBytes=METADATA_LOG_MAX_BYTES, backupCount=METADATA_LOG_BACKUPS)
+        file_handler.setFormatter(JsonFormatter())
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+
+def stop_logging():
+    """
+    Writes out queued records and stops the writer thread
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+
+def start_request(request_id, thread_id):
+    """
+    Sets the request context for the current task. Returns a token for end_request
+    """
+    sampled = random.random() < METADATA_LOG_SAMPLE_RATE
+    return current_request.set(RequestContext(request_id, thread_id, sampled))
+
+def end_request(token):
+    current_request.reset(token)
+
+def request_sampled() -> bool:
+    """
+    True when the current request logs every chunk. Check it before building chunk fields
+    """
+    context = current_request.get()
+    return context is not None and context.sampled
+
+def log_event(event, level=logging.INFO, **fields):
+    """
+    Queues a structured record for the current request. fields are serialized on the writer thread
+    """
+    if metadata_logger.isEnabledFor(level):
+        context = current_request.get()
+        if context is not None:
+            fields["elapsed"] = time.perf_counter() - context.started
+        metadata_logger.log(level, event, extra={"fields": fields})
+
+def logging_stats():
+    return {"queued": log_queue.qsize(), "dropped": queue_handler.dropped}
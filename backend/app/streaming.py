@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import re
+import zlib
+
+# A token frame is sent when it is this old or this big, whichever comes first
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "30"))
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "512"))
+# gzip the stream for clients that accept it. Mostly pays off for flight and itinerary payloads
+STREAM_COMPRESSION = os.getenv("STREAM_COMPRESSION", "0") == "1"
+
+LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+def sse(event: str, data: str) -> str:
+    """
+    One Server-Sent Event. Multi-line data is split over several data: lines
+    """
+    if "\n" in data or "\r" in data:
+        return f"event: {event}\n" + "".join(f"data: {line}\n" for line in LINE_BREAK.split(data)) + "\n"
+    return f"event: {event}\ndata: {data}\n\n"
+
+class FrameBuffer:
+    """
+    Collects stream output into SSE frames. Tokens are coalesced until the frame is
+    STREAM_FLUSH_MS old or STREAM_FLUSH_BYTES big; any other event flushes pending
+    tokens first so ordering is kept. Iterate it to get the frames to write
+    """
+
+    def __init__(self, max_delay_ms=STREAM_FLUSH_MS, max_bytes=STREAM_FLUSH_BYTES):
+        self.max_delay = max_delay_ms / 1000
+        self.max_bytes = max_bytes
+        self.queue = asyncio.Queue()
+        self._tokens = []
+        self._size = 0
+        self._timer = None
+        self.tokens = 0
+        self.frames = 0
+
+    def token(self, text: str):
+        self._tokens.append(text)
+        self._size += len(text)
+        self.tokens += 1
+        if self._size >= self.max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+
+    def event(self, event: str, data):
+        """
+        Sends a structured event. data is a dict or an already serialized JSON string
+        """
+        self.flush()
+        self._put(sse(event, data if isinstance(data, str) else json.dumps(data)))
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._tokens:
+            text = "".join(self._tokens)
+            self._tokens.clear()
+            self._size = 0
+            self._put(sse("token", text))
+
+    def close(self):
+        self.flush()
+        self.queue.put_nowait(None)
+
+    def _put(self, frame):
+        self.frames += 1
+        self.queue.put_nowait(frame)
+
+    async def __aiter__(self):
+        while True:
+            frame = await self.queue.get()
+            if frame is None:
+                return
+            # Write everything that is ready in one go
+            parts = [frame]
+            closed = False
+            while not self.queue.empty():
+                frame = self.queue.get_nowait()
+                if frame is None:
+                    closed = True
+                    break
+                parts.append(frame)
+            yield "".join(parts)
+            if closed:
+                return
+
+class GzipStream:
+    """
+    Incremental gzip. Every chunk is sync-flushed so the client can decode it right away
+    """
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def __call__(self, text: str) -> bytes:
+        return self._compressor.compress(text.encode()) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def accepts_gzip(request) -> bool:
+    return STREAM_COMPRESSION and "gzip" in request.headers.get("accept-encoding", "")
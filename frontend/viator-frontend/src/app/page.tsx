@@ -26,6 +26,7 @@ export default function Home() {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const controllerRef = useRef<AbortController | null>(null);  // Handle DOM errors
+  const threadIdRef = useRef<string>(crypto.randomUUID()); // Conversation thread for this session
   // const bottomRef = useRef<HTMLDivElement | null>(null); // Automatic Scrolling
 
   // useEffect(() => {
@@ -53,6 +54,7 @@ export default function Home() {
       const res = await apiCaller({
         url: "http://localhost:8000/chat",
         input: message,
+        threadId: threadIdRef.current,
         signal: controllerRef.current
       })
 
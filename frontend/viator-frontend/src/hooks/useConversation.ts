@@ -15,13 +15,14 @@ export function useConversation() {
     }
 
     // Stream into the conversation as messages arrive
-    function updateAssistantStream(content: any) {
+    function updateAssistantStream(content: any, itineraryData?: any) {
         setConversation(prev => {
             const last = prev[prev.length - 1];
+            const update = { content, ...(itineraryData ? { itineraryData } : {}) };
             if (last?.role === "assistant") {
-                return [...prev.slice(0, -1), { ...last, content }];
+                return [...prev.slice(0, -1), { ...last, ...update }];
             } else {
-                return [...prev, { role: "assistant", content }];
+                return [...prev, { role: "assistant", ...update }];
             }
         });
     }
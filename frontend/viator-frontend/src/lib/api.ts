@@ -1,10 +1,12 @@
 export async function apiCaller({
     url,
     input,
+    threadId,
     signal,
 }: {
     url: string;
     input: string;
+    threadId?: string;
     signal?: AbortController;
 }) {
     if (!signal) {
@@ -13,10 +15,16 @@ export async function apiCaller({
     const res = await fetch(url, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ input }),
+    body: JSON.stringify({ input, thread_id: threadId }),
     signal: signal.signal,
   });
 
+  // The server is at capacity or this conversation already has a reply in progress
+  if (res.status === 429) {
+    const retryAfter = res.headers.get("Retry-After") || "a few";
+    throw new Error(`Viator is busy right now. Please try again in ${retryAfter} seconds.`);
+  }
+
   if (!res.ok) {
     throw new Error(`Server returned ${res.status}`);
   }
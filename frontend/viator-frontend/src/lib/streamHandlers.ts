@@ -5,7 +5,7 @@ export async function handleStreamedResponse({
   setError,
 }: {
   res: Response;
-  updateAssistantStream: (msg: string) => void;
+  updateAssistantStream: (msg: string, itineraryData?: any) => void;
   finalizeAssistantMessage: (msg: string, toolsUsed?: string[], flightsData?: any, itineraryData?: any) => void;
   setError: (err: string | null) => void;
 }) {
@@ -14,35 +14,59 @@ export async function handleStreamedResponse({
 
   const decoder = new TextDecoder("utf-8");
   let done = false;
+  let buffer = ""; // Partial SSE frame carried over between reads
   let assistantMessage = "";
   let toolsUsed: string[] = [];
   let flightData: any = null;
   let itineraryData: any = null;
+  let itineraryDays: any[] = []; // Days streamed before the full itinerary arrives
+
+  const handleEvent = (event: string, data: string) => {
+    if (event === "token") {
+      assistantMessage += data;
+      updateAssistantStream(assistantMessage);
+      return;
+    }
+
+    const payload = JSON.parse(data);
+    if (event === "tool") {
+      toolsUsed.push(payload.tool_name);
+    } else if (event === "flight_response" || event === "price_matrix") {
+      // price_matrix: the message carries the date x price table, flights_data the cheapest options
+      assistantMessage += `\n${payload.message}\n`;
+      flightData = payload.flights_data;
+    } else if (event === "itinerary_day") {
+      itineraryDays[payload.index] = payload.day;
+      itineraryData = { location: payload.location, days: itineraryDays.filter(Boolean) };
+      updateAssistantStream(assistantMessage, itineraryData);
+    } else if (event === "itinerary_response") {
+      itineraryData = payload.itinerary_data;
+    } else if (event === "error") {
+      setError("Error from tool: " + payload.tool_name);
+    }
+  };
 
   try {
     while (!done) {
       const { value, done: streamDone } = await reader.read();
       done = streamDone;
-      const text = decoder.decode(value);
-    
-      const chunks = text.trim().split("[END]"); // split with delimiter
-      chunks.pop();
+      buffer += decoder.decode(value, { stream: !done });
+
+      // Server-Sent Events are separated by a blank line
+      const frames = buffer.split("\n\n");
+      buffer = frames.pop() ?? "";
 
-      for (const chunk of chunks) {
-        const jsonChunk = JSON.parse(chunk);
-        if (jsonChunk?.type === "tool") {
-          toolsUsed.push(jsonChunk.tool_name);
-        } else if (jsonChunk?.type === "flight_response") {
-          assistantMessage += `\n${jsonChunk.message}\n`;
-          flightData = jsonChunk.flights_data;
-        } else if (jsonChunk?.type === "stream") {
-          assistantMessage += jsonChunk.content;
-          updateAssistantStream(assistantMessage);
-        } else if (jsonChunk?.type === "itinerary_response") {
-          itineraryData = jsonChunk.itinerary_data;
-        } else if (jsonChunk?.type === "error") {
-          setError("Error from tool: " + jsonChunk.tool);
+      for (const frame of frames) {
+        let event = "message";
+        const data: string[] = [];
+        for (const line of frame.split("\n")) {
+          if (line.startsWith("event: ")) {
+            event = line.slice(7);
+          } else if (line.startsWith("data: ")) {
+            data.push(line.slice(6));
+          }
         }
+        handleEvent(event, data.join("\n"));
       }
     }
 